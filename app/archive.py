@@ -0,0 +1,428 @@
+"""Hot/cold split of the transactions table.
+
+Every calendar month that ended more than TRANSACTION_ARCHIVE_HOT_DAYS ago is moved out of
+`transactions` in bulk:
+
+    python -m app.archive --older-than-days 90
+
+* PostgreSQL: `transactions` itself is partitioned by month on `timestamp`. A month is
+  archived by detaching its partition and attaching it to `transactions_archive`, so no
+  row is deleted and the hot table never needs vacuuming. Each run also creates the
+  partitions of the next HOT_PARTITION_MONTHS_AHEAD months; rows outside any partition
+  land in `transactions_default` and get their own partition on the next run.
+* SQLite: rows are written to compressed columnar segment files (NumPy .npz, up to
+  TRANSACTION_ARCHIVE_SEGMENT_ROWS rows each) under TRANSACTION_ARCHIVE_DIR, then deleted.
+
+Either way, each batch is recorded in `transaction_archive_segments` in the same database
+transaction as the move, so a failed run leaves the hot rows in place. Archiving is cut at
+the start of a month, so every day is either entirely hot or entirely archived; the daily
+rollups keep covering archived days.
+
+The platform report and the distribution analytics read only the hot table by default.
+Exports, and analytics asked for a date range before the archive boundary (or with
+include_archived), read the archive as well through `iter_archived_columns`.
+"""
+import argparse
+import asyncio
+import os
+from datetime import date, datetime, time, timedelta
+from pathlib import Path
+from typing import AsyncIterator, Optional
+
+import numpy as np
+from sqlalchemy import MetaData, delete, func, insert, select, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.schema import AddConstraint
+
+from app.database import SQLALCHEMY_DATABASE_URL, engine
+from app.metrics import count_rows_returned
+from app.models import Transaction, TransactionArchiveSegment, TransactionType
+from app.utils import EXPORT_BATCH_SIZE
+
+
+def _default_archive_dir() -> str:
+    url = make_url(SQLALCHEMY_DATABASE_URL)
+    if url.get_backend_name() == "sqlite" and url.database not in (None, "", ":memory:"):
+        # next to the database file, like its -wal and -shm files
+        return f"{url.database}-archive"
+    return "./transaction_archive"
+
+
+TRANSACTION_ARCHIVE_HOT_DAYS = int(os.getenv("TRANSACTION_ARCHIVE_HOT_DAYS", "90"))
+TRANSACTION_ARCHIVE_DIR = Path(os.getenv("TRANSACTION_ARCHIVE_DIR") or _default_archive_dir())
+TRANSACTION_ARCHIVE_SEGMENT_ROWS = int(os.getenv("TRANSACTION_ARCHIVE_SEGMENT_ROWS", "500000"))
+ARCHIVE_FETCH_SIZE = 50_000
+HOT_PARTITION_MONTHS_AHEAD = 3
+# the report counts the last 7 days from the hot table
+MIN_HOT_DAYS = 7
+
+TRANSACTION_TYPES = list(TransactionType)
+_TYPE_CODES = {transaction_type: code for code, transaction_type in enumerate(TRANSACTION_TYPES)}
+
+# every column of `transactions`, in table order; types are stored as codes into TRANSACTION_TYPES
+ARCHIVE_COLUMNS = {
+    "id": np.int64, "amount": np.float64, "type": np.int8, "user_id": np.int64, "asset_id": np.int64,
+    "from_owner_id": np.int64, "to_owner_id": np.int64, "timestamp": "datetime64[us]",
+}
+
+# not part of Base.metadata: on PostgreSQL it is created as a partitioned table by setup_archive
+archive_metadata = MetaData()
+transactions_archive = Transaction.__table__.to_metadata(archive_metadata, name="transactions_archive")
+
+POSTGRESQL_ARCHIVE_DDL = [
+    # asset_history rows keep pointing at transactions after they move to the archive
+    "ALTER TABLE asset_history DROP CONSTRAINT IF EXISTS asset_history_transaction_id_fkey",
+    'CREATE TABLE IF NOT EXISTS transactions_archive (LIKE transactions) PARTITION BY RANGE ("timestamp")',
+    'CREATE INDEX IF NOT EXISTS ix_transactions_archive_timestamp_type ON transactions_archive ("timestamp", type)',
+    "CREATE INDEX IF NOT EXISTS ix_transactions_archive_id ON transactions_archive (id)",
+    "CREATE INDEX IF NOT EXISTS ix_transactions_archive_from_owner_id ON transactions_archive (from_owner_id)",
+    "CREATE INDEX IF NOT EXISTS ix_transactions_archive_to_owner_id ON transactions_archive (to_owner_id)",
+]
+
+# turns the plain `transactions` table created from the models into a partitioned one, keeping its rows
+POSTGRESQL_PARTITION_DDL = [
+    "ALTER TABLE transactions RENAME TO transactions_unpartitioned",
+    # the id sequence would otherwise be dropped together with the old table
+    "ALTER SEQUENCE {sequence} OWNED BY NONE",
+    'CREATE TABLE transactions (LIKE transactions_unpartitioned INCLUDING DEFAULTS) PARTITION BY RANGE ("timestamp")',
+    "ALTER SEQUENCE {sequence} OWNED BY transactions.id",
+    "CREATE TABLE transactions_default PARTITION OF transactions DEFAULT",
+    # the partition key is part of the primary key, so it cannot be null
+    """UPDATE transactions_unpartitioned SET "timestamp" = now() AT TIME ZONE 'utc' WHERE "timestamp" IS NULL""",
+    "INSERT INTO transactions SELECT * FROM transactions_unpartitioned",
+    "DROP TABLE transactions_unpartitioned",
+    'ALTER TABLE transactions ADD PRIMARY KEY (id, "timestamp")',
+]
+
+
+def _relkind(connection, name: str) -> Optional[str]:
+    """'r' for a plain table, 'p' for a partitioned one, None if it does not exist."""
+    return connection.scalar(text("SELECT relkind::text FROM pg_class WHERE oid = to_regclass(:name)"), {"name": name})
+
+
+def _partition_name(month: date, table: str = "transactions") -> str:
+    return f"{table}_y{month.year}m{month.month:02d}"
+
+
+def _partition_transactions(connection):
+    sequence = connection.scalar(text("SELECT pg_get_serial_sequence('transactions', 'id')"))
+    months = connection.scalars(text(
+        """SELECT DISTINCT date_trunc('month', "timestamp")::date FROM transactions WHERE "timestamp" IS NOT NULL"""
+    )).all()
+    for statement in POSTGRESQL_PARTITION_DDL:
+        if statement.startswith("INSERT"):
+            # give the existing rows their partitions before copying them
+            for month in months:
+                _create_hot_partition(connection, month)
+        connection.execute(text(statement.format(sequence=sequence)))
+    for constraint in Transaction.__table__.foreign_key_constraints:
+        connection.execute(AddConstraint(constraint))
+    for index in Transaction.__table__.indexes:
+        index.create(bind=connection)
+
+
+def _create_hot_partition(connection, month: date):
+    name, bounds = _partition_name(month), f"FOR VALUES FROM ('{month}') TO ('{_next_month(month)}')"
+    has_default_rows = connection.scalar(text(
+        'SELECT EXISTS (SELECT 1 FROM transactions_default WHERE "timestamp" >= :start AND "timestamp" < :end)'
+    ), {"start": month, "end": _next_month(month)})
+    if not has_default_rows:
+        connection.execute(text(f"CREATE TABLE {name} PARTITION OF transactions {bounds}"))
+        return
+    # rows written before the partition existed: move them out of the default partition first
+    connection.execute(text(f"CREATE TABLE {name} (LIKE transactions INCLUDING DEFAULTS)"))
+    connection.execute(text(
+        f'WITH moved AS (DELETE FROM transactions_default WHERE "timestamp" >= :start AND "timestamp" < :end RETURNING *) '
+        f"INSERT INTO {name} SELECT * FROM moved"
+    ), {"start": month, "end": _next_month(month)})
+    connection.execute(text(f"ALTER TABLE transactions ATTACH PARTITION {name} {bounds}"))
+
+
+def ensure_hot_partitions(connection, since: Optional[date] = None):
+    """Create the partitions of the coming months (from `since` on, if given) and of any month
+    that has rows in the default partition."""
+    archived_before = connection.scalar(select(func.max(TransactionArchiveSegment.archived_before)))
+    month = (since or datetime.utcnow().date()).replace(day=1)
+    months = set(connection.scalars(text(
+        """SELECT DISTINCT date_trunc('month', "timestamp")::date FROM transactions_default WHERE "timestamp" IS NOT NULL"""
+    )).all())
+    last_month = datetime.utcnow().date().replace(day=1)
+    for _ in range(HOT_PARTITION_MONTHS_AHEAD):
+        last_month = _next_month(last_month)
+    while month <= last_month:
+        months.add(month)
+        month = _next_month(month)
+    for month in sorted(months):
+        # late rows for an archived month stay in the default partition
+        if archived_before is not None and month < archived_before.date():
+            continue
+        if _relkind(connection, _partition_name(month)) is None:
+            _create_hot_partition(connection, month)
+
+
+def setup_archive(engine):
+    """Partition `transactions` by month and create the archive table on PostgreSQL; SQLite segments need no schema."""
+    if engine.dialect.name == "postgresql":
+        with engine.begin() as connection:
+            connection.execute(text(POSTGRESQL_ARCHIVE_DDL[0]))
+            if _relkind(connection, "transactions") == "r":
+                _partition_transactions(connection)
+            for statement in POSTGRESQL_ARCHIVE_DDL[1:]:
+                connection.execute(text(statement))
+            ensure_hot_partitions(connection)
+
+
+def _next_month(day: date) -> date:
+    return (day.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+
+def _columns_from_rows(rows) -> dict:
+    columns = dict(zip(ARCHIVE_COLUMNS, zip(*rows)))
+    columns["type"] = [_TYPE_CODES[transaction_type] for transaction_type in columns["type"]]
+    return {name: np.array(columns[name], dtype=dtype) for name, dtype in ARCHIVE_COLUMNS.items()}
+
+
+def _segment_values(location: str, archived_before: datetime, groups) -> dict:
+    """Catalog row from per-type groups of (type, count, volume, min id, max id, min timestamp, max timestamp)."""
+    return {
+        "location": location,
+        "archived_before": archived_before,
+        "row_count": sum(group[1] for group in groups),
+        "min_id": min(group[3] for group in groups),
+        "max_id": max(group[4] for group in groups),
+        "min_timestamp": min(group[5] for group in groups),
+        "max_timestamp": max(group[6] for group in groups),
+        "type_counts": {group[0]: group[1] for group in groups},
+        "type_volumes": {group[0]: round(group[2], 2) for group in groups},
+    }
+
+
+def write_segment(location: str, columns: dict):
+    path = TRANSACTION_ARCHIVE_DIR / location
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_name(path.name + ".partial")
+    with open(partial, "wb") as segment_file:
+        np.savez_compressed(segment_file, type_names=np.array([t.value for t in TRANSACTION_TYPES]), **columns)
+        segment_file.flush()
+        os.fsync(segment_file.fileno())
+    os.replace(partial, path)
+
+
+def read_segment(location: str) -> dict:
+    with np.load(TRANSACTION_ARCHIVE_DIR / location) as data:
+        columns = {name: data[name] for name in ARCHIVE_COLUMNS}
+        # codes are positions in the enum as it was when the segment was written
+        lookup = np.array([_TYPE_CODES[TransactionType(name)] for name in data["type_names"]], dtype=np.int8)
+    columns["type"] = lookup[columns["type"]]
+    return columns
+
+
+def _archive_month_to_segments(bind, start: datetime, end: datetime, archived_before: datetime) -> list:
+    segments = []
+    while True:
+        with bind.begin() as connection:
+            # SQLite reuses the highest rowid once it is deleted, so the newest row always stays hot
+            newest_id = connection.scalar(select(func.max(Transaction.id)))
+            in_month = (Transaction.timestamp >= start, Transaction.timestamp < end, Transaction.id < newest_id)
+            rows = connection.execute(
+                select(*Transaction.__table__.columns).where(*in_month)
+                .order_by(Transaction.id).limit(TRANSACTION_ARCHIVE_SEGMENT_ROWS)
+            ).all()
+            if not rows:
+                return segments
+            columns = _columns_from_rows(rows)
+            min_id, max_id = int(columns["id"][0]), int(columns["id"][-1])
+            location = f"{start:%Y-%m}/{min_id}-{max_id}.npz"
+            write_segment(location, columns)
+            connection.execute(delete(Transaction).where(*in_month, Transaction.id.between(min_id, max_id)))
+
+            groups = []
+            for code, transaction_type in enumerate(TRANSACTION_TYPES):
+                selected = columns["type"] == code
+                if selected.any():
+                    ids, timestamps = columns["id"][selected], columns["timestamp"][selected]
+                    groups.append((
+                        transaction_type.value, int(selected.sum()), float(columns["amount"][selected].sum()),
+                        int(ids.min()), int(ids.max()), timestamps.min().item(), timestamps.max().item(),
+                    ))
+            segment = _segment_values(location, archived_before, groups)
+            connection.execute(insert(TransactionArchiveSegment).values(**segment))
+        segments.append(segment)
+        if len(rows) < TRANSACTION_ARCHIVE_SEGMENT_ROWS:
+            return segments
+
+
+def _archive_month_partition(bind, start: datetime, end: datetime, archived_before: datetime) -> list:
+    month = start.date()
+    name, archived_name = _partition_name(month), _partition_name(month, "transactions_archive")
+    with bind.begin() as connection:
+        if _relkind(connection, name) is None:
+            return []
+        groups = connection.execute(text(
+            f'SELECT type::text, count(*), sum(amount), min(id), max(id), min("timestamp"), max("timestamp") '
+            f"FROM {name} GROUP BY type"
+        )).all()
+        connection.execute(text(f"ALTER TABLE transactions DETACH PARTITION {name}"))
+        if _relkind(connection, archived_name) is None:
+            connection.execute(text(f"ALTER TABLE {name} RENAME TO {archived_name}"))
+            connection.execute(text(
+                f"ALTER TABLE transactions_archive ATTACH PARTITION {archived_name} "
+                f"FOR VALUES FROM ('{month}') TO ('{_next_month(month)}')"
+            ))
+        else:
+            # the month already has archived rows: append to them and drop the detached table whole
+            connection.execute(text(f"INSERT INTO {archived_name} SELECT * FROM {name}"))
+            connection.execute(text(f"DROP TABLE {name}"))
+        if not groups:
+            return []
+        # the enum stores member names, the catalog uses values like the rest of the API
+        groups = [(TransactionType[name].value, count, float(volume), *rest) for name, count, volume, *rest in groups]
+        segment = _segment_values(archived_name, archived_before, groups)
+        connection.execute(insert(TransactionArchiveSegment).values(**segment))
+    return [segment]
+
+
+def archive_cutoff(older_than_days: int) -> datetime:
+    """Start of the month that contains the day `older_than_days` ago."""
+    day = datetime.utcnow().date() - timedelta(days=older_than_days)
+    return datetime.combine(day.replace(day=1), time.min)
+
+
+def archive_transactions(bind=engine, older_than_days: int = TRANSACTION_ARCHIVE_HOT_DAYS) -> list:
+    """Move every month that ended before `older_than_days` ago to the archive.
+
+    Returns the catalog rows written, one per segment (SQLite) or per month (PostgreSQL).
+    """
+    if older_than_days < MIN_HOT_DAYS:
+        raise ValueError(f"Transactions from the last {MIN_HOT_DAYS} days must stay in the hot table")
+    cutoff = archive_cutoff(older_than_days)
+    archive_month = _archive_month_to_segments
+    if bind.dialect.name == "postgresql":
+        archive_month = _archive_month_partition
+        with bind.begin() as connection:
+            ensure_hot_partitions(connection)
+    with bind.connect() as connection:
+        oldest = connection.scalar(select(func.min(Transaction.timestamp)).where(Transaction.timestamp < cutoff))
+
+    segments = []
+    month = oldest.date().replace(day=1) if oldest else None
+    while month is not None and month < cutoff.date():
+        start = datetime.combine(month, time.min)
+        segments += archive_month(bind, start, datetime.combine(_next_month(month), time.min), cutoff)
+        month = _next_month(month)
+    return segments
+
+
+async def archive_state(db: AsyncSession):
+    """(id of the newest segment or 0, the archive boundary or None); changes after every archival run."""
+    latest_segment_id, archived_before = (await db.execute(select(
+        func.max(TransactionArchiveSegment.id), func.max(TransactionArchiveSegment.archived_before)
+    ))).one()
+    return latest_segment_id or 0, archived_before
+
+
+def range_reaches_archive(archived_before: Optional[datetime], start_date: Optional[date], end_date: Optional[date]) -> bool:
+    """Whether an explicit date bound falls before the archive boundary."""
+    if archived_before is None:
+        return False
+    return any(bound is not None and bound < archived_before.date() for bound in (start_date, end_date))
+
+
+async def archived_type_counts(db: AsyncSession) -> dict:
+    """Archived transactions per type, from the catalog alone."""
+    counts = {transaction_type: 0 for transaction_type in TransactionType}
+    for type_counts in count_rows_returned((await db.scalars(select(TransactionArchiveSegment.type_counts))).all()):
+        for name, count in type_counts.items():
+            counts[TransactionType(name)] += count
+    return counts
+
+
+async def iter_archived_columns(
+    db: AsyncSession, start: Optional[datetime] = None, end: Optional[datetime] = None
+) -> AsyncIterator[dict]:
+    """Archived transactions as ARCHIVE_COLUMNS arrays, in batches ordered by id.
+
+    Batches are whole segments on SQLite, so they can include rows outside [start, end).
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        query = select(*(transactions_archive.c[name] for name in ARCHIVE_COLUMNS)).order_by(transactions_archive.c.id)
+        if start is not None:
+            query = query.where(transactions_archive.c.timestamp >= start)
+        if end is not None:
+            query = query.where(transactions_archive.c.timestamp < end)
+        result = await db.stream(query.execution_options(yield_per=ARCHIVE_FETCH_SIZE))
+        async for rows in result.partitions():
+            yield _columns_from_rows(count_rows_returned(rows))
+        return
+
+    query = select(TransactionArchiveSegment.location).order_by(TransactionArchiveSegment.min_id)
+    if start is not None:
+        query = query.where(TransactionArchiveSegment.max_timestamp >= start)
+    if end is not None:
+        query = query.where(TransactionArchiveSegment.min_timestamp < end)
+    for location in count_rows_returned((await db.scalars(query)).all()):
+        yield await asyncio.to_thread(read_segment, location)
+
+
+async def iter_archived_rows(
+    db: AsyncSession,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    type: Optional[TransactionType] = None,
+    owner_id: Optional[int] = None,
+) -> AsyncIterator[list]:
+    """Archived transactions matching the export filters, as batches of row tuples in table column order."""
+    start = datetime.combine(start_date, time.min) if start_date else None
+    end = datetime.combine(end_date + timedelta(days=1), time.min) if end_date else None
+    async for columns in iter_archived_columns(db, start, end):
+        mask = np.ones(len(columns["id"]), dtype=bool)
+        if start is not None:
+            mask &= columns["timestamp"] >= np.datetime64(start, "us")
+        if end is not None:
+            mask &= columns["timestamp"] < np.datetime64(end, "us")
+        if type is not None:
+            mask &= columns["type"] == _TYPE_CODES[type]
+        if owner_id is not None:
+            mask &= (columns["from_owner_id"] == owner_id) | (columns["to_owner_id"] == owner_id)
+        selected = {name: column[mask] for name, column in columns.items()}
+        # only one batch at a time becomes Python objects, so memory stays flat as in the hot export
+        for offset in range(0, int(mask.sum()), EXPORT_BATCH_SIZE):
+            batch = {name: column[offset:offset + EXPORT_BATCH_SIZE].tolist() for name, column in selected.items()}
+            batch["type"] = [TRANSACTION_TYPES[code] for code in batch["type"]]
+            yield list(zip(*batch.values()))
+
+
+def count_archivable(bind=engine, older_than_days: int = TRANSACTION_ARCHIVE_HOT_DAYS) -> int:
+    with bind.connect() as connection:
+        return connection.scalar(
+            select(func.count(Transaction.id)).where(Transaction.timestamp < archive_cutoff(older_than_days))
+        )
+
+
+def vacuum(bind=engine):
+    """Return the space freed by archiving: SQLite only reuses deleted pages otherwise."""
+    with bind.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.exec_driver_sql("VACUUM" if bind.dialect.name == "sqlite" else "VACUUM ANALYZE transactions")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move old transactions out of the hot transactions table.")
+    parser.add_argument("--older-than-days", type=int, default=TRANSACTION_ARCHIVE_HOT_DAYS,
+                        help=f"archive every month that ended before this many days ago (at least {MIN_HOT_DAYS})")
+    parser.add_argument("--dry-run", action="store_true", help="only count the transactions that would be archived")
+    parser.add_argument("--vacuum", action="store_true", help="reclaim the freed space afterwards")
+    args = parser.parse_args()
+    if args.older_than_days < MIN_HOT_DAYS:
+        parser.error(f"--older-than-days must be at least {MIN_HOT_DAYS}")
+
+    cutoff = archive_cutoff(args.older_than_days)
+    if args.dry_run:
+        print(f"INFO:     {count_archivable(engine, args.older_than_days)} transactions from before {cutoff:%Y-%m-%d} would be archived.")
+    else:
+        segments = archive_transactions(engine, args.older_than_days)
+        archived = sum(segment["row_count"] for segment in segments)
+        print(f"INFO:     Archived {archived} transactions from before {cutoff:%Y-%m-%d} into {len(segments)} segments.")
+        if args.vacuum:
+            vacuum(engine)
+            print("INFO:     Database vacuumed.")
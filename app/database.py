@@ -1,22 +1,126 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import NullPool
 import os
 
 SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./sql_app.db")
+# optional replica for read-only traffic (GET routes); defaults to the primary
+SQLALCHEMY_READ_DATABASE_URL = os.getenv("DATABASE_READ_URL") or SQLALCHEMY_DATABASE_URL
 
-connect_args = {"check_same_thread": False} if SQLALCHEMY_DATABASE_URL.startswith("sqlite") else {}
+# async drivers used by the request path; the sync engine is kept for schema setup and scripts
+ASYNC_DRIVERS = {"sqlite": "aiosqlite", "postgresql": "asyncpg"}
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args=connect_args
-)
+# DB_POOL_PROFILE picks a preset; DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT and
+# DB_POOL_RECYCLE override individual settings
+POOL_PROFILES = {
+    "small": {"pool_size": 2, "max_overflow": 3, "pool_timeout": 10, "pool_recycle": 1800},
+    "default": {"pool_size": 5, "max_overflow": 10, "pool_timeout": 30, "pool_recycle": 1800},
+    "large": {"pool_size": 20, "max_overflow": 30, "pool_timeout": 30, "pool_recycle": 1800},
+}
+
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+}
+
+
+def get_async_url(url: str):
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend in ASYNC_DRIVERS:
+        url = url.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}")
+    return url
+
+
+def get_pool_options(url: str) -> dict:
+    url = make_url(url)
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        # in-memory SQLite uses a single static connection
+        return {}
+    options = dict(POOL_PROFILES[os.getenv("DB_POOL_PROFILE", "default")])
+    for key, env in (("pool_size", "DB_POOL_SIZE"), ("max_overflow", "DB_MAX_OVERFLOW"),
+                     ("pool_timeout", "DB_POOL_TIMEOUT"), ("pool_recycle", "DB_POOL_RECYCLE")):
+        if os.getenv(env):
+            options[key] = int(os.getenv(env))
+    options["pool_pre_ping"] = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+    return options
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+
+def _engine_options(url: str) -> dict:
+    connect_args = {"check_same_thread": False} if url.startswith("sqlite") else {}
+    return {"connect_args": connect_args, **get_pool_options(url)}
+
+
+def _configure_engine(sync_engine):
+    if sync_engine.dialect.name == "sqlite":
+        event.listen(sync_engine, "connect", _set_sqlite_pragmas)
+    return sync_engine
+
+
+engine = _configure_engine(create_engine(
+    SQLALCHEMY_DATABASE_URL, **_engine_options(SQLALCHEMY_DATABASE_URL)
+))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+async_engine = create_async_engine(
+    get_async_url(SQLALCHEMY_DATABASE_URL), **_engine_options(SQLALCHEMY_DATABASE_URL)
+)
+_configure_engine(async_engine.sync_engine)
+# expire_on_commit=False so handlers can keep reading committed objects without an implicit (sync) refresh
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+if SQLALCHEMY_READ_DATABASE_URL == SQLALCHEMY_DATABASE_URL:
+    async_read_engine = async_engine
+else:
+    async_read_engine = create_async_engine(
+        get_async_url(SQLALCHEMY_READ_DATABASE_URL), **_engine_options(SQLALCHEMY_READ_DATABASE_URL)
+    )
+    _configure_engine(async_read_engine.sync_engine)
+
+
+class ReadOnlySession(Session):
+    """Session for read routes; refuses to flush so writes never land on a replica."""
+
+    def flush(self, objects=None):
+        if self.new or self.dirty or self.deleted:
+            raise RuntimeError("Attempted to write through a read-only session")
+        super().flush(objects)
+
+
+def create_unpooled_async_engine(url: str = SQLALCHEMY_READ_DATABASE_URL):
+    """Engine for work that runs outside the app's event loop (e.g. report job workers).
+
+    Pooled connections are tied to the loop that opened them, so these engines open a fresh
+    connection per use instead of sharing the app's pool.
+    """
+    connect_args = {"check_same_thread": False} if url.startswith("sqlite") else {}
+    unpooled_engine = create_async_engine(get_async_url(url), poolclass=NullPool, connect_args=connect_args)
+    _configure_engine(unpooled_engine.sync_engine)
+    return unpooled_engine
+
+
+AsyncReadSessionLocal = async_sessionmaker(
+    async_read_engine, class_=AsyncSession, sync_session_class=ReadOnlySession,
+    autoflush=False, expire_on_commit=False,
+)
+
 Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def get_read_db():
+    async with AsyncReadSessionLocal() as db:
         yield db
-    finally:
-        db.close()
\ No newline at end of file
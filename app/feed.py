@@ -0,0 +1,138 @@
+"""In-process fan-out of committed transactions to live subscribers.
+
+Session events collect every Transaction row flushed through the ORM. When the session
+commits, each one is published as a `transaction` event, followed by one `report_delta`
+event: the commit's transaction count, volume, per-type counts and net change in asset
+value, which a dashboard can add to its last report instead of polling for a new one.
+
+Every subscriber has a bounded queue of FEED_CLIENT_BUFFER events. Publishing never waits.
+A subscriber whose queue is full is dropped: its queue is emptied and closed, and its
+stream ends with a `dropped` event so the client can reconnect and resync.
+
+Only commits made in this process are seen, so run one feed per API process (or put a
+shared broker in front of several).
+"""
+import asyncio
+import itertools
+import os
+from collections import Counter
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from app.models import Asset, Transaction
+from app.schemas import Transaction as TransactionSchema
+
+FEED_CLIENT_BUFFER = int(os.getenv("FEED_CLIENT_BUFFER", "256"))
+FEED_MAX_CLIENTS = int(os.getenv("FEED_MAX_CLIENTS", "100"))
+FEED_HEARTBEAT_SECONDS = float(os.getenv("FEED_HEARTBEAT_SECONDS", "15"))
+
+FEED_TRANSACTION_FIELDS = tuple(TransactionSchema.model_fields)
+
+
+class Subscription:
+    def __init__(self, maxsize: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = False
+
+    async def get(self) -> Optional[dict]:
+        """Next event, or None once the subscription has been dropped."""
+        return await self.queue.get()
+
+
+class TransactionFeed:
+    def __init__(self):
+        self.subscribers = set()
+        self.dropped = 0
+        self._ids = itertools.count(1)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def subscribe(self) -> Optional[Subscription]:
+        """A new subscription, or None when FEED_MAX_CLIENTS are already connected."""
+        if len(self.subscribers) >= FEED_MAX_CLIENTS:
+            return None
+        self._loop = asyncio.get_running_loop()
+        subscription = Subscription(FEED_CLIENT_BUFFER)
+        self.subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self.subscribers.discard(subscription)
+
+    def publish(self, events: list):
+        """Queue `events` for every subscriber; safe to call from any thread."""
+        if not self.subscribers or self._loop is None:
+            return
+        try:
+            in_loop = asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            in_loop = False
+        if in_loop:
+            self._fan_out(events)
+        elif not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._fan_out, events)
+
+    def _fan_out(self, events: list):
+        events = [{"id": next(self._ids), **item} for item in events]
+        for subscription in list(self.subscribers):
+            try:
+                for item in events:
+                    subscription.queue.put_nowait(item)
+            except asyncio.QueueFull:
+                self._drop(subscription)
+
+    def _drop(self, subscription: Subscription):
+        # slow consumer: discard its backlog and wake it with the end-of-stream marker
+        self.subscribers.discard(subscription)
+        subscription.dropped = True
+        self.dropped += 1
+        while not subscription.queue.empty():
+            subscription.queue.get_nowait()
+        subscription.queue.put_nowait(None)
+
+
+transaction_feed = TransactionFeed()
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_transactions(session, flush_context):
+    for obj in session.new:
+        if isinstance(obj, Transaction):
+            session.info.setdefault("feed_transactions", []).append(
+                {field: getattr(obj, field) for field in FEED_TRANSACTION_FIELDS}
+            )
+    for obj in session.dirty:
+        if isinstance(obj, Asset):
+            # attribute history still holds the pre-flush value here
+            history = inspect(obj).attrs.value.history
+            if history.added and history.deleted:
+                session.info["feed_value_change"] = (
+                    session.info.get("feed_value_change", 0.0) + history.added[0] - history.deleted[0]
+                )
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_committed(session):
+    transactions = session.info.pop("feed_transactions", None)
+    value_change = session.info.pop("feed_value_change", 0.0)
+    if not transactions:
+        return
+    # keys follow ReportResponse where they correspond to a report field
+    transaction_feed.publish([
+        *({"event": "transaction", "data": t} for t in transactions),
+        {"event": "report_delta", "data": {
+            "committed_at": datetime.utcnow(),
+            "recent_transactions": len(transactions),
+            "transaction_volume": round(sum(t["amount"] for t in transactions), 2),
+            "transaction_types_distribution": dict(Counter(t["type"].value for t in transactions)),
+            "total_asset_value": round(value_change, 2),
+        }},
+    ])
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rolled_back(session):
+    session.info.pop("feed_transactions", None)
+    session.info.pop("feed_value_change", None)
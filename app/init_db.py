@@ -0,0 +1,149 @@
+"""One-time database initialization, kept out of the serving path.
+
+Creates missing tables, adds columns and indexes introduced since the tables were created,
+sets up the asset name search index and the transaction archive, and seeds the default
+admin user:
+
+    python -m app.init_db
+
+Run it once per deploy, before starting the API workers. It records a fingerprint of the
+schema it applied. Each worker only reads that fingerprint at startup and refuses to start
+if it does not match, instead of running DDL on every boot. Set DB_AUTO_INIT=true to let a
+worker initialize the database itself. That is convenient for local development with a
+single process.
+"""
+import argparse
+import asyncio
+import hashlib
+import logging
+import os
+from typing import Optional
+
+from sqlalchemy import inspect, select, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.schema import CreateColumn
+
+from app.archive import POSTGRESQL_ARCHIVE_DDL, POSTGRESQL_PARTITION_DDL, setup_archive
+from app.database import AsyncSessionLocal, Base, async_engine, engine
+from app.models import SchemaRevision, User, UserRole
+from app.rollups import ROLLUP_TABLES, record_new_users
+from app.routers.auth import get_password_hash
+from app.search import POSTGRESQL_TRGM_DDL, SQLITE_FTS_DDL, setup_name_search
+
+logger = logging.getLogger(__name__)
+
+DB_AUTO_INIT = os.getenv("DB_AUTO_INIT", "false").lower() in ("1", "true", "yes")
+
+DEFAULT_ADMIN_USERNAME = "admin"
+DEFAULT_ADMIN_EMAIL = "admin@test.com"
+DEFAULT_ADMIN_PASSWORD = "12345678"
+
+
+def schema_fingerprint() -> str:
+    """Hash of every table, column and index in the models plus the search index and archive DDL."""
+    parts = []
+    for table in Base.metadata.sorted_tables:
+        parts.append(f"table {table.name}")
+        parts += [f"column {column.name} {column.type.compile()} {column.nullable}" for column in table.columns]
+        parts += sorted(f"index {index.name} {[column.name for column in index.columns]}" for index in table.indexes)
+    parts += SQLITE_FTS_DDL + POSTGRESQL_TRGM_DDL + POSTGRESQL_ARCHIVE_DDL + POSTGRESQL_PARTITION_DDL
+    return hashlib.sha1("\n".join(parts).encode()).hexdigest()
+
+
+def read_schema_revision(connection) -> Optional[str]:
+    try:
+        return connection.scalar(select(SchemaRevision.revision).order_by(SchemaRevision.id.desc()).limit(1))
+    except DBAPIError:
+        # no schema_revision table yet
+        return None
+
+
+def upgrade_schema(bind=engine):
+    """Bring the database up to the current models; existing tables and rows are kept.
+
+    Rollup tables whose primary key changed are recreated; they hold one row per day and
+    type, so their rows are copied over in memory. The rollups of archived days cannot be
+    recomputed from the raw tables.
+    """
+    for table in ROLLUP_TABLES:
+        if not inspect(bind).has_table(table.name):
+            continue
+        if set(inspect(bind).get_pk_constraint(table.name)["constrained_columns"]) != set(table.primary_key.columns.keys()):
+            existing_columns = [column["name"] for column in inspect(bind).get_columns(table.name)]
+            with bind.begin() as connection:
+                rows = [row._asdict() for row in connection.execute(select(*(table.c[name] for name in existing_columns)))]
+                # plain DROP TABLE: table.drop() would also drop the enum types other tables use
+                connection.execute(text(f"DROP TABLE {table.name}"))
+                Base.metadata.create_all(bind=connection, tables=[table])
+                if rows:
+                    connection.execute(table.insert(), rows)
+    Base.metadata.create_all(bind=bind)
+    # create_all skips existing tables, so add columns and indexes introduced since they were created
+    for table in Base.metadata.sorted_tables:
+        existing_columns = {column["name"] for column in inspect(bind).get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing_columns:
+                with bind.begin() as connection:
+                    connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {CreateColumn(column).compile(dialect=bind.dialect)}"))
+        for index in table.indexes:
+            index.create(bind=bind, checkfirst=True)
+    setup_name_search(bind)
+    setup_archive(bind)
+    with bind.begin() as connection:
+        connection.execute(SchemaRevision.__table__.insert().values(revision=schema_fingerprint()))
+
+
+async def create_default_admin():
+    async with AsyncSessionLocal() as db:
+        admin_user = await db.scalar(select(User).where(User.username == DEFAULT_ADMIN_USERNAME))
+        if not admin_user:
+            default_admin = User(
+                username=DEFAULT_ADMIN_USERNAME,
+                email=DEFAULT_ADMIN_EMAIL,
+                hashed_password=get_password_hash(DEFAULT_ADMIN_PASSWORD),
+                role=UserRole.ADMIN
+            )
+            db.add(default_admin)
+            await db.flush()
+            await record_new_users(db, [default_admin.created_at])
+            await db.commit()
+            print(f"INFO:     Default admin user '{DEFAULT_ADMIN_USERNAME}' created.")
+
+
+async def ensure_schema_current():
+    """Startup check: one SELECT when the schema is current."""
+    async with async_engine.connect() as connection:
+        revision = await connection.run_sync(read_schema_revision)
+    if revision == schema_fingerprint():
+        return
+    if not DB_AUTO_INIT:
+        raise RuntimeError("The database schema is missing or out of date: run `python -m app.init_db` first")
+    logger.warning("Database schema out of date, initializing it (DB_AUTO_INIT is set)")
+    await asyncio.to_thread(upgrade_schema, engine)
+    await create_default_admin()
+
+
+def init_database(force: bool = False, seed_admin: bool = True) -> bool:
+    """Upgrade the schema unless it is already current; returns whether it was upgraded."""
+    with engine.connect() as connection:
+        upgraded = force or read_schema_revision(connection) != schema_fingerprint()
+    if upgraded:
+        upgrade_schema(engine)
+    if seed_admin:
+        async def seed():
+            await create_default_admin()
+            await async_engine.dispose()
+
+        asyncio.run(seed())
+    return upgraded
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create or upgrade the database schema and seed the default admin.")
+    parser.add_argument("--force", action="store_true", help="run the upgrade even if the schema looks current")
+    parser.add_argument("--no-admin", action="store_true", help="do not create the default admin user")
+    args = parser.parse_args()
+    if init_database(force=args.force, seed_admin=not args.no_admin):
+        print("INFO:     Database schema initialized.")
+    else:
+        print("INFO:     Database schema is current.")
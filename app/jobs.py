@@ -0,0 +1,149 @@
+"""Background report jobs run on a local worker pool, with no external broker.
+
+`submit_job` hands the computation to a process pool (REPORT_JOB_EXECUTOR=thread for a
+thread pool) and returns immediately. Jobs and their results live in memory. Identical
+requests (same kind and parameters, same data version) reuse the job that is already
+queued, running or finished, so they share one computation. Finished results are reused
+for REPORT_JOB_RESULT_TTL_SECONDS.
+
+Workers open their own unpooled engine, so a job never holds one of the request path's
+pooled connections. It reads the primary: the reuse key is the data version, which a lagging
+replica may not have caught up with yet.
+"""
+import asyncio
+import multiprocessing
+import os
+import uuid
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Optional
+
+import orjson
+from fastapi import HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.database import SQLALCHEMY_DATABASE_URL, ReadOnlySession, create_unpooled_async_engine
+from app.utils import TTLCache
+from app.versioning import data_version
+
+REPORT_JOB_EXECUTOR = os.getenv("REPORT_JOB_EXECUTOR", "process")
+REPORT_JOB_WORKERS = int(os.getenv("REPORT_JOB_WORKERS", "2"))
+REPORT_JOB_MAX_PENDING = int(os.getenv("REPORT_JOB_MAX_PENDING", str(REPORT_JOB_WORKERS * 16)))
+REPORT_JOB_RESULT_TTL_SECONDS = float(os.getenv("REPORT_JOB_RESULT_TTL_SECONDS", "300"))
+# how long a job id can be polled; also bounds memory with REPORT_JOB_MAX_STORED
+REPORT_JOB_RETENTION_SECONDS = float(os.getenv("REPORT_JOB_RETENTION_SECONDS", "3600"))
+REPORT_JOB_MAX_STORED = int(os.getenv("REPORT_JOB_MAX_STORED", "1000"))
+
+
+@dataclass
+class Job:
+    id: str
+    kind: str
+    params: dict
+    future: Future
+    created_at: datetime = field(default_factory=datetime.utcnow)
+    finished_at: Optional[datetime] = None
+
+    @property
+    def status(self) -> str:
+        if self.future.done():
+            return "failed" if self.future.cancelled() or self.future.exception() else "done"
+        return "running" if self.future.running() else "queued"
+
+    def to_dict(self) -> dict:
+        job_status = self.status
+        error = None
+        if job_status == "failed":
+            error = "cancelled" if self.future.cancelled() else str(self.future.exception()) or type(self.future.exception()).__name__
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "params": self.params,
+            "status": job_status,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "result": self.future.result() if job_status == "done" else None,
+            "error": error,
+        }
+
+
+jobs = TTLCache(maxsize=REPORT_JOB_MAX_STORED, ttl=REPORT_JOB_RETENTION_SECONDS)
+# (kind, params, data version) -> job id, for sharing identical computations
+job_ids_by_key = TTLCache(maxsize=REPORT_JOB_MAX_STORED, ttl=REPORT_JOB_RESULT_TTL_SECONDS)
+
+_job_executor: Optional[Executor] = None
+_pending_jobs = set()
+
+
+def get_job_executor() -> Executor:
+    global _job_executor
+    if _job_executor is None:
+        if REPORT_JOB_EXECUTOR == "thread":
+            _job_executor = ThreadPoolExecutor(max_workers=REPORT_JOB_WORKERS, thread_name_prefix="report-job")
+        else:
+            # spawn, not fork: the parent has a running event loop and driver threads
+            _job_executor = ProcessPoolExecutor(
+                max_workers=REPORT_JOB_WORKERS, mp_context=multiprocessing.get_context("spawn")
+            )
+    return _job_executor
+
+
+def shutdown_job_executor():
+    global _job_executor
+    if _job_executor is not None:
+        _job_executor.shutdown(wait=False, cancel_futures=True)
+        _job_executor = None
+
+
+async def _compute(kind: str, params: dict):
+    # imported here: the routers import this module, and workers only need them when a job runs
+    from app.routers.analytics import build_graph_data
+    from app.routers.reports import build_report
+
+    job_engine = create_unpooled_async_engine(SQLALCHEMY_DATABASE_URL)
+    try:
+        async with async_sessionmaker(job_engine, class_=AsyncSession, sync_session_class=ReadOnlySession)() as db:
+            if kind == "report":
+                result = await build_report(db, **params)
+            else:
+                result = await build_graph_data(db, **params)
+    finally:
+        await job_engine.dispose()
+    # plain JSON types, so the result pickles cheaply and serializes without options
+    return orjson.loads(orjson.dumps(result, option=orjson.OPT_NON_STR_KEYS))
+
+
+def run_job(kind: str, params: dict):
+    """Worker entry point: runs one job on a fresh event loop."""
+    return asyncio.run(_compute(kind, params))
+
+
+def submit_job(kind: str, params: dict) -> Job:
+    key = (kind, tuple(sorted(params.items())), data_version.value)
+    existing = jobs.get(job_ids_by_key.get(key))
+    if existing is not None and existing.status != "failed":
+        return existing
+
+    if len(_pending_jobs) >= REPORT_JOB_MAX_PENDING:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many report jobs queued, please retry shortly",
+            headers={"Retry-After": "5"},
+        )
+    future = get_job_executor().submit(run_job, kind, params)
+    job = Job(id=uuid.uuid4().hex, kind=kind, params=params, future=future)
+    _pending_jobs.add(future)
+
+    def finished(done_future):
+        job.finished_at = datetime.utcnow()
+        _pending_jobs.discard(done_future)
+
+    future.add_done_callback(finished)
+    jobs.set(job.id, job)
+    job_ids_by_key.set(key, job.id)
+    return job
+
+
+def get_job(job_id: str) -> Optional[Job]:
+    return jobs.get(job_id)
@@ -1,30 +1,14 @@
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from app.routers import users, assets, transactions, reports, analytics, auth
-from app.database import engine, SessionLocal
-from app.models import Base, User, UserRole
-from app.routers.auth import get_password_hash
-
-def create_default_admin_on_startup():
-    db = SessionLocal()
-    try:
-        admin_user = db.query(User).filter(User.username == "admin").first()
-        if not admin_user:
-            hashed_password = get_password_hash("12345678")
-            default_admin = User(
-                username="admin",
-                email="admin@test.com",
-                hashed_password=hashed_password,
-                role=UserRole.ADMIN
-            )
-            db.add(default_admin)
-            db.commit()
-            print("INFO:     Default admin user 'admin' created.")
-    finally:
-        db.close()
-
-
-Base.metadata.create_all(bind=engine)
+from app.database import async_engine, async_read_engine
+from app.feed import transaction_feed
+from app.init_db import ensure_schema_current
+from app.jobs import shutdown_job_executor
+from app.middleware import CompressionMiddleware
+from app.metrics import METRICS_PUBLIC, MetricsMiddleware, instrument_engine, registry
+from app.routers.auth import get_current_admin_user, principal_cache, shutdown_password_executor
 
 app = FastAPI(
     title="FastAPI Asset Management Backend",
@@ -34,7 +18,15 @@ app = FastAPI(
 
 @app.on_event("startup")
 async def startup_event():
-    create_default_admin_on_startup()
+    # schema setup and admin seeding live in `python -m app.init_db`
+    await ensure_schema_current()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    shutdown_password_executor()
+    shutdown_job_executor()
+    await async_engine.dispose()
+    await async_read_engine.dispose()
 
 # CORS middleware
 app.add_middleware(
@@ -45,6 +37,30 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# gzip/brotli and weak ETags; inside the metrics middleware so 304s are counted
+app.add_middleware(CompressionMiddleware)
+
+# per-route latency and SQL cost, published on /metrics
+instrument_engine(async_engine.sync_engine)
+if async_read_engine is not async_engine:
+    instrument_engine(async_read_engine.sync_engine)
+app.add_middleware(MetricsMiddleware)
+
+# route names, traffic and SQL cost are admin-only unless METRICS_PUBLIC is set
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False,
+         dependencies=[] if METRICS_PUBLIC else [Depends(get_current_admin_user)])
+async def metrics():
+    cache_stats = principal_cache.stats()
+    return registry.render({
+        "principal_cache_hits_total": ("counter", cache_stats["hits"]),
+        "principal_cache_misses_total": ("counter", cache_stats["misses"]),
+        "principal_cache_size": ("gauge", cache_stats["size"]),
+        "asset_version_conflicts_retried_total": ("counter", transactions.version_conflicts.retried),
+        "asset_version_conflicts_rejected_total": ("counter", transactions.version_conflicts.rejected),
+        "transaction_feed_subscribers": ("gauge", len(transaction_feed.subscribers)),
+        "transaction_feed_dropped_total": ("counter", transaction_feed.dropped),
+    })
+
 # routers
 app.include_router(users.router, prefix="/users", tags=["users"])
 app.include_router(assets.router, prefix="/assets", tags=["assets"])
@@ -0,0 +1,213 @@
+"""Per-request SQL instrumentation and a Prometheus text exposition for `/metrics`.
+
+`MetricsMiddleware` opens a `RequestStats` for each HTTP request; the engine listeners
+installed by `instrument_engine` add every statement's count and time to it, and the rows
+written by INSERT/UPDATE/DELETE. Rows returned are counted where results are materialized,
+by passing them through `count_rows_returned`. When a request finishes, its latency and
+totals are folded into per-route metrics. Requests that run more than METRICS_QUERY_BUDGET
+statements are logged as possible N+1 patterns.
+"""
+import logging
+import os
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from threading import Lock
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# 0 disables the N+1 warning
+METRICS_QUERY_BUDGET = int(os.getenv("METRICS_QUERY_BUDGET", "0"))
+# serve /metrics without authentication, e.g. when only an internal scraper can reach the app
+METRICS_PUBLIC = os.getenv("METRICS_PUBLIC", "false").lower() == "true"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+@dataclass
+class RequestStats:
+    queries: int = 0
+    db_time: float = 0.0
+    rows_written: int = 0
+    rows_returned: int = 0
+
+
+current_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("current_request_stats", default=None)
+
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+@dataclass
+class RouteMetrics:
+    latency: Histogram
+    queries_per_request: Histogram
+    queries: int = 0
+    db_time: float = 0.0
+    rows_written: int = 0
+    rows_returned: int = 0
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.routes: Dict[Tuple[str, str], RouteMetrics] = {}
+        self.responses: Dict[Tuple[str, str, int], int] = {}
+        self._lock = Lock()
+
+    def observe_request(self, method: str, route: str, status_code: int, duration: float, stats: RequestStats):
+        with self._lock:
+            metrics = self.routes.get((method, route))
+            if metrics is None:
+                metrics = self.routes[(method, route)] = RouteMetrics(
+                    latency=Histogram(LATENCY_BUCKETS), queries_per_request=Histogram(QUERY_COUNT_BUCKETS)
+                )
+            metrics.latency.observe(duration)
+            metrics.queries_per_request.observe(stats.queries)
+            metrics.queries += stats.queries
+            metrics.db_time += stats.db_time
+            metrics.rows_written += stats.rows_written
+            metrics.rows_returned += stats.rows_returned
+            key = (method, route, status_code)
+            self.responses[key] = self.responses.get(key, 0) + 1
+
+    def render(self, extra_metrics: Optional[Dict[str, Tuple[str, float]]] = None) -> str:
+        """Prometheus text format; `extra_metrics` maps a name to (type, value) for process-wide values."""
+        lines = []
+
+        def family(name, kind, help_text):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        def histogram(name, labels, hist):
+            for bound, count in zip(hist.buckets, hist.counts):
+                lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {hist.count}')
+            lines.append(f"{name}_sum{{{labels}}} {hist.sum}")
+            lines.append(f"{name}_count{{{labels}}} {hist.count}")
+
+        with self._lock:
+            routes = sorted(self.routes.items())
+            responses = sorted(self.responses.items())
+
+        family("http_requests_total", "counter", "HTTP responses by route and status code.")
+        for (method, route, status_code), count in responses:
+            lines.append(f'http_requests_total{{method="{method}",route="{route}",status="{status_code}"}} {count}')
+
+        family("http_request_duration_seconds", "histogram", "Request latency by route.")
+        for (method, route), metrics in routes:
+            histogram("http_request_duration_seconds", f'method="{method}",route="{route}"', metrics.latency)
+
+        family("db_queries_per_request", "histogram", "SQL statements executed per request.")
+        for (method, route), metrics in routes:
+            histogram("db_queries_per_request", f'method="{method}",route="{route}"', metrics.queries_per_request)
+
+        for name, attr, help_text in (
+            ("db_queries_total", "queries", "SQL statements executed while serving the route."),
+            ("db_query_duration_seconds_total", "db_time", "Time spent in SQL statements while serving the route."),
+            ("db_rows_written_total", "rows_written", "Rows inserted, updated or deleted while serving the route."),
+            ("db_rows_returned_total", "rows_returned", "Result rows fetched while serving the route."),
+        ):
+            family(name, "counter", help_text)
+            for (method, route), metrics in routes:
+                lines.append(f'{name}{{method="{method}",route="{route}"}} {getattr(metrics, attr)}')
+
+        for name, (kind, value) in (extra_metrics or {}).items():
+            lines.append(f"# TYPE {name} {kind}")
+            lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start_time"].pop()
+    stats = current_request_stats.get()
+    if stats is None:
+        return
+    stats.queries += 1
+    stats.db_time += elapsed
+    # rowcount is not defined for SELECTs; returned rows are counted by count_rows_returned
+    if (context.isinsert or context.isupdate or context.isdelete) and cursor.rowcount > 0:
+        stats.rows_written += cursor.rowcount
+
+
+def count_rows_returned(rows):
+    """Add `rows`, a materialized result, to the current request's returned rows; returns it unchanged."""
+    stats = current_request_stats.get()
+    if stats is not None:
+        stats.rows_returned += len(rows)
+    return rows
+
+
+def _handle_error(context):
+    # a failed statement never reaches after_cursor_execute; drop its start time so the next
+    # statement on this connection does not pop it
+    if context.execution_context is not None and context.connection is not None:
+        start_times = context.connection.info.get("query_start_time")
+        if start_times:
+            start_times.pop()
+
+
+def instrument_engine(engine):
+    """Attach the per-request SQL listeners to a sync Engine (use `async_engine.sync_engine`)."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware, so streaming responses pass through unbuffered."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = current_request_stats.set(stats)
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            duration = time.perf_counter() - started
+            current_request_stats.reset(token)
+            route = scope.get("route")
+            route_path = getattr(route, "path", "unmatched")
+            registry.observe_request(scope["method"], route_path, status_code, duration, stats)
+            if METRICS_QUERY_BUDGET and stats.queries > METRICS_QUERY_BUDGET:
+                logger.warning(
+                    "Possible N+1: %s %s ran %d SQL statements (budget %d, %.1f ms in the database)",
+                    scope["method"], route_path, stats.queries, METRICS_QUERY_BUDGET, stats.db_time * 1000,
+                )
@@ -0,0 +1,152 @@
+"""Response compression and conditional GET handling.
+
+`CompressionMiddleware` is pure ASGI. It buffers a response only when the whole body
+arrives in a single message, which covers every ordinary JSON response. Streaming
+responses such as exports send their body in several messages and pass through
+untouched, so they are never held in memory.
+
+For a buffered response it:
+
+* adds a weak ETag to successful GET responses under ETAG_PATH_PREFIXES that don't already
+  carry one, and answers a matching If-None-Match with 304 Not Modified;
+* compresses bodies of at least COMPRESSION_MIN_SIZE bytes with brotli (when the optional
+  `brotli` package is installed) or gzip, according to the client's Accept-Encoding. A
+  strong ETag set by the route is weakened on an encoded body, whose bytes differ from the
+  identity ones, and `Vary: Accept-Encoding` is added.
+"""
+import gzip
+import hashlib
+import os
+
+try:
+    import brotli
+except ImportError:  # optional; gzip is always available
+    brotli = None
+
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+
+ETAG_PATH_PREFIXES = ("/assets", "/users", "/reports", "/analytics")
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/x-ndjson")
+
+
+def accepted_encodings(accept_encoding: str) -> set:
+    """Encodings with a non-zero q-value in an Accept-Encoding header."""
+    encodings = set()
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if name and q > 0:
+            encodings.add(name.strip().lower())
+    return encodings
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    # weak comparison (RFC 9110 8.8.3.2): W/ prefixes are ignored
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_headers = {key.decode("latin-1"): value.decode("latin-1") for key, value in scope["headers"]}
+        encodings = accepted_encodings(request_headers.get("accept-encoding", ""))
+        wants_etag = scope["method"] == "GET" and scope["path"].startswith(ETAG_PATH_PREFIXES)
+        start_message = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+            if message.get("more_body", False):
+                # streaming response: forward as is from here on
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+            await self._send_buffered(start_message, message.get("body", b""), request_headers, encodings, wants_etag, send)
+
+        await self.app(scope, receive, send_wrapper)
+
+    async def _send_buffered(self, start_message, body, request_headers, encodings, wants_etag, send):
+        status_code = start_message["status"]
+        headers = [(key.decode("latin-1").lower(), value.decode("latin-1")) for key, value in start_message.get("headers", [])]
+        names = {key for key, _ in headers}
+
+        if status_code == 304 and "etag" in names:
+            # a route's own 304: answer with the tag the client holds, weakened if it got an encoded body
+            client_tags = [tag.strip() for tag in request_headers.get("if-none-match", "").split(",")]
+            if any(key == "etag" and f"W/{value}" in client_tags for key, value in headers):
+                headers = [(key, _weaken(value) if key == "etag" else value) for key, value in headers]
+                headers = _add_vary(headers)
+
+        if wants_etag and status_code == 200 and "etag" not in names:
+            etag = f'W/"{hashlib.sha1(body).hexdigest()}"'
+            headers.append(("etag", etag))
+            if "cache-control" not in names:
+                headers.append(("cache-control", "private, no-cache"))
+            if etag_matches(request_headers.get("if-none-match", ""), etag):
+                headers = [(key, value) for key, value in headers if key not in ("content-length", "content-type")]
+                await send({"type": "http.response.start", "status": 304, "headers": _encode(headers)})
+                await send({"type": "http.response.body", "body": b""})
+                return
+
+        content_type = dict(headers).get("content-type", "")
+        if (
+            len(body) >= self.minimum_size
+            and "content-encoding" not in names
+            and content_type.startswith(COMPRESSIBLE_TYPES)
+        ):
+            encoding = None
+            if brotli is not None and "br" in encodings:
+                encoding, body = "br", brotli.compress(body, quality=COMPRESSION_BROTLI_QUALITY)
+            elif "gzip" in encodings:
+                encoding, body = "gzip", gzip.compress(body, compresslevel=COMPRESSION_GZIP_LEVEL)
+            headers = [(key, value) for key, value in _add_vary(headers) if key != "content-length"]
+            headers.append(("content-length", str(len(body))))
+            if encoding:
+                headers = [(key, _weaken(value) if key == "etag" else value) for key, value in headers]
+                headers.append(("content-encoding", encoding))
+
+        await send({**start_message, "headers": _encode(headers)})
+        await send({"type": "http.response.body", "body": body})
+
+
+def _weaken(etag: str) -> str:
+    return etag if etag.startswith("W/") else f"W/{etag}"
+
+
+def _add_vary(headers):
+    vary = [value for key, value in headers if key == "vary"]
+    if any(item.strip().lower() == "accept-encoding" for value in vary for item in value.split(",")):
+        return headers
+    return [(key, value) for key, value in headers if key != "vary"] + [("vary", ", ".join(vary + ["Accept-Encoding"]))]
+
+
+def _encode(headers):
+    return [(key.encode("latin-1"), value.encode("latin-1")) for key, value in headers]
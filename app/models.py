@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Enum as SQLAlchemyEnum
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, ForeignKey, Index, JSON, Enum as SQLAlchemyEnum
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.database import Base
@@ -24,7 +24,7 @@ class User(Base):
     username = Column(String, unique=True, index=True, nullable=False)
     email = Column(String, unique=True, index=True, nullable=False)
     hashed_password = Column(String, nullable=False)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
     role = Column(SQLAlchemyEnum(UserRole, name="user_role_enum"), nullable=False, default=UserRole.USER)
     
     transactions = relationship("Transaction", back_populates="user", foreign_keys="Transaction.user_id")
@@ -37,25 +37,139 @@ class Asset(Base):
     name = Column(String, index=True, nullable=False)
     type = Column(SQLAlchemyEnum(AssetType, name="asset_type_enum"), nullable=False)
     value = Column(Float, nullable=False)
-    owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    owner_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    # bumped on every ORM update, which is issued as UPDATE ... WHERE id = ? AND version = ?
+    version = Column(Integer, nullable=False, default=1, server_default="1")
     
     owner = relationship("User", back_populates="assets")
     transactions = relationship("Transaction", back_populates="asset")
 
+    __table_args__ = (
+        # type distribution and per-type value scans; value alone serves "most valuable"
+        Index("ix_assets_type_value", "type", "value"),
+        Index("ix_assets_value", "value"),
+        # GET /assets filters: an owner's assets of a type in a value range; a type in a date range
+        Index("ix_assets_owner_id_type_value", "owner_id", "type", "value"),
+        Index("ix_assets_type_created_at", "type", "created_at"),
+        # name_prefix on PostgreSQL: outside the C locale, LIKE 'prefix%' needs byte-wise ordering
+        Index("ix_assets_name_pattern", "name", postgresql_ops={"name": "text_pattern_ops"}).ddl_if(dialect="postgresql"),
+    )
+    __mapper_args__ = {"version_id_col": version}
+
 class Transaction(Base):
     __tablename__ = "transactions"
     
     id = Column(Integer, primary_key=True, index=True)
     amount = Column(Float, nullable=False)
     type = Column(SQLAlchemyEnum(TransactionType, name="transaction_type_enum"), nullable=False)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    asset_id = Column(Integer, ForeignKey("assets.id"), nullable=False)
-    from_owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    to_owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    asset_id = Column(Integer, ForeignKey("assets.id"), nullable=False, index=True)
+    from_owner_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    to_owner_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
     timestamp = Column(DateTime, default=datetime.utcnow)
     
     user = relationship("User", back_populates="transactions", foreign_keys=[user_id])
     asset = relationship("Asset", back_populates="transactions")
     from_owner = relationship("User", foreign_keys=[from_owner_id])
-    to_owner = relationship("User", foreign_keys=[to_owner_id])
\ No newline at end of file
+    to_owner = relationship("User", foreign_keys=[to_owner_id])
+
+    __table_args__ = (
+        # time-range scans, optionally narrowed by type
+        Index("ix_transactions_timestamp_type", "timestamp", "type"),
+    )
+
+# Daily rollups maintained in the same DB transaction as the writes they summarise
+# (see app/rollups.py); /analytics/graphs reads these instead of scanning the raw tables.
+# Each day is spread over ROLLUP_SLOTS rows so concurrent writers rarely lock the same
+# row; readers always SUM over the slots.
+class DailyUserStat(Base):
+    __tablename__ = "daily_user_stats"
+
+    date = Column(Date, primary_key=True)
+    slot = Column(Integer, primary_key=True, default=0, server_default="0")
+    new_users = Column(Integer, nullable=False, default=0)
+
+class DailyAssetStat(Base):
+    __tablename__ = "daily_asset_stats"
+
+    date = Column(Date, primary_key=True)
+    type = Column(SQLAlchemyEnum(AssetType, name="asset_type_enum"), primary_key=True)
+    slot = Column(Integer, primary_key=True, default=0, server_default="0")
+    asset_count = Column(Integer, nullable=False, default=0)
+    total_value = Column(Float, nullable=False, default=0.0)
+
+class DailyTransactionStat(Base):
+    __tablename__ = "daily_transaction_stats"
+
+    date = Column(Date, primary_key=True)
+    type = Column(SQLAlchemyEnum(TransactionType, name="transaction_type_enum"), primary_key=True)
+    slot = Column(Integer, primary_key=True, default=0, server_default="0")
+    transaction_count = Column(Integer, nullable=False, default=0)
+    volume = Column(Float, nullable=False, default=0.0)
+
+# Append-only ownership/valuation log and per-user portfolio snapshots (see app/portfolio.py).
+# Each history row is an asset's (owner, value) from `recorded_at` until its next row.
+class AssetHistory(Base):
+    __tablename__ = "asset_history"
+
+    id = Column(Integer, primary_key=True)
+    asset_id = Column(Integer, ForeignKey("assets.id"), nullable=False)
+    owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    previous_owner_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    value = Column(Float, nullable=False)
+    # not a foreign key: the transaction may since have been moved to the archive (see app/archive.py)
+    transaction_id = Column(Integer, nullable=True)
+    recorded_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        # a user's events after a checkpoint, from both sides of a change of ownership
+        Index("ix_asset_history_owner_id_id", "owner_id", "id"),
+        Index("ix_asset_history_previous_owner_id_id", "previous_owner_id", "id"),
+        Index("ix_asset_history_asset_id_id", "asset_id", "id"),
+    )
+
+class PortfolioCheckpoint(Base):
+    __tablename__ = "portfolio_checkpoints"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    # covers every asset_history row with id <= history_id
+    history_id = Column(Integer, nullable=False)
+    taken_at = Column(DateTime, nullable=False)
+    asset_count = Column(Integer, nullable=False)
+    total_value = Column(Float, nullable=False)
+    # [[asset_id, value], ...]
+    holdings = Column(JSON, nullable=False)
+
+    __table_args__ = (
+        Index("ix_portfolio_checkpoints_user_id_taken_at", "user_id", "taken_at"),
+    )
+
+# One row per batch of transactions moved out of the hot `transactions` table (see app/archive.py).
+# The per-type totals let reports count archived transactions without reading them.
+class TransactionArchiveSegment(Base):
+    __tablename__ = "transaction_archive_segments"
+
+    id = Column(Integer, primary_key=True)
+    # segment file under TRANSACTION_ARCHIVE_DIR (SQLite) or partition of transactions_archive (PostgreSQL)
+    location = Column(String, nullable=False)
+    # the run that wrote this segment archived every transaction older than this
+    archived_before = Column(DateTime, nullable=False)
+    row_count = Column(Integer, nullable=False)
+    min_id = Column(Integer, nullable=False)
+    max_id = Column(Integer, nullable=False)
+    min_timestamp = Column(DateTime, nullable=False)
+    max_timestamp = Column(DateTime, nullable=False)
+    # {type: count} and {type: summed amount}
+    type_counts = Column(JSON, nullable=False)
+    type_volumes = Column(JSON, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+class SchemaRevision(Base):
+    __tablename__ = "schema_revision"
+
+    id = Column(Integer, primary_key=True)
+    # fingerprint of the schema the database was last initialized with, see app.init_db
+    revision = Column(String, nullable=False)
+    applied_at = Column(DateTime, default=datetime.utcnow, nullable=False)
@@ -0,0 +1,195 @@
+"""Asset ownership/valuation history and as-of portfolio lookups.
+
+Every asset creation and every sell/transfer appends a row to `asset_history`, inside the
+caller's session like the rollups. Once a user has PORTFOLIO_CHECKPOINT_INTERVAL history
+rows since their last checkpoint, their current holdings are snapshotted into
+`portfolio_checkpoints`. `portfolio_as_of` starts from the nearest checkpoint at or before
+the requested time and replays the rows up to the next checkpoint, at most about that many.
+
+History starts when this table is introduced. To seed it for assets that predate it (one
+row per asset with its current owner and value) and checkpoint every user:
+
+    python -m app.portfolio
+"""
+import os
+from collections import defaultdict
+from datetime import datetime
+from typing import Iterable, Tuple
+
+from sqlalchemy import exists, func, insert, literal, or_, select, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import Base, engine
+from app.metrics import count_rows_returned
+from app.models import Asset, AssetHistory, PortfolioCheckpoint, User
+
+PORTFOLIO_CHECKPOINT_INTERVAL = int(os.getenv("PORTFOLIO_CHECKPOINT_INTERVAL", "50"))
+
+HISTORY_TABLES = [AssetHistory.__table__, PortfolioCheckpoint.__table__]
+
+
+async def record_asset_creations(db: AsyncSession, rows: Iterable[Tuple[int, int, float, datetime]]):
+    """rows: (asset_id, owner_id, value, created_at) of newly inserted assets."""
+    await _append(db, [
+        {"asset_id": asset_id, "owner_id": owner_id, "previous_owner_id": None,
+         "value": value, "transaction_id": None, "recorded_at": created_at}
+        for asset_id, owner_id, value, created_at in rows
+    ])
+
+
+async def record_ownership_changes(db: AsyncSession, db_transactions: Iterable):
+    """Flushed Transaction rows, in the order they were applied.
+
+    A sell sets the value to its amount and a transfer records the value it moved at, so
+    `amount` is the asset's value after the transaction in both cases.
+    """
+    await _append(db, [
+        {"asset_id": t.asset_id, "owner_id": t.to_owner_id, "previous_owner_id": t.from_owner_id,
+         "value": t.amount, "transaction_id": t.id, "recorded_at": t.timestamp}
+        for t in db_transactions
+    ])
+
+
+async def _append(db: AsyncSession, rows: list):
+    if not rows:
+        return
+    user_ids = {row["owner_id"] for row in rows} | {row["previous_owner_id"] for row in rows if row["previous_owner_id"]}
+    await _lock_users(db, user_ids)
+    history_ids = count_rows_returned((await db.scalars(insert(AssetHistory).returning(AssetHistory.id), rows)).all())
+    await _write_due_checkpoints(db, user_ids, max(history_ids))
+
+
+async def _lock_users(db: AsyncSession, user_ids: set):
+    """Hold the users' rows until commit: FOR UPDATE on PostgreSQL; SQLite already serializes writers.
+
+    Without it, a transaction could checkpoint a user past a history row that another, still
+    uncommitted transaction inserted for them with a smaller id, and that row would never be
+    replayed. Taken before inserting, so each user's history ids also follow commit order.
+    """
+    # a fixed lock order, so two writers touching the same users cannot deadlock
+    await db.execute(select(User.id).where(User.id.in_(user_ids)).order_by(User.id).with_for_update())
+
+
+def _last_checkpoint_id(user_id_column):
+    return func.coalesce(
+        select(func.max(PortfolioCheckpoint.history_id))
+        .where(PortfolioCheckpoint.user_id == user_id_column)
+        .scalar_subquery(),
+        0,
+    )
+
+
+async def _write_due_checkpoints(db: AsyncSession, user_ids: set, history_id: int):
+    """Checkpoint the users with at least PORTFOLIO_CHECKPOINT_INTERVAL rows since their last one."""
+    events = union_all(
+        select(AssetHistory.owner_id.label("user_id")).where(
+            AssetHistory.owner_id.in_(user_ids), AssetHistory.id > _last_checkpoint_id(AssetHistory.owner_id)
+        ),
+        select(AssetHistory.previous_owner_id.label("user_id")).where(
+            AssetHistory.previous_owner_id.in_(user_ids), AssetHistory.id > _last_checkpoint_id(AssetHistory.previous_owner_id)
+        ),
+    ).subquery()
+    due = count_rows_returned((await db.scalars(
+        select(events.c.user_id).group_by(events.c.user_id).having(func.count() >= PORTFOLIO_CHECKPOINT_INTERVAL)
+    )).all())
+    if due:
+        await write_checkpoints(db, due, history_id)
+
+
+async def write_checkpoints(db: AsyncSession, user_ids: Iterable[int], history_id: int):
+    """Snapshot the current holdings of `user_ids`, covering the history up to `history_id`.
+
+    Pass the largest id this transaction inserted, with the users locked by `_lock_users`: a
+    global max(id) can be ahead of rows that concurrent transactions inserted but have not
+    committed yet, and those would never be replayed. Rows after `history_id` that the
+    snapshot already reflects replay to the same state.
+    """
+    user_ids = list(user_ids)
+    holdings = defaultdict(list)
+    for owner_id, asset_id, value in count_rows_returned((await db.execute(
+        select(Asset.owner_id, Asset.id, Asset.value).where(Asset.owner_id.in_(user_ids)).order_by(Asset.id)
+    )).all()):
+        holdings[owner_id].append([asset_id, value])
+
+    taken_at = datetime.utcnow()
+    await db.execute(insert(PortfolioCheckpoint), [
+        {"user_id": user_id, "history_id": history_id, "taken_at": taken_at,
+         "asset_count": len(holdings[user_id]), "total_value": sum(value for _, value in holdings[user_id]),
+         "holdings": holdings[user_id]}
+        for user_id in user_ids
+    ])
+
+
+async def portfolio_as_of(db: AsyncSession, user_id: int, as_of: datetime) -> dict:
+    """{asset_id: value} held by `user_id` at `as_of`: the nearest checkpoint plus the rows after it.
+
+    The rows are read up to the first checkpoint taken after `as_of`, when there is one, so
+    the scan stays within one checkpoint interval however far back `as_of` is.
+    """
+    checkpoint = (await db.execute(
+        select(PortfolioCheckpoint.history_id, PortfolioCheckpoint.holdings)
+        .where(PortfolioCheckpoint.user_id == user_id, PortfolioCheckpoint.taken_at <= as_of)
+        .order_by(PortfolioCheckpoint.taken_at.desc())
+        .limit(1)
+    )).first()
+    holdings = {asset_id: value for asset_id, value in checkpoint.holdings} if checkpoint else {}
+    next_history_id = await db.scalar(
+        select(PortfolioCheckpoint.history_id)
+        .where(PortfolioCheckpoint.user_id == user_id, PortfolioCheckpoint.taken_at > as_of)
+        .order_by(PortfolioCheckpoint.taken_at)
+        .limit(1)
+    )
+
+    id_range = [AssetHistory.id > (checkpoint.history_id if checkpoint else 0)]
+    if next_history_id is not None:
+        id_range.append(AssetHistory.id <= next_history_id)
+    events = count_rows_returned((await db.execute(
+        select(AssetHistory.asset_id, AssetHistory.owner_id, AssetHistory.value)
+        .where(
+            or_(AssetHistory.owner_id == user_id, AssetHistory.previous_owner_id == user_id),
+            AssetHistory.recorded_at <= as_of,
+            *id_range,
+        )
+        .order_by(AssetHistory.id)
+    )).all())
+    for asset_id, owner_id, value in events:
+        if owner_id == user_id:
+            holdings[asset_id] = value
+        else:
+            holdings.pop(asset_id, None)
+    return holdings
+
+
+def seed_history(connection):
+    """Add a history row for every asset that has none, at its current owner and value."""
+    now = datetime.utcnow()
+    connection.execute(insert(AssetHistory).from_select(
+        ["asset_id", "owner_id", "value", "recorded_at"],
+        select(Asset.id, Asset.owner_id, Asset.value, literal(now, AssetHistory.recorded_at.type))
+        .where(~exists().where(AssetHistory.asset_id == Asset.id)),
+    ))
+
+
+async def checkpoint_all_users(db: AsyncSession, batch_size: int = 500):
+    """Checkpoint every user; like seed_history, run it while no transactions are being written."""
+    history_id = await db.scalar(select(func.coalesce(func.max(AssetHistory.id), 0)))
+    user_ids = (await db.scalars(select(User.id).order_by(User.id))).all()
+    for start in range(0, len(user_ids), batch_size):
+        await write_checkpoints(db, user_ids[start:start + batch_size], history_id)
+
+
+if __name__ == "__main__":
+    import asyncio
+    from app.database import AsyncSessionLocal, async_engine
+
+    async def seed_checkpoints():
+        async with AsyncSessionLocal() as db:
+            await checkpoint_all_users(db)
+            await db.commit()
+        await async_engine.dispose()
+
+    Base.metadata.create_all(bind=engine, tables=HISTORY_TABLES)
+    with engine.begin() as connection:
+        seed_history(connection)
+    asyncio.run(seed_checkpoints())
+    print("INFO:     Asset history seeded and portfolios checkpointed.")
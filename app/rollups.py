@@ -0,0 +1,133 @@
+"""Daily rollups of users, assets and transactions.
+
+The `record_*` helpers run inside the caller's session, so the rollup rows commit (or roll
+back) together with the rows they describe. Values are keyed by creation date, and a sell
+adjusts the day the asset was created, which keeps the totals equal to a GROUP BY over the
+raw tables.
+
+Each write adds to one of ROLLUP_SLOTS rows per key, picked at random, instead of a single
+row per day. On PostgreSQL the upserted row stays locked until the writer commits, so a
+single row per day would make every concurrent transaction queue behind the others.
+Readers sum over the slots.
+
+To backfill an existing database or rebuild the rollups from scratch:
+
+    python -m app.rollups
+"""
+import os
+import random
+from collections import defaultdict
+from datetime import datetime
+from typing import Iterable, Tuple
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import Base, engine
+from app.models import (
+    User, Asset, Transaction, DailyUserStat, DailyAssetStat, DailyTransactionStat, TransactionArchiveSegment,
+    AssetType, TransactionType,
+)
+
+ROLLUP_TABLES = [DailyUserStat.__table__, DailyAssetStat.__table__, DailyTransactionStat.__table__]
+
+ROLLUP_SLOTS = int(os.getenv("ROLLUP_SLOTS", "16"))
+
+
+async def _increment(db: AsyncSession, model, key_columns: list, increments: dict):
+    """Add `increments` ({key tuple: {column: delta}}) to the rollup rows, creating missing ones."""
+    if not increments:
+        return
+    upsert = sqlite_insert if db.get_bind().dialect.name == "sqlite" else postgresql_insert
+    value_columns = list(next(iter(increments.values())))
+    slot = random.randrange(ROLLUP_SLOTS)
+    stmt = upsert(model)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=key_columns + ["slot"],
+        set_={column: getattr(model, column) + stmt.excluded[column] for column in value_columns},
+    )
+    # keys in a fixed order, so two writers never lock the same rows in opposite orders
+    await db.execute(stmt, [
+        dict(zip(key_columns, key), slot=slot, **values) for key, values in sorted(increments.items())
+    ])
+
+
+async def record_new_users(db: AsyncSession, created_ats: Iterable[datetime]):
+    increments = defaultdict(lambda: {"new_users": 0})
+    for created_at in created_ats:
+        increments[(created_at.date(),)]["new_users"] += 1
+    await _increment(db, DailyUserStat, ["date"], increments)
+
+
+async def _add_asset_stats(db: AsyncSession, rows: Iterable[Tuple[datetime, AssetType, float]], count_each: int):
+    increments = defaultdict(lambda: {"asset_count": 0, "total_value": 0.0})
+    for created_at, asset_type, value in rows:
+        values = increments[(created_at.date(), asset_type)]
+        values["asset_count"] += count_each
+        values["total_value"] += value
+    await _increment(db, DailyAssetStat, ["date", "type"], increments)
+
+
+async def record_new_assets(db: AsyncSession, rows: Iterable[Tuple[datetime, AssetType, float]]):
+    """rows: (created_at, type, value) of newly inserted assets."""
+    await _add_asset_stats(db, rows, 1)
+
+
+async def record_asset_value_changes(db: AsyncSession, rows: Iterable[Tuple[datetime, AssetType, float]]):
+    """rows: (created_at, type, value delta) of existing assets whose value changed."""
+    await _add_asset_stats(db, (row for row in rows if row[2]), 0)
+
+
+async def record_transactions(db: AsyncSession, rows: Iterable[Tuple[datetime, TransactionType, float]]):
+    """rows: (timestamp, type, amount) of newly inserted transactions."""
+    increments = defaultdict(lambda: {"transaction_count": 0, "volume": 0.0})
+    for timestamp, transaction_type, amount in rows:
+        values = increments[(timestamp.date(), transaction_type)]
+        values["transaction_count"] += 1
+        values["volume"] += amount
+    await _increment(db, DailyTransactionStat, ["date", "type"], increments)
+
+
+def rebuild_rollups(connection):
+    """Recompute every rollup table from the raw tables with set-based INSERT ... SELECT.
+
+    Transaction rollups of days that were moved to the archive (see app/archive.py) are kept.
+    """
+    archived_before = connection.scalar(select(func.max(TransactionArchiveSegment.archived_before)))
+    connection.execute(delete(DailyUserStat))
+    connection.execute(delete(DailyAssetStat))
+    if archived_before is None:
+        connection.execute(delete(DailyTransactionStat))
+    else:
+        connection.execute(delete(DailyTransactionStat).where(DailyTransactionStat.date >= archived_before.date()))
+
+    user_date = func.date(User.created_at)
+    connection.execute(insert(DailyUserStat).from_select(
+        ["date", "new_users"],
+        select(user_date, func.count(User.id)).group_by(user_date),
+    ))
+
+    asset_date = func.date(Asset.created_at)
+    connection.execute(insert(DailyAssetStat).from_select(
+        ["date", "type", "asset_count", "total_value"],
+        select(asset_date, Asset.type, func.count(Asset.id), func.sum(Asset.value)).group_by(asset_date, Asset.type),
+    ))
+
+    transaction_date = func.date(Transaction.timestamp)
+    transaction_stats = select(
+        transaction_date, Transaction.type, func.count(Transaction.id), func.sum(Transaction.amount)
+    ).group_by(transaction_date, Transaction.type)
+    if archived_before is not None:
+        transaction_stats = transaction_stats.where(Transaction.timestamp >= archived_before)
+    connection.execute(insert(DailyTransactionStat).from_select(
+        ["date", "type", "transaction_count", "volume"], transaction_stats,
+    ))
+
+
+if __name__ == "__main__":
+    Base.metadata.create_all(bind=engine, tables=ROLLUP_TABLES + [TransactionArchiveSegment.__table__])
+    with engine.begin() as connection:
+        rebuild_rollups(connection)
+    print("INFO:     Daily rollups rebuilt.")
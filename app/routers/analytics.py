@@ -1,81 +1,138 @@
 from fastapi import APIRouter, Depends, Query, HTTPException
-from sqlalchemy.orm import Session
-from sqlalchemy import func, cast, Date
-from datetime import date
-from app.models import User, Asset, Transaction
-from app.database import get_db
+from sqlalchemy import Date, cast, func, select, type_coerce
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import date, timedelta
+from app.models import User, DailyUserStat, DailyAssetStat, DailyTransactionStat, AssetType, TransactionType
+from app.database import get_read_db
+from app.metrics import count_rows_returned
 from app.routers.auth import get_current_admin_user
-from typing import Dict, Any, Optional
+from app.archive import range_reaches_archive
+from app.snapshot import analytics_snapshot, build_distributions
+from app.utils import date_range_filters
+from typing import Dict, Any, List, Optional
 
 router = APIRouter()
 
-@router.get("/graphs")
-def get_platform_graph_data(
-    start_date: Optional[date] = Query(None, description="Filter data from this date. Format: YYYY-MM-DD, it is optional"),
-    end_date: Optional[date] = Query(None, description="Filter data up to this date. Format: YYYY-MM-DD, it is optional"),
-    current_user: User = Depends(get_current_admin_user),
-    db: Session = Depends(get_db)
+GRANULARITIES = ("day", "week", "month")
+
+def bucket_start(day: date, granularity: str) -> date:
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "month":
+        return day.replace(day=1)
+    return day
+
+def next_bucket(bucket: date, granularity: str) -> date:
+    if granularity == "week":
+        return bucket + timedelta(days=7)
+    if granularity == "month":
+        return (bucket + timedelta(days=32)).replace(day=1)
+    return bucket + timedelta(days=1)
+
+def count_buckets(start: date, end: date, granularity: str) -> int:
+    if granularity == "week":
+        return (bucket_start(end, "week") - bucket_start(start, "week")).days // 7 + 1
+    if granularity == "month":
+        return (end.year - start.year) * 12 + end.month - start.month + 1
+    return (end - start).days + 1
+
+def _bucket_column(column, granularity: str, dialect_name: str):
+    """SQL expression truncating a rollup date to the start of its (ISO, Monday-based) bucket."""
+    if granularity == "day":
+        return column
+    if dialect_name == "postgresql":
+        return cast(func.date_trunc(granularity, column), Date)
+    if granularity == "week":
+        # next Sunday (or the same day), then back to that week's Monday
+        return type_coerce(func.date(column, "weekday 0", "-6 days"), Date)
+    return type_coerce(func.date(column, "start of month"), Date)
+
+def _gap_filled(rows, buckets: List[date], value, empty=0) -> list:
+    by_bucket = {row.bucket: row for row in rows}
+    return [value(by_bucket[bucket]) if bucket in by_bucket else empty for bucket in buckets]
+
+async def _data_date_range(db: AsyncSession):
+    bounds = (await db.execute(select(
+        *(select(func.min(model.date)).scalar_subquery() for model in (DailyUserStat, DailyAssetStat, DailyTransactionStat)),
+        *(select(func.max(model.date)).scalar_subquery() for model in (DailyUserStat, DailyAssetStat, DailyTransactionStat)),
+    ))).one()
+    minimums = [value for value in bounds[:3] if value is not None]
+    maximums = [value for value in bounds[3:] if value is not None]
+    return (min(minimums) if minimums else None), (max(maximums) if maximums else None)
+
+async def build_graph_data(
+    db: AsyncSession,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    granularity: str = "auto",
+    max_points: int = 366,
 ) -> Dict[str, Any]:
-    if start_date and end_date and start_date > end_date:
-        raise HTTPException(
-            status_code=400,
-            detail="start_date cannot be after end_date."
-        )
+    """Bucketed, gap-filled platform series read from the daily rollup tables.
+
+    With `auto`, the finest granularity that keeps every series within `max_points` is used,
+    so query work and payload size stay bounded however wide the date range is.
+    """
+    # All series come from the daily rollup tables, so the cost is O(days) rather than O(rows)
+    def date_filters(model):
+        return date_range_filters(model.date, start_date, end_date)
 
-    user_date_col = cast(User.created_at, Date)
-    asset_date_col = cast(Asset.created_at, Date)
-    transaction_date_col = cast(Transaction.timestamp, Date)
+    range_start, range_end = start_date, end_date
+    if range_start is None or range_end is None:
+        data_start, data_end = await _data_date_range(db)
+        range_start = range_start or data_start
+        range_end = range_end or data_end
+
+    if granularity == "auto":
+        granularity = "month"
+        if range_start and range_end:
+            granularity = next(
+                (g for g in GRANULARITIES if count_buckets(range_start, range_end, g) <= max_points), "month"
+            )
+
+    buckets = []
+    if range_start and range_end and range_start <= range_end:
+        bucket = bucket_start(range_start, granularity)
+        while bucket <= range_end:
+            buckets.append(bucket)
+            bucket = next_bucket(bucket, granularity)
+
+    dialect_name = db.get_bind().dialect.name
+    user_bucket = _bucket_column(DailyUserStat.date, granularity, dialect_name).label("bucket")
+    asset_bucket = _bucket_column(DailyAssetStat.date, granularity, dialect_name).label("bucket")
+    transaction_bucket = _bucket_column(DailyTransactionStat.date, granularity, dialect_name).label("bucket")
 
     # User growth data
-    user_growth_query = db.query(
-        user_date_col.label("date"),
-        func.count(User.id).label("count")
-    )
-    if start_date:
-        user_growth_query = user_growth_query.filter(user_date_col >= start_date)
-    if end_date:
-        user_growth_query = user_growth_query.filter(user_date_col <= end_date)
-    user_growth = user_growth_query.group_by(user_date_col).order_by(user_date_col).all()
-
-    # Base query for platform assets with date filters
-    platform_asset_query = db.query(Asset)
-    if start_date:
-        platform_asset_query = platform_asset_query.filter(asset_date_col >= start_date)
-    if end_date:
-        platform_asset_query = platform_asset_query.filter(asset_date_col <= end_date)
-    
-    platform_total_asset_value_by_date = platform_asset_query.with_entities(
-        asset_date_col.label("date"),
-        func.sum(Asset.value).label("total_value")
-    ).group_by(asset_date_col).order_by(asset_date_col).all()
-
-    platform_asset_distribution = platform_asset_query.with_entities(
-        Asset.type,
-        func.count(Asset.id).label("count"),
-        func.sum(Asset.value).label("total_value")
-    ).group_by(Asset.type).all()
-
-    # Base query for platform transactions with date filters
-    platform_transaction_query = db.query(Transaction)
-    if start_date:
-        platform_transaction_query = platform_transaction_query.filter(transaction_date_col >= start_date)
-    if end_date:
-        platform_transaction_query = platform_transaction_query.filter(transaction_date_col <= end_date)
-
-    platform_transaction_volume = platform_transaction_query.with_entities(
-        transaction_date_col.label("date"),
-        func.sum(Transaction.amount).label("volume")
-    ).group_by(transaction_date_col).order_by(transaction_date_col).all()
-
-    platform_average_transaction_size_by_date = platform_transaction_query.with_entities(
-        transaction_date_col.label("date"),
-        func.avg(Transaction.amount).label("avg_size")
-    ).group_by(transaction_date_col).order_by(transaction_date_col).all()
+    user_growth = count_rows_returned((await db.execute(select(
+        user_bucket,
+        func.sum(DailyUserStat.new_users).label("count")
+    ).where(*date_filters(DailyUserStat)).group_by(user_bucket))).all())
+
+    asset_filters = date_filters(DailyAssetStat)
 
+    platform_total_asset_value_by_date = count_rows_returned((await db.execute(select(
+        asset_bucket,
+        func.sum(DailyAssetStat.total_value).label("total_value")
+    ).where(*asset_filters).group_by(asset_bucket))).all())
+
+    platform_asset_distribution = count_rows_returned((await db.execute(select(
+        DailyAssetStat.type,
+        func.sum(DailyAssetStat.asset_count).label("count"),
+        func.sum(DailyAssetStat.total_value).label("total_value")
+    ).where(*asset_filters).group_by(DailyAssetStat.type))).all())
+
+    # Volume and average size per bucket share one pass over the transaction rollup
+    platform_transactions_by_date = count_rows_returned((await db.execute(select(
+        transaction_bucket,
+        func.sum(DailyTransactionStat.volume).label("volume"),
+        func.sum(DailyTransactionStat.transaction_count).label("count")
+    ).where(*date_filters(DailyTransactionStat)).group_by(transaction_bucket))).all())
+
+    dates = [bucket.isoformat() for bucket in buckets]
     return {
+        "granularity": granularity,
         "user_growth": {
-            "dates": [item.date.isoformat() for item in user_growth],
-            "counts": [item.count for item in user_growth]
+            "dates": dates,
+            "counts": _gap_filled(user_growth, buckets, lambda item: item.count)
         },
         "asset_distribution": {
             "types": [item.type.value for item in platform_asset_distribution],
@@ -83,15 +140,60 @@ def get_platform_graph_data(
             "values": [round(float(item.total_value or 0), 2) for item in platform_asset_distribution]
         },
         "transaction_volume": {
-            "dates": [item.date.isoformat() for item in platform_transaction_volume],
-            "volumes": [round(float(item.volume or 0), 2) for item in platform_transaction_volume]
+            "dates": dates,
+            "volumes": _gap_filled(platform_transactions_by_date, buckets, lambda item: round(float(item.volume or 0), 2), 0.0)
         },
         "total_asset_value_by_date": {
-            "dates": [item.date.isoformat() for item in platform_total_asset_value_by_date],
-            "values": [round(float(item.total_value or 0), 2) for item in platform_total_asset_value_by_date]
+            "dates": dates,
+            "values": _gap_filled(platform_total_asset_value_by_date, buckets, lambda item: round(float(item.total_value or 0), 2), 0.0)
         },
         "average_transaction_size_by_date": {
-            "dates": [item.date.isoformat() for item in platform_average_transaction_size_by_date],
-            "avg_sizes": [round(float(item.avg_size or 0), 2) for item in platform_average_transaction_size_by_date]
+            "dates": dates,
+            "avg_sizes": _gap_filled(
+                platform_transactions_by_date, buckets,
+                lambda item: round(float(item.volume or 0) / item.count, 2) if item.count else 0.0, 0.0
+            )
         },
-    }
\ No newline at end of file
+    }
+
+@router.get("/graphs")
+async def get_platform_graph_data(
+    start_date: Optional[date] = Query(None, description="Filter data from this date. Format: YYYY-MM-DD, it is optional"),
+    end_date: Optional[date] = Query(None, description="Filter data up to this date. Format: YYYY-MM-DD, it is optional"),
+    granularity: str = Query("auto", pattern="^(day|week|month|auto)$", description="Bucket size for the time series; auto keeps them under max_points"),
+    max_points: int = Query(366, ge=10, le=5000, description="Upper bound on points per series when granularity is auto"),
+    current_user: User = Depends(get_current_admin_user),
+    db: AsyncSession = Depends(get_read_db)
+) -> Dict[str, Any]:
+    if start_date and end_date and start_date > end_date:
+        raise HTTPException(
+            status_code=400,
+            detail="start_date cannot be after end_date."
+        )
+
+    return await build_graph_data(db, start_date, end_date, granularity, max_points)
+
+@router.get("/distributions")
+async def get_value_distributions(
+    asset_type: Optional[AssetType] = Query(None, description="Only assets of this type"),
+    transaction_type: Optional[TransactionType] = Query(None, description="Only transactions of this type"),
+    start_date: Optional[date] = Query(None, description="Only transactions on or after this date (YYYY-MM-DD)"),
+    end_date: Optional[date] = Query(None, description="Only transactions on or before this date (YYYY-MM-DD)"),
+    bins: int = Query(20, ge=1, le=200, description="Histogram buckets"),
+    scale: str = Query("log", pattern="^(log|linear)$", description="Histogram bucket spacing"),
+    top: int = Query(10, ge=1, le=100, description="Number of largest holders to list"),
+    include_archived: bool = Query(False, description="Also include archived transactions; implied by a date before the archive boundary"),
+    current_user: User = Depends(get_current_admin_user),
+    db: AsyncSession = Depends(get_read_db)
+) -> Dict[str, Any]:
+    """Histograms, percentiles and ownership concentration, computed on the in-memory columnar snapshot."""
+    if start_date and end_date and start_date > end_date:
+        raise HTTPException(status_code=400, detail="start_date cannot be after end_date.")
+
+    await analytics_snapshot.ensure_fresh(db)
+    include_archived = include_archived or range_reaches_archive(analytics_snapshot.archived_before, start_date, end_date)
+    if include_archived:
+        await analytics_snapshot.ensure_fresh(db, include_archived=True)
+    return build_distributions(
+        analytics_snapshot, asset_type, transaction_type, start_date, end_date, bins, scale == "log", top, include_archived
+    )
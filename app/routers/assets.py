@@ -1,20 +1,68 @@
-from fastapi import APIRouter, Depends, Query, status, HTTPException
-from sqlalchemy.orm import Session
-from app.schemas import AssetCreate, Asset as AssetSchema, PaginatedAssetResponse
-from app.models import Asset, User
-from app.database import get_db
+from datetime import date, datetime
+from typing import List, Optional
+from fastapi import APIRouter, Depends, Query, Request, status, HTTPException
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import insert, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.schemas import AssetCreate, Asset as AssetSchema, PaginatedAssetResponse, BulkAssetImportResponse
+from app.models import Asset, AssetType, User
+from app.database import get_db, get_read_db
+from app.metrics import count_rows_returned
 from app.routers.auth import get_current_admin_user
+from app.portfolio import record_asset_creations
+from app.rollups import record_new_assets
+from app.search import name_contains_filter
+from app.utils import (
+    count_cache, date_range_filters, decode_cursor, decode_sort_cursor, encode_cursor, encode_sort_cursor,
+    export_response, fetch_dicts, get_cached_count, iter_upload_chunks, new_bulk_summary, record_bulk_error,
+)
 
 router = APIRouter()
 
+# schemas.Asset fields, in order, for the column-only fast path
+ASSET_COLUMNS = (Asset.name, Asset.type, Asset.value, Asset.id, Asset.owner_id, Asset.created_at, Asset.version)
+
+# `sort` values for GET /assets; prefix with "-" for descending. Ties are broken by id.
+SORT_COLUMNS = {"id": Asset.id, "name": Asset.name, "value": Asset.value, "created_at": Asset.created_at}
+# JSON type of the sort value in a cursor for each non-id sort; created_at travels as an ISO string
+SORT_CURSOR_TYPES = {"name": str, "value": (int, float), "created_at": str}
+
+def _asset_filters(
+    type: Optional[AssetType] = None,
+    owner_id: Optional[int] = None,
+    min_value: Optional[float] = None,
+    max_value: Optional[float] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    name_prefix: Optional[str] = None,
+    dialect_name: str = "sqlite",
+) -> list:
+    filters = date_range_filters(Asset.created_at, start_date, end_date)
+    if type:
+        filters.append(Asset.type == type)
+    if owner_id is not None:
+        filters.append(Asset.owner_id == owner_id)
+    if min_value is not None:
+        filters.append(Asset.value >= min_value)
+    if max_value is not None:
+        filters.append(Asset.value <= max_value)
+    if name_prefix:
+        if dialect_name == "postgresql":
+            # served by ix_assets_name_pattern; under a linguistic collation a range can miss matches
+            filters.append(Asset.name.startswith(name_prefix, autoescape=True))
+        else:
+            # SQLite only uses an index for LIKE when it is case-insensitive, so use a range
+            filters.extend([Asset.name >= name_prefix, Asset.name < name_prefix + "\U0010ffff"])
+    return filters
+
 @router.post("/", response_model=AssetSchema, status_code=status.HTTP_201_CREATED)
-def create_asset(
+async def create_asset(
     asset: AssetCreate,
     current_user: User = Depends(get_current_admin_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     # Check if owner exists
-    owner = db.query(User).filter(User.id == asset.owner_id).first()
+    owner = await db.get(User, asset.owner_id)
     if not owner:
         raise HTTPException(status_code=404, detail=f"User with id {asset.owner_id} not found")
 
@@ -25,32 +73,150 @@ def create_asset(
         owner_id=asset.owner_id
     )
     db.add(db_asset)
-    db.commit()
-    db.refresh(db_asset)
+    await db.flush()
+    await record_new_assets(db, [(db_asset.created_at, db_asset.type, db_asset.value)])
+    await record_asset_creations(db, [(db_asset.id, db_asset.owner_id, db_asset.value, db_asset.created_at)])
+    await db.commit()
+    await db.refresh(db_asset)
+    count_cache.pop(Asset.__tablename__)
     return db_asset
 
+async def _insert_asset_chunk(db: AsyncSession, chunk: List[tuple], summary: dict):
+    # resolve every owner in the chunk with one IN lookup
+    owner_ids = {asset.owner_id for _, asset in chunk}
+    existing_owner_ids = set(count_rows_returned((await db.scalars(select(User.id).where(User.id.in_(owner_ids)))).all()))
+
+    rows = []
+    created_at = datetime.utcnow()
+    for row_number, asset in chunk:
+        if asset.owner_id not in existing_owner_ids:
+            record_bulk_error(summary, row_number, f"User with id {asset.owner_id} not found")
+            continue
+        rows.append({**asset.model_dump(), "created_at": created_at})
+
+    if rows:
+        asset_ids = count_rows_returned((await db.scalars(insert(Asset).returning(Asset.id, sort_by_parameter_order=True), rows)).all())
+        await record_new_assets(db, [(row["created_at"], row["type"], row["value"]) for row in rows])
+        await record_asset_creations(
+            db, [(asset_id, row["owner_id"], row["value"], row["created_at"]) for asset_id, row in zip(asset_ids, rows)]
+        )
+        await db.commit()
+        summary["created"] += len(rows)
+
+@router.post("/bulk", response_model=BulkAssetImportResponse)
+async def bulk_create_assets(
+    request: Request,
+    chunk_size: int = Query(1000, ge=1, le=10000, description="Rows validated, inserted and committed together"),
+    current_user: User = Depends(get_current_admin_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Stream assets from an NDJSON (default) or CSV (`Content-Type: text/csv`) body.
+
+    Invalid rows are reported individually and skipped; valid rows are inserted in
+    batches with one commit per chunk.
+    """
+    summary = new_bulk_summary()
+    async for chunk in iter_upload_chunks(request, AssetCreate, chunk_size, summary):
+        await _insert_asset_chunk(db, chunk, summary)
+
+    count_cache.pop(Asset.__tablename__)
+    return summary
+
+@router.get("/export")
+async def export_assets(
+    start_date: Optional[date] = Query(None, description="Only assets created on or after this date (YYYY-MM-DD)"),
+    end_date: Optional[date] = Query(None, description="Only assets created on or before this date (YYYY-MM-DD)"),
+    type: Optional[AssetType] = Query(None, description="Only assets of this type"),
+    owner_id: Optional[int] = Query(None, description="Only assets owned by this user"),
+    export_format: str = Query("csv", alias="format", pattern="^(csv|ndjson)$"),
+    gzip: bool = Query(False, description="Compress the export as a .gz file"),
+    current_user: User = Depends(get_current_admin_user)
+):
+    if start_date and end_date and start_date > end_date:
+        raise HTTPException(status_code=400, detail="start_date cannot be after end_date.")
+
+    query = select(
+        Asset.id, Asset.name, Asset.type, Asset.value, Asset.owner_id, Asset.created_at
+    ).where(*_asset_filters(type, owner_id, start_date=start_date, end_date=end_date)).order_by(Asset.id)
+    return export_response(query, "assets", export_format, gzip)
+
 @router.get("/", response_model=PaginatedAssetResponse)
-def read_assets(
-    page: int = Query(1, ge=1, description="Page number, starting from 1"),
+async def read_assets(
+    page: int = Query(1, ge=1, description="Page number, starting from 1. Ignored when a cursor is given"),
     limit: int = Query(20, ge=1, le=200, description="Number of items per page"),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from a previous page's next_cursor"),
+    include_total: bool = Query(True, description="Include the (cached, possibly slightly stale) total_count"),
+    type: Optional[AssetType] = Query(None, description="Only assets of this type"),
+    owner_id: Optional[int] = Query(None, description="Only assets owned by this user"),
+    min_value: Optional[float] = Query(None, description="Only assets worth at least this much"),
+    max_value: Optional[float] = Query(None, description="Only assets worth at most this much"),
+    start_date: Optional[date] = Query(None, description="Only assets created on or after this date (YYYY-MM-DD)"),
+    end_date: Optional[date] = Query(None, description="Only assets created on or before this date (YYYY-MM-DD)"),
+    name_prefix: Optional[str] = Query(None, min_length=1, description="Only assets whose name starts with this (case-sensitive)"),
+    q: Optional[str] = Query(None, min_length=1, max_length=200, description="Only assets whose name contains this (case-insensitive)"),
+    sort: str = Query("id", pattern="^-?(id|name|value|created_at)$", description="Sort field, prefixed with - for descending"),
     current_user: User = Depends(get_current_admin_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
-    # total count of all assets
-    total_count = db.query(Asset).count()
+    if start_date and end_date and start_date > end_date:
+        raise HTTPException(status_code=400, detail="start_date cannot be after end_date.")
+    if min_value is not None and max_value is not None and min_value > max_value:
+        raise HTTPException(status_code=400, detail="min_value cannot be greater than max_value.")
+
+    filters = _asset_filters(
+        type, owner_id, min_value, max_value, start_date, end_date, name_prefix, db.get_bind().dialect.name
+    )
+    if q:
+        filters.append(await name_contains_filter(db, q))
+
+    descending = sort.startswith("-")
+    sort_key = sort.lstrip("-")
+    sort_column = SORT_COLUMNS[sort_key]
+    order_by = [sort_column.desc() if descending else sort_column]
+    if sort_column is not Asset.id:
+        order_by.append(Asset.id.desc() if descending else Asset.id)
+
+    query = select(*ASSET_COLUMNS).where(*filters).order_by(*order_by)
+    if cursor:
+        # keyset pagination: seek past the last seen (sort value, id) instead of OFFSET
+        if sort_column is Asset.id:
+            last_id = decode_cursor(cursor)
+            query = query.where(Asset.id < last_id if descending else Asset.id > last_id)
+        else:
+            sort_value, last_id = decode_sort_cursor(cursor)
+            if not isinstance(sort_value, SORT_CURSOR_TYPES[sort_key]) or isinstance(sort_value, bool):
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+            if sort_key == "created_at":
+                try:
+                    sort_value = datetime.fromisoformat(sort_value)
+                except ValueError:
+                    raise HTTPException(status_code=400, detail="Invalid cursor")
+            position = tuple_(sort_column, Asset.id)
+            query = query.where(position < (sort_value, last_id) if descending else position > (sort_value, last_id))
+    else:
+        query = query.offset((page - 1) * limit)
+
+    # one extra row tells us whether another page exists without counting
+    assets = await fetch_dicts(db, query.limit(limit + 1))
+    has_next_page = len(assets) > limit
+    assets = assets[:limit]
 
-    # assets for the current page
-    skip = (page - 1) * limit
-    assets = db.query(Asset).offset(skip).limit(limit).all()
+    next_cursor = None
+    if has_next_page:
+        last = assets[-1]
+        next_cursor = encode_cursor(last["id"]) if sort_column is Asset.id else encode_sort_cursor(last[sort_key], last["id"])
 
-    has_next_page = (skip + len(assets)) < total_count
-    has_previous_page = page > 1
+    total_count = None
+    if include_total:
+        filter_key = (type, owner_id, min_value, max_value, start_date, end_date, name_prefix, q)
+        total_count = await get_cached_count(db, Asset, tuple(filters), key=filter_key)
 
-    return {
+    return ORJSONResponse({
         "total_count": total_count,
-        "page": page,
+        "page": None if cursor else page,
         "limit": limit,
         "has_next_page": has_next_page,
-        "has_previous_page": has_previous_page,
+        "has_previous_page": bool(cursor) or page > 1,
+        "next_cursor": next_cursor,
         "assets": assets,
-    }
\ No newline at end of file
+    })
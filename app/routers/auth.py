@@ -1,13 +1,20 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import List, Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from app.schemas import TokenData, UserLogin, Token, User as UserSchema
+from app.schemas import TokenData, UserLogin, Token
 from app.models import User, UserRole
+from sqlalchemy import event, inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from app.database import get_db
+from app.utils import TTLCache
 import os
 
 # Security settings
@@ -15,17 +22,128 @@ SECRET_KEY = os.getenv("SECRET_KEY", "secret1234556")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 300
 
+# Resolved principals are cached per subject so authenticated requests skip the user lookup.
+# Entries are dropped whenever the user row is updated or deleted through the ORM; the TTL
+# bounds staleness across workers and for writes made outside this process.
+PRINCIPAL_CACHE_TTL_SECONDS = float(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "60"))
+PRINCIPAL_CACHE_MAXSIZE = int(os.getenv("PRINCIPAL_CACHE_MAXSIZE", "1024"))
+
+# bcrypt runs off the event loop in a bounded pool. Jobs beyond PASSWORD_HASH_MAX_PENDING
+# (queued + running) are rejected with a 503 instead of queueing. 0 workers runs inline.
+PASSWORD_HASH_EXECUTOR = os.getenv("PASSWORD_HASH_EXECUTOR", "thread")
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 2)))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", str(PASSWORD_HASH_WORKERS * 8)))
+# Bulk imports hash on their own process pool, so a large onboarding batch uses every core
+# without queueing ahead of interactive logins.
+BULK_PASSWORD_HASH_WORKERS = int(os.getenv("BULK_PASSWORD_HASH_WORKERS", str(os.cpu_count() or 2)))
+
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token")
 
 router = APIRouter()
 
+principal_cache = TTLCache(maxsize=PRINCIPAL_CACHE_MAXSIZE, ttl=PRINCIPAL_CACHE_TTL_SECONDS)
+
+@dataclass(frozen=True)
+class Principal:
+    id: int
+    username: str
+    role: UserRole
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _collect_changed_principal(mapper, connection, target):
+    # evicted on commit: dropping the entry at flush would let a request re-cache the old row
+    # before the change is visible; also drop the old key if the username itself was changed
+    state = inspect(target)
+    state.session.info.setdefault("changed_principals", set()).update(
+        [target.username, *state.attrs.username.history.deleted]
+    )
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_principals_on_commit(session):
+    for username in session.info.pop("changed_principals", ()):
+        principal_cache.pop(username)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_principals_on_rollback(session):
+    session.info.pop("changed_principals", None)
+
 def verify_password(plain_password: str, hashed_password: str):
     return pwd_context.verify(plain_password, hashed_password)
 
 def get_password_hash(password: str):
     return pwd_context.hash(password)
 
+_password_executor: Optional[Executor] = None
+_pending_password_jobs = 0
+_bulk_hash_executor: Optional[Executor] = None
+
+def get_password_executor() -> Optional[Executor]:
+    global _password_executor
+    if _password_executor is None and PASSWORD_HASH_WORKERS > 0:
+        if PASSWORD_HASH_EXECUTOR == "process":
+            # fork would copy the event loop, the engine's connections and their locks into the workers
+            _password_executor = ProcessPoolExecutor(
+                max_workers=PASSWORD_HASH_WORKERS, mp_context=multiprocessing.get_context("spawn")
+            )
+        else:
+            _password_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+    return _password_executor
+
+def shutdown_password_executor():
+    global _password_executor, _bulk_hash_executor
+    if _password_executor is not None:
+        _password_executor.shutdown(wait=False, cancel_futures=True)
+        _password_executor = None
+    if _bulk_hash_executor is not None:
+        _bulk_hash_executor.shutdown(wait=False, cancel_futures=True)
+        _bulk_hash_executor = None
+
+async def _run_password_job(func, *args):
+    global _pending_password_jobs
+    executor = get_password_executor()
+    if executor is None:
+        return func(*args)
+    if _pending_password_jobs >= PASSWORD_HASH_MAX_PENDING:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many concurrent authentication requests, please retry shortly",
+            headers={"Retry-After": "1"},
+        )
+    _pending_password_jobs += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+    finally:
+        _pending_password_jobs -= 1
+
+async def verify_password_async(plain_password: str, hashed_password: str):
+    return await _run_password_job(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str):
+    return await _run_password_job(get_password_hash, password)
+
+def _hash_passwords(passwords: List[str]) -> List[str]:
+    return [get_password_hash(password) for password in passwords]
+
+async def hash_passwords_bulk(passwords: List[str]) -> List[str]:
+    """Hash many passwords across the bulk process pool, preserving order."""
+    global _bulk_hash_executor
+    if not passwords:
+        return []
+    if _bulk_hash_executor is None:
+        _bulk_hash_executor = ProcessPoolExecutor(
+            max_workers=BULK_PASSWORD_HASH_WORKERS, mp_context=multiprocessing.get_context("spawn")
+        )
+    # a few slices per worker keeps them all busy without one IPC round trip per password
+    size = -(-len(passwords) // (BULK_PASSWORD_HASH_WORKERS * 4))
+    loop = asyncio.get_running_loop()
+    parts = await asyncio.gather(*(
+        loop.run_in_executor(_bulk_hash_executor, _hash_passwords, passwords[start:start + size])
+        for start in range(0, len(passwords), size)
+    ))
+    return [hashed for part in parts for hashed in part]
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -36,7 +154,7 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -51,12 +169,16 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
     except JWTError:
         raise credentials_exception
     
-    user = db.query(User).filter(User.username == token_data.username).first()
-    if user is None:
-        raise credentials_exception
-    return user
+    principal = principal_cache.get(token_data.username)
+    if principal is None:
+        user = await db.scalar(select(User).where(User.username == token_data.username))
+        if user is None:
+            raise credentials_exception
+        principal = Principal(id=user.id, username=user.username, role=user.role)
+        principal_cache.set(user.username, principal)
+    return principal
 
-async def get_current_admin_user(current_user: UserSchema = Depends(get_current_user)):
+async def get_current_admin_user(current_user: Principal = Depends(get_current_user)):
     if current_user.role != UserRole.ADMIN:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -64,10 +186,10 @@ async def get_current_admin_user(current_user: UserSchema = Depends(get_current_
         )
     return current_user
 
-def _get_token_for_user(username: str, password: str, db: Session):
+async def _get_token_for_user(username: str, password: str, db: AsyncSession):
     """Helper function to authenticate user and create JWT token."""
-    user = db.query(User).filter(User.username == username).first()
-    if not user or not verify_password(password, user.hashed_password):
+    user = await db.scalar(select(User).where(User.username == username))
+    if not user or not await verify_password_async(password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -85,13 +207,17 @@ def _get_token_for_user(username: str, password: str, db: Session):
 @router.post("/token", response_model=Token, include_in_schema=False)
 async def login_for_access_token(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    return _get_token_for_user(form_data.username, form_data.password, db)
+    return await _get_token_for_user(form_data.username, form_data.password, db)
 
 @router.post("/", response_model=Token)
 async def get_token(
     credentials: UserLogin,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    return _get_token_for_user(credentials.username, credentials.password, db)
\ No newline at end of file
+    return await _get_token_for_user(credentials.username, credentials.password, db)
+
+@router.get("/cache-stats")
+async def get_principal_cache_stats(current_user: Principal = Depends(get_current_admin_user)):
+    return principal_cache.stats()
@@ -1,62 +1,152 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import case, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.models import User, Asset, Transaction, TransactionType, AssetType
+from app.archive import archived_type_counts
 from app.database import get_db
+from app.middleware import etag_matches
+from app.metrics import count_rows_returned
 from app.routers.auth import get_current_admin_user
+from app.utils import TTLCache, fetch_dicts
+from app.routers.assets import ASSET_COLUMNS
+from app.versioning import data_version
 from datetime import datetime, timedelta
-from app.schemas import ReportResponse
+from app.schemas import ReportResponse, ReportJob, ReportJobCreate
+from app.jobs import get_job, submit_job
+import hashlib
+import orjson
+import os
 
 router = APIRouter()
 
-@router.get("/", response_model=ReportResponse)
-def get_platform_report(
-    current_user: User = Depends(get_current_admin_user),
-    db: Session = Depends(get_db)
-):
+# Both caches are keyed by the data version, so any asset/transaction write invalidates them.
+# The short TTL on the transaction part keeps the sliding "last 7 days" window fresh; the
+# longer one only bounds staleness from writes made by other worker processes.
+# They are filled from the primary: the version counts commits made there, and a lagging
+# replica would pin older numbers under the new version until the next write.
+REPORT_CACHE_TTL_SECONDS = float(os.getenv("REPORT_CACHE_TTL_SECONDS", "300"))
+REPORT_RECENT_TTL_SECONDS = float(os.getenv("REPORT_RECENT_TTL_SECONDS", "15"))
+
+asset_summary_cache = TTLCache(maxsize=4, ttl=REPORT_CACHE_TTL_SECONDS)
+transaction_summary_cache = TTLCache(maxsize=4, ttl=REPORT_RECENT_TTL_SECONDS)
 
-    asset_summary = db.query(
+async def _get_asset_summary(db: AsyncSession, version: int) -> dict:
+    summary = asset_summary_cache.get(version)
+    if summary is None:
+        summary = await _query_asset_summary(db)
+        asset_summary_cache.set(version, summary)
+    return summary
+
+async def _query_asset_summary(db: AsyncSession) -> dict:
+    # Totals and the type distribution come from a single GROUP BY
+    asset_types_query_result = count_rows_returned((await db.execute(select(
+        Asset.type,
         func.count(Asset.id),
         func.sum(Asset.value)
-    ).one()
-    
-    total_assets = asset_summary[0]
-    total_asset_value = asset_summary[1] or 0.0
-    average_asset_value = total_asset_value / total_assets if total_assets > 0 else 0.0
-    
-    # Recent transactions (last 7 days)
-    week_ago = datetime.utcnow() - timedelta(days=7)
-    recent_transactions_count = db.query(func.count(Transaction.id)).filter(
-        Transaction.timestamp >= week_ago
-    ).scalar()
-    
-    # Transaction types distribution
-    transaction_types_query_result = db.query(
-        Transaction.type,
-        func.count(Transaction.id)
-    ).group_by(Transaction.type).all()
-    
-    transaction_distribution = {t_type: 0 for t_type in TransactionType}
-    transaction_distribution.update(dict(transaction_types_query_result))
-    
-    # Asset types distribution
-    asset_types_query_result = db.query(
-        Asset.type,
-        func.count(Asset.id)
-    ).group_by(Asset.type).all()
-    
+    ).group_by(Asset.type))).all())
+
     asset_distribution = {a_type: 0 for a_type in AssetType}
-    asset_distribution.update(dict(asset_types_query_result))
+    asset_distribution.update({a_type: count for a_type, count, _ in asset_types_query_result})
+    total_assets = sum(count for _, count, _ in asset_types_query_result)
+    total_asset_value = sum(value or 0.0 for _, _, value in asset_types_query_result)
+    average_asset_value = total_asset_value / total_assets if total_assets > 0 else 0.0
 
     # Most valuable asset
-    most_valuable_asset = db.query(Asset).order_by(Asset.value.desc()).first()
+    most_valuable_asset = await fetch_dicts(db, select(*ASSET_COLUMNS).order_by(Asset.value.desc()).limit(1))
 
     return {
         "total_assets": total_assets,
         "total_asset_value": round(total_asset_value, 2),
         "average_asset_value": round(average_asset_value, 2),
-        "recent_transactions": recent_transactions_count,
-        "transaction_types_distribution": transaction_distribution,
         "asset_types_distribution": asset_distribution,
-        "most_valuable_asset": most_valuable_asset
-    }
\ No newline at end of file
+        "most_valuable_asset": most_valuable_asset[0] if most_valuable_asset else None,
+    }
+
+async def _get_transaction_summary(db: AsyncSession, version: int, include_archived: bool = False) -> dict:
+    summary = transaction_summary_cache.get((version, include_archived))
+    if summary is None:
+        summary = await _query_transaction_summary(db, include_archived)
+        transaction_summary_cache.set((version, include_archived), summary)
+    return summary
+
+async def _query_transaction_summary(db: AsyncSession, include_archived: bool = False) -> dict:
+    # Type distribution and recent (last 7 days) count in one pass over the hot table;
+    # archived transactions are never recent, and their counts come from the archive catalog
+    week_ago = datetime.utcnow() - timedelta(days=7)
+    transaction_types_query_result = count_rows_returned((await db.execute(select(
+        Transaction.type,
+        func.count(Transaction.id),
+        func.sum(case((Transaction.timestamp >= week_ago, 1), else_=0))
+    ).group_by(Transaction.type))).all())
+
+    transaction_distribution = {t_type: 0 for t_type in TransactionType}
+    transaction_distribution.update({t_type: count for t_type, count, _ in transaction_types_query_result})
+    if include_archived:
+        for t_type, count in (await archived_type_counts(db)).items():
+            transaction_distribution[t_type] += count
+
+    return {
+        "recent_transactions": sum(recent or 0 for _, _, recent in transaction_types_query_result),
+        "transaction_types_distribution": transaction_distribution,
+    }
+
+def _combine_report(asset_summary: dict, transaction_summary: dict) -> dict:
+    # plain dict in ReportResponse field order
+    return {field: {**asset_summary, **transaction_summary}[field] for field in ReportResponse.model_fields}
+
+async def build_report(db: AsyncSession, include_archived: bool = False) -> dict:
+    """The platform report computed from scratch, bypassing this process's caches."""
+    return _combine_report(await _query_asset_summary(db), await _query_transaction_summary(db, include_archived))
+
+@router.get("/", response_model=ReportResponse, responses={304: {"description": "Not Modified"}})
+async def get_platform_report(
+    request: Request,
+    include_archived: bool = Query(False, description="Also count archived transactions in the type distribution"),
+    current_user: User = Depends(get_current_admin_user),
+    db: AsyncSession = Depends(get_db)
+):
+    version = data_version.value
+    asset_summary = await _get_asset_summary(db, version)
+    transaction_summary = await _get_transaction_summary(db, version, include_archived)
+    # serialized straight from the cached plain dicts
+    report = _combine_report(asset_summary, transaction_summary)
+
+    # Strong ETag over the exact response bytes, so clients can poll with If-None-Match;
+    # CompressionMiddleware weakens it when it encodes the body, hence the weak comparison
+    body = orjson.dumps(report, option=orjson.OPT_NON_STR_KEYS)
+    etag = f'"{hashlib.sha1(body).hexdigest()}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request.headers.get("if-none-match", ""), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@router.post("/jobs", response_model=ReportJob, status_code=status.HTTP_202_ACCEPTED)
+async def create_report_job(
+    job_request: ReportJobCreate,
+    current_user: User = Depends(get_current_admin_user)
+):
+    """Queue the platform report or the analytics graphs on the background worker pool.
+
+    Poll GET /reports/jobs/{id} for the result; an identical pending or recent job is reused.
+    """
+    params = {"include_archived": job_request.include_archived} if job_request.kind == "report" else {}
+    if job_request.kind == "graphs":
+        if job_request.start_date and job_request.end_date and job_request.start_date > job_request.end_date:
+            raise HTTPException(status_code=400, detail="start_date cannot be after end_date.")
+        params = job_request.model_dump(include={"start_date", "end_date", "granularity", "max_points"})
+
+    job = submit_job(job_request.kind, params)
+    return ORJSONResponse(
+        job.to_dict(), status_code=status.HTTP_202_ACCEPTED, headers={"Location": f"/reports/jobs/{job.id}"}
+    )
+
+@router.get("/jobs/{job_id}", response_model=ReportJob)
+async def read_report_job(
+    job_id: str,
+    current_user: User = Depends(get_current_admin_user)
+):
+    job = get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Report job not found or expired")
+    return ORJSONResponse(job.to_dict())
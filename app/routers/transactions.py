@@ -1,27 +1,60 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from app.schemas import TransactionCreate, Transaction as TransactionSchema
+import asyncio
+import os
+import random
+from dataclasses import dataclass
+from datetime import date
+from functools import partial
+from typing import Optional
+import orjson
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from sqlalchemy import or_, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.exc import StaleDataError
+from app.schemas import (
+    TransactionCreate, Transaction as TransactionSchema,
+    TransactionBatchCreate, TransactionBatchResponse,
+)
 from app.models import Transaction, User, Asset, TransactionType
-from app.database import get_db
-from app.routers.auth import get_current_admin_user
+from app.archive import archive_state, iter_archived_rows
+from app.database import AsyncSessionLocal, get_db, get_read_db
+from app.feed import FEED_HEARTBEAT_SECONDS, transaction_feed
+from app.metrics import count_rows_returned
+from app.routers.auth import get_current_admin_user, get_current_user
+from app.portfolio import record_ownership_changes
+from app.rollups import record_asset_value_changes, record_transactions
+from app.utils import date_range_filters, export_response
 
 router = APIRouter()
 
-@router.post("/", response_model=TransactionSchema, status_code=status.HTTP_201_CREATED)
-def create_transaction(
-    transaction: TransactionCreate,
-    current_user: User = Depends(get_current_admin_user),
-    db: Session = Depends(get_db)
-):
-    # check if asset exists
-    asset = db.query(Asset).filter(Asset.id == transaction.asset_id).first()
+# optimistic retries of a single transaction after losing a version race, then 409
+TRANSACTION_MAX_RETRIES = int(os.getenv("TRANSACTION_MAX_RETRIES", "3"))
+TRANSACTION_RETRY_BACKOFF_SECONDS = float(os.getenv("TRANSACTION_RETRY_BACKOFF_SECONDS", "0.005"))
+
+@dataclass
+class VersionConflicts:
+    retried: int = 0
+    rejected: int = 0
+
+version_conflicts = VersionConflicts()
+
+# schemas.Transaction fields, in order; responses are built from the flushed rows directly
+TRANSACTION_FIELDS = ("id", "amount", "type", "asset_id", "user_id", "from_owner_id", "to_owner_id", "timestamp")
+
+def _transaction_to_dict(db_transaction: Transaction) -> dict:
+    return {field: getattr(db_transaction, field) for field in TRANSACTION_FIELDS}
+
+def _apply_transaction(transaction: TransactionCreate, asset: Asset, to_owner_exists: bool, user_id: int) -> Transaction:
+    """Validate a sell/transfer against the loaded asset, move ownership and build the Transaction row.
+
+    Raises HTTPException before touching the asset if the transaction is not allowed.
+    """
     if not asset:
         raise HTTPException(status_code=404, detail="Asset not found")
 
     from_owner_id = asset.owner_id
-    to_owner = db.query(User).filter(User.id == transaction.to_user_id).first()
 
-    if not to_owner:
+    if not to_owner_exists:
         raise HTTPException(status_code=404, detail=f"Receiving user with id {transaction.to_user_id} not found")
 
     if from_owner_id == transaction.to_user_id:
@@ -41,16 +74,233 @@ def create_transaction(
     else:
         raise HTTPException(status_code=400, detail=f"Transaction type '{transaction.type.value}' is not supported. Use 'sell' or 'transfer'.")
 
-    # Create transaction record
-    db_transaction = Transaction(
+    return Transaction(
         amount=transaction_amount,
         type=transaction.type,
-        user_id=current_user.id,
+        user_id=user_id,
         asset_id=transaction.asset_id,
         from_owner_id=from_owner_id,
         to_owner_id=transaction.to_user_id
     )
-    db.add(db_transaction)
-    db.commit()
-    db.refresh(db_transaction)
-    return db_transaction
\ No newline at end of file
+
+def _check_expected_version(transaction: TransactionCreate, asset: Optional[Asset]):
+    if asset and transaction.expected_version is not None and asset.version != transaction.expected_version:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Asset {asset.id} is at version {asset.version}, expected {transaction.expected_version}"
+        )
+
+@router.post("/", response_model=TransactionSchema, status_code=status.HTTP_201_CREATED)
+async def create_transaction(
+    transaction: TransactionCreate,
+    current_user: User = Depends(get_current_admin_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Sell or transfer an asset without locking it.
+
+    The asset row is written with UPDATE ... WHERE id = ? AND version = ?, so a concurrent
+    change makes the write miss. The request is then re-validated against the fresh row
+    and retried up to TRANSACTION_MAX_RETRIES times before answering 409. With
+    `expected_version`, a mismatch is a 409 straight away.
+    """
+    for attempt in range(TRANSACTION_MAX_RETRIES + 1):
+        asset = await db.get(Asset, transaction.asset_id, populate_existing=True)
+        _check_expected_version(transaction, asset)
+        to_owner = await db.get(User, transaction.to_user_id) if asset else None
+        previous_value = asset.value if asset else None
+
+        # Create transaction record
+        db_transaction = _apply_transaction(transaction, asset, to_owner is not None, current_user.id)
+        db.add(db_transaction)
+        try:
+            await db.flush()
+        except StaleDataError:
+            await db.rollback()
+            if attempt < TRANSACTION_MAX_RETRIES:
+                version_conflicts.retried += 1
+                await asyncio.sleep(random.uniform(0, TRANSACTION_RETRY_BACKOFF_SECONDS * 2 ** attempt))
+            continue
+        await _record_rollups(db, [db_transaction], [(asset, previous_value)])
+        await db.commit()
+        return ORJSONResponse(_transaction_to_dict(db_transaction), status_code=status.HTTP_201_CREATED)
+
+    version_conflicts.rejected += 1
+    raise HTTPException(
+        status_code=409,
+        detail=f"Asset {transaction.asset_id} was modified concurrently, please retry",
+        headers={"Retry-After": "1"},
+    )
+
+async def _record_rollups(db: AsyncSession, db_transactions: list, asset_changes: list):
+    await record_transactions(db, [(t.timestamp, t.type, t.amount) for t in db_transactions])
+    await record_asset_value_changes(
+        db, [(asset.created_at, asset.type, asset.value - previous_value) for asset, previous_value in asset_changes]
+    )
+    await record_ownership_changes(db, db_transactions)
+
+async def _lock_assets(db: AsyncSession, asset_ids: set) -> dict:
+    """Load and lock every asset in the batch: FOR UPDATE on PostgreSQL, a write (IMMEDIATE) transaction on SQLite."""
+    # a fixed lock order, so two batches touching the same assets cannot deadlock
+    query = select(Asset).where(Asset.id.in_(asset_ids)).order_by(Asset.id)
+    if db.get_bind().dialect.name == "sqlite":
+        await db.execute(text("BEGIN IMMEDIATE"))
+    else:
+        query = query.with_for_update()
+    return {asset.id: asset for asset in count_rows_returned((await db.scalars(query)).all())}
+
+@router.post("/batch", response_model=TransactionBatchResponse, status_code=status.HTTP_201_CREATED)
+async def create_transaction_batch(
+    batch: TransactionBatchCreate,
+    current_user: User = Depends(get_current_admin_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Apply many sells/transfers with one asset query, one user query and a single commit.
+
+    With `atomic` (the default) any invalid item rolls back the whole batch; otherwise
+    invalid items are reported and the rest are committed. Items are applied in order,
+    so the same asset may change hands several times within one batch. An item's
+    `expected_version` is checked against the asset as it was locked, before the batch.
+    """
+    assets = await _lock_assets(db, {item.asset_id for item in batch.transactions})
+    to_user_ids = {item.to_user_id for item in batch.transactions}
+    existing_user_ids = set(count_rows_returned((await db.scalars(select(User.id).where(User.id.in_(to_user_ids)))).all()))
+    previous_values = {asset_id: asset.value for asset_id, asset in assets.items()}
+
+    db_transactions = []
+    errors = []
+    for row_number, item in enumerate(batch.transactions, start=1):
+        try:
+            # versions only move when the batch is flushed, so this is the locked version
+            _check_expected_version(item, assets.get(item.asset_id))
+            db_transactions.append(
+                _apply_transaction(item, assets.get(item.asset_id), item.to_user_id in existing_user_ids, current_user.id)
+            )
+        except HTTPException as e:
+            errors.append({"row": row_number, "error": e.detail})
+
+    if errors and batch.atomic:
+        await db.rollback()
+        raise HTTPException(status_code=400, detail={"message": "Batch rejected, no transactions were applied", "errors": errors})
+
+    db.add_all(db_transactions)
+    await db.flush()
+    await _record_rollups(db, db_transactions, [(assets[asset_id], value) for asset_id, value in previous_values.items()])
+    await db.commit()
+    return ORJSONResponse({
+        "created": len(db_transactions),
+        "failed": len(errors),
+        "transactions": [_transaction_to_dict(t) for t in db_transactions],
+        "errors": errors,
+    }, status_code=status.HTTP_201_CREATED)
+
+@router.get("/export")
+async def export_transactions(
+    start_date: Optional[date] = Query(None, description="Only transactions on or after this date (YYYY-MM-DD)"),
+    end_date: Optional[date] = Query(None, description="Only transactions on or before this date (YYYY-MM-DD)"),
+    type: Optional[TransactionType] = Query(None, description="Only transactions of this type"),
+    owner_id: Optional[int] = Query(None, description="Only transactions where this user is the sender or the receiver"),
+    export_format: str = Query("csv", alias="format", pattern="^(csv|ndjson)$"),
+    gzip: bool = Query(False, description="Compress the export as a .gz file"),
+    current_user: User = Depends(get_current_admin_user),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Archived transactions in the requested range are exported first, then the hot ones."""
+    if start_date and end_date and start_date > end_date:
+        raise HTTPException(status_code=400, detail="start_date cannot be after end_date.")
+
+    query = select(
+        Transaction.id, Transaction.amount, Transaction.type, Transaction.user_id, Transaction.asset_id,
+        Transaction.from_owner_id, Transaction.to_owner_id, Transaction.timestamp
+    ).where(*date_range_filters(Transaction.timestamp, start_date, end_date)).order_by(Transaction.id)
+    if type:
+        query = query.where(Transaction.type == type)
+    if owner_id is not None:
+        query = query.where(or_(Transaction.from_owner_id == owner_id, Transaction.to_owner_id == owner_id))
+
+    archived_rows = None
+    _, archived_before = await archive_state(db)
+    if archived_before is not None and (start_date is None or start_date < archived_before.date()):
+        archived_rows = partial(iter_archived_rows, start_date=start_date, end_date=end_date, type=type, owner_id=owner_id)
+    return export_response(query, "transactions", export_format, gzip, archived_rows)
+
+
+def _subscribe():
+    subscription = transaction_feed.subscribe()
+    if subscription is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many feed subscribers, please retry shortly",
+            headers={"Retry-After": "5"},
+        )
+    return subscription
+
+def _sse_message(item: dict) -> bytes:
+    return b"id: %d\nevent: %s\ndata: %s\n\n" % (item["id"], item["event"].encode(), orjson.dumps(item["data"]))
+
+@router.get("/stream")
+async def stream_transactions(request: Request, current_user: User = Depends(get_current_admin_user)):
+    """Server-sent events for every committed transaction, each commit followed by a report delta.
+
+    A client that falls FEED_CLIENT_BUFFER events behind gets a final `dropped` event and
+    should reconnect and refetch GET /reports/.
+    """
+    subscription = _subscribe()
+
+    async def events():
+        try:
+            yield b"retry: 3000\n\n"
+            while True:
+                try:
+                    item = await asyncio.wait_for(subscription.get(), FEED_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    yield b": keepalive\n\n"
+                    continue
+                if item is None:
+                    yield b"event: dropped\ndata: {\"detail\": \"Client too slow, events were discarded\"}\n\n"
+                    return
+                yield _sse_message(item)
+        finally:
+            transaction_feed.unsubscribe(subscription)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.websocket("/stream")
+async def stream_transactions_ws(websocket: WebSocket, token: Optional[str] = None):
+    """The same feed over a WebSocket, as JSON messages {"id", "event", "data"}.
+
+    Browsers cannot set headers on a WebSocket, so the token may also be passed as ?token=.
+    """
+    authorization = websocket.headers.get("authorization", "")
+    token = token or (authorization[7:] if authorization.lower().startswith("bearer ") else None)
+    try:
+        async with AsyncSessionLocal() as db:
+            await get_current_admin_user(await get_current_user(token or "", db))
+        subscription = _subscribe()
+    except HTTPException as e:
+        code = status.WS_1013_TRY_AGAIN_LATER if e.status_code == 503 else status.WS_1008_POLICY_VIOLATION
+        await websocket.close(code=code, reason=str(e.detail))
+        return
+
+    await websocket.accept()
+    try:
+        while True:
+            try:
+                item = await asyncio.wait_for(subscription.get(), FEED_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                # also how a vanished client is noticed: the send fails
+                await websocket.send_text('{"event": "keepalive"}')
+                continue
+            if item is None:
+                await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER, reason="Client too slow, events were discarded")
+                return
+            await websocket.send_text(orjson.dumps(item).decode())
+    except WebSocketDisconnect:
+        pass
+    finally:
+        transaction_feed.unsubscribe(subscription)
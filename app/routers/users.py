@@ -1,26 +1,41 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
-from app.schemas import UserCreate, User as UserSchema, PaginatedUserResponse
-from app.models import User
-from app.database import get_db
-from app.routers.auth import get_password_hash, get_current_admin_user
+from datetime import datetime, timezone
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.schemas import UserCreate, User as UserSchema, PaginatedUserResponse, PortfolioResponse, BulkUserImportResponse
+from app.models import Asset, User
+from app.database import get_db, get_read_db
+from app.metrics import count_rows_returned
+from app.routers.auth import get_password_hash_async, get_current_admin_user, hash_passwords_bulk
+from app.portfolio import portfolio_as_of
+from app.rollups import record_new_users
+from app.utils import (
+    count_cache, decode_cursor, encode_cursor, fetch_dicts, get_cached_count,
+    iter_upload_chunks, new_bulk_summary, record_bulk_error,
+)
 
 router = APIRouter()
 
+# schemas.User fields, in order, for the column-only fast path
+USER_COLUMNS = (User.username, User.email, User.id, User.created_at, User.role)
+
 @router.post("/", response_model=UserSchema, status_code=status.HTTP_201_CREATED)
-def create_user(
+async def create_user(
     user: UserCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_admin: User = Depends(get_current_admin_user)
 ):
-    db_user = db.query(User).filter(User.username == user.username).first()
+    db_user = await db.scalar(select(User).where(User.username == user.username))
     if db_user:
         raise HTTPException(status_code=400, detail="Username already registered")
-    db_email = db.query(User).filter(User.email == user.email).first()
+    db_email = await db.scalar(select(User).where(User.email == user.email))
     if db_email:
         raise HTTPException(status_code=400, detail="Email already registered")
     
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await get_password_hash_async(user.password)
     db_user = User(
         username=user.username,
         email=user.email,
@@ -28,29 +43,143 @@ def create_user(
         role=user.role
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.flush()
+    await record_new_users(db, [db_user.created_at])
+    await db.commit()
+    await db.refresh(db_user)
+    count_cache.pop(User.__tablename__)
     return db_user
 
+async def _reject_taken(db: AsyncSession, candidates: List[tuple], seen: dict, summary: dict) -> List[tuple]:
+    """Drop rows whose username or email exists already, in the database or earlier in the upload.
+
+    One IN query per column covers the whole chunk.
+    """
+    usernames = {user.username for _, user, _ in candidates}
+    emails = {user.email for _, user, _ in candidates}
+    taken_usernames = seen["usernames"] | set(count_rows_returned((await db.scalars(select(User.username).where(User.username.in_(usernames)))).all()))
+    taken_emails = seen["emails"] | set(count_rows_returned((await db.scalars(select(User.email).where(User.email.in_(emails)))).all()))
+
+    accepted = []
+    for row_number, user, hashed_password in candidates:
+        if user.username in taken_usernames:
+            record_bulk_error(summary, row_number, "Username already registered")
+        elif user.email in taken_emails:
+            record_bulk_error(summary, row_number, "Email already registered")
+        else:
+            taken_usernames.add(user.username)
+            taken_emails.add(user.email)
+            accepted.append((row_number, user, hashed_password))
+    return accepted
+
+async def _insert_user_chunk(db: AsyncSession, chunk: List[tuple], seen: dict, summary: dict):
+    candidates = await _reject_taken(db, [(row_number, user, None) for row_number, user in chunk], seen, summary)
+    if not candidates:
+        return
+    hashed_passwords = await hash_passwords_bulk([user.password for _, user, _ in candidates])
+    candidates = [(row_number, user, hashed) for (row_number, user, _), hashed in zip(candidates, hashed_passwords)]
+
+    created_at = datetime.utcnow()
+    for attempt in range(2):
+        try:
+            await db.execute(insert(User), [
+                {"username": user.username, "email": user.email, "hashed_password": hashed_password,
+                 "role": user.role, "created_at": created_at}
+                for _, user, hashed_password in candidates
+            ])
+            await record_new_users(db, [created_at] * len(candidates))
+            await db.commit()
+            break
+        except IntegrityError:
+            # registered concurrently since the check; re-check once and insert the rest
+            await db.rollback()
+            if attempt:
+                raise
+            candidates = await _reject_taken(db, candidates, seen, summary)
+            if not candidates:
+                return
+
+    seen["usernames"].update(user.username for _, user, _ in candidates)
+    seen["emails"].update(user.email for _, user, _ in candidates)
+    summary["created"] += len(candidates)
+
+@router.post("/bulk", response_model=BulkUserImportResponse)
+async def bulk_create_users(
+    request: Request,
+    chunk_size: int = Query(500, ge=1, le=5000, description="Rows checked, hashed, inserted and committed together"),
+    db: AsyncSession = Depends(get_db),
+    current_admin: User = Depends(get_current_admin_user)
+):
+    """Stream users from an NDJSON (default) or CSV (`Content-Type: text/csv`) body.
+
+    Per chunk: one uniqueness query per column, passwords hashed across the bulk process
+    pool, then a single multi-row insert and commit. Rejected rows are reported individually.
+    """
+    summary = new_bulk_summary()
+    # usernames and emails created earlier in this upload
+    seen = {"usernames": set(), "emails": set()}
+    async for chunk in iter_upload_chunks(request, UserCreate, chunk_size, summary):
+        await _insert_user_chunk(db, chunk, seen, summary)
+
+    count_cache.pop(User.__tablename__)
+    return summary
+
 @router.get("/", response_model=PaginatedUserResponse)
-def read_users(
-    page: int = Query(1, ge=1, description="Page number, starting from 1"),
+async def read_users(
+    page: int = Query(1, ge=1, description="Page number, starting from 1. Ignored when a cursor is given"),
     limit: int = Query(20, ge=1, le=200, description="Number of items per page"),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from a previous page's next_cursor"),
+    include_total: bool = Query(True, description="Include the (cached, possibly slightly stale) total_count"),
     current_admin: User = Depends(get_current_admin_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
-    total_count = db.query(User).count()
-    skip = (page - 1) * limit
-    users = db.query(User).offset(skip).limit(limit).all()
+    query = select(*USER_COLUMNS).order_by(User.id)
+    if cursor:
+        query = query.where(User.id > decode_cursor(cursor))
+    else:
+        query = query.offset((page - 1) * limit)
 
-    has_next_page = (skip + len(users)) < total_count
-    has_previous_page = page > 1
+    users = await fetch_dicts(db, query.limit(limit + 1))
+    has_next_page = len(users) > limit
+    users = users[:limit]
 
-    return {
-        "total_count": total_count,
-        "page": page,
+    return ORJSONResponse({
+        "total_count": await get_cached_count(db, User) if include_total else None,
+        "page": None if cursor else page,
         "limit": limit,
         "has_next_page": has_next_page,
-        "has_previous_page": has_previous_page,
+        "has_previous_page": bool(cursor) or page > 1,
+        "next_cursor": encode_cursor(users[-1]["id"]) if has_next_page else None,
         "users": users,
-    }
\ No newline at end of file
+    })
+
+@router.get("/{user_id}/portfolio", response_model=PortfolioResponse)
+async def read_user_portfolio(
+    user_id: int,
+    as_of: Optional[datetime] = Query(None, description="Point in time (UTC) to value the portfolio at; defaults to now"),
+    current_admin: User = Depends(get_current_admin_user),
+    db: AsyncSession = Depends(get_read_db)
+):
+    if await db.scalar(select(User.id).where(User.id == user_id)) is None:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    if as_of is None:
+        as_of = datetime.utcnow()
+    elif as_of.tzinfo is not None:
+        as_of = as_of.astimezone(timezone.utc).replace(tzinfo=None)
+    values = await portfolio_as_of(db, user_id, as_of)
+    # names and types never change, so the current rows describe past holdings too
+    assets = count_rows_returned((await db.execute(
+        select(Asset.id, Asset.name, Asset.type).where(Asset.id.in_(values)).order_by(Asset.id)
+    )).all()) if values else []
+
+    return {
+        "user_id": user_id,
+        "as_of": as_of,
+        "asset_count": len(values),
+        "total_value": round(sum(values.values()), 2),
+        "holdings": [
+            {"asset_id": asset.id, "name": asset.name, "type": asset.type, "value": values[asset.id]}
+            for asset in assets
+        ],
+    }
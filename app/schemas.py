@@ -1,6 +1,6 @@
-from typing import Optional, List, Dict
-from pydantic import BaseModel, EmailStr
-from datetime import datetime
+from typing import Any, Literal, Optional, List, Dict
+from pydantic import BaseModel, EmailStr, Field
+from datetime import date, datetime
 from app.models import AssetType, TransactionType, UserRole
 
 class Token(BaseModel):
@@ -27,13 +27,27 @@ class User(UserBase):
         orm_mode = True
 
 class PaginatedUserResponse(BaseModel):
-    total_count: int
-    page: int
+    total_count: Optional[int] = None
+    page: Optional[int] = None
     limit: int
     has_next_page: bool
     has_previous_page: bool
+    next_cursor: Optional[str] = None
     users: List[User]
 
+class PortfolioHolding(BaseModel):
+    asset_id: int
+    name: str
+    type: AssetType
+    value: float
+
+class PortfolioResponse(BaseModel):
+    user_id: int
+    as_of: datetime
+    asset_count: int
+    total_value: float
+    holdings: List[PortfolioHolding]
+
 class AssetBase(BaseModel):
     name: str
     type: AssetType
@@ -46,18 +60,36 @@ class Asset(AssetBase):
     id: int
     owner_id: int
     created_at: datetime
+    version: int
     
     class Config:
         orm_mode = True
 
 class PaginatedAssetResponse(BaseModel):
-    total_count: int
-    page: int
+    total_count: Optional[int] = None
+    page: Optional[int] = None
     limit: int
     has_next_page: bool
     has_previous_page: bool
+    next_cursor: Optional[str] = None
     assets: List[Asset]
 
+class BulkRowError(BaseModel):
+    row: int
+    error: str
+
+class BulkAssetImportResponse(BaseModel):
+    received: int
+    created: int
+    failed: int
+    errors: List[BulkRowError]
+
+class BulkUserImportResponse(BaseModel):
+    received: int
+    created: int
+    failed: int
+    errors: List[BulkRowError]
+
 class ReportResponse(BaseModel):
     total_assets: int
     total_asset_value: float
@@ -67,11 +99,32 @@ class ReportResponse(BaseModel):
     asset_types_distribution: Dict[AssetType, int]
     most_valuable_asset: Optional[Asset] = None
 
+class ReportJobCreate(BaseModel):
+    kind: Literal["report", "graphs"] = "report"
+    # graphs only, as in GET /analytics/graphs
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+    granularity: str = Field("auto", pattern="^(day|week|month|auto)$")
+    max_points: int = Field(366, ge=10, le=5000)
+    # report only, as in GET /reports/
+    include_archived: bool = False
+
+class ReportJob(BaseModel):
+    id: str
+    kind: str
+    params: Dict[str, Any]
+    status: Literal["queued", "running", "done", "failed"]
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+
 class TransactionCreate(BaseModel):
     asset_id: int
     to_user_id: int
     type: TransactionType
     amount: Optional[float] = 0.0
+    expected_version: Optional[int] = None
 
 class Transaction(BaseModel):
     id: int
@@ -86,6 +139,16 @@ class Transaction(BaseModel):
     class Config:
         orm_mode = True
 
+class TransactionBatchCreate(BaseModel):
+    transactions: List[TransactionCreate] = Field(..., min_length=1, max_length=5000)
+    atomic: bool = True
+
+class TransactionBatchResponse(BaseModel):
+    created: int
+    failed: int
+    transactions: List[Transaction]
+    errors: List[BulkRowError]
+
 class UserLogin(BaseModel):
     username: str
     password: str
\ No newline at end of file
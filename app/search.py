@@ -0,0 +1,86 @@
+"""Case-insensitive substring search on asset names.
+
+SQLite uses an external-content FTS5 table with the trigram tokenizer (SQLite 3.34+), kept in
+sync with `assets` by triggers. PostgreSQL uses a `pg_trgm` GIN index, which ILIKE picks up.
+When neither can be set up (no FTS5, no pg_trgm, or no privilege to create the extension),
+searches fall back to a plain LIKE scan. Trigram indexes need at least three characters, so
+shorter terms always take the fallback.
+"""
+import logging
+from typing import Optional
+
+from sqlalchemy import select, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Asset
+
+logger = logging.getLogger(__name__)
+
+TRIGRAM_MIN_LENGTH = 3
+
+SQLITE_FTS_DDL = [
+    "CREATE VIRTUAL TABLE assets_fts USING fts5(name, content='assets', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER assets_fts_ai AFTER INSERT ON assets BEGIN "
+    "INSERT INTO assets_fts(rowid, name) VALUES (new.id, new.name); END",
+    "CREATE TRIGGER assets_fts_ad AFTER DELETE ON assets BEGIN "
+    "INSERT INTO assets_fts(assets_fts, rowid, name) VALUES ('delete', old.id, old.name); END",
+    "CREATE TRIGGER assets_fts_au AFTER UPDATE OF name ON assets BEGIN "
+    "INSERT INTO assets_fts(assets_fts, rowid, name) VALUES ('delete', old.id, old.name); "
+    "INSERT INTO assets_fts(rowid, name) VALUES (new.id, new.name); END",
+    # index the rows that existed before the table did
+    "INSERT INTO assets_fts(assets_fts) VALUES ('rebuild')",
+]
+
+POSTGRESQL_TRGM_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_assets_name_trgm ON assets USING gin (name gin_trgm_ops)",
+]
+
+# backend per dialect, detected on first search: "fts5", "pg_trgm" or None for the LIKE fallback
+_backends = {}
+
+
+def setup_name_search(engine):
+    """Create the search index for `engine`'s dialect if it is missing; safe to call on every start."""
+    dialect_name = engine.dialect.name
+    try:
+        with engine.begin() as connection:
+            if dialect_name == "sqlite":
+                exists = connection.execute(
+                    text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'assets_fts'")
+                ).first()
+                if not exists:
+                    for statement in SQLITE_FTS_DDL:
+                        connection.execute(text(statement))
+            elif dialect_name == "postgresql":
+                for statement in POSTGRESQL_TRGM_DDL:
+                    connection.execute(text(statement))
+    except DBAPIError as e:
+        logger.warning("Asset name search index unavailable, falling back to LIKE scans: %s", e)
+
+
+async def _detect_backend(db: AsyncSession) -> Optional[str]:
+    dialect_name = db.get_bind().dialect.name
+    if dialect_name not in _backends:
+        if dialect_name == "sqlite":
+            query = "SELECT 'fts5' FROM sqlite_master WHERE type = 'table' AND name = 'assets_fts'"
+        elif dialect_name == "postgresql":
+            query = "SELECT 'pg_trgm' FROM pg_indexes WHERE tablename = 'assets' AND indexname = 'ix_assets_name_trgm'"
+        else:
+            query = None
+        _backends[dialect_name] = await db.scalar(text(query)) if query else None
+    return _backends[dialect_name]
+
+
+async def name_contains_filter(db: AsyncSession, term: str):
+    """WHERE clause matching assets whose name contains `term`, ignoring case."""
+    backend = await _detect_backend(db) if len(term) >= TRIGRAM_MIN_LENGTH else None
+    if backend == "fts5":
+        phrase = '"' + term.replace('"', '""') + '"'
+        matches = select(text("rowid")).select_from(text("assets_fts")).where(
+            text("assets_fts MATCH :phrase").bindparams(phrase=phrase)
+        )
+        return Asset.id.in_(matches)
+    pattern = "%" + term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+    return Asset.name.ilike(pattern, escape="\\")
@@ -0,0 +1,390 @@
+"""Columnar in-memory snapshot of assets and transactions for distribution analytics.
+
+Each column is a compact NumPy array: int64 ids, int32 user ids, int8 type codes, float64
+values and datetime64[s] timestamps. Statistics over millions of rows then take a few
+vectorized passes instead of SQL that SQLite and PostgreSQL cannot share.
+
+The snapshot is loaded on first use and refreshed incrementally:
+
+* transactions are append-only, so only rows above the highest loaded id are fetched;
+* assets only change through transactions, so new assets are fetched above the id
+  watermark, and the older assets named by newly loaded transactions are re-read in place.
+
+Ids are handed out at insert time but become visible at commit, so a row can appear below a
+watermark that a later transaction already pushed past it. Each refresh therefore also
+re-reads the last ANALYTICS_SNAPSHOT_RESCAN_IDS ids below both watermarks and adds the rows
+it has not loaded yet.
+
+A refresh runs when this process has committed a write (`data_version`) or the snapshot is
+older than ANALYTICS_SNAPSHOT_MAX_AGE_SECONDS, which picks up writes from other processes.
+Changes made outside the API (for example a direct SQL update) are only picked up by the
+full reload every ANALYTICS_SNAPSHOT_RELOAD_SECONDS.
+
+`transactions` holds the hot table only. Archived transactions (see app/archive.py) are
+loaded into `archived_transactions` the first time a query needs them, and both are
+reloaded after each archival run.
+"""
+import asyncio
+import os
+import time
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.archive import archive_state, iter_archived_columns
+from app.metrics import count_rows_returned
+from app.models import Asset, AssetType, Transaction, TransactionType
+from app.versioning import data_version
+
+ANALYTICS_SNAPSHOT_MAX_AGE_SECONDS = float(os.getenv("ANALYTICS_SNAPSHOT_MAX_AGE_SECONDS", "5"))
+ANALYTICS_SNAPSHOT_RELOAD_SECONDS = float(os.getenv("ANALYTICS_SNAPSHOT_RELOAD_SECONDS", "3600"))
+ANALYTICS_SNAPSHOT_RESCAN_IDS = int(os.getenv("ANALYTICS_SNAPSHOT_RESCAN_IDS", "1000"))
+SNAPSHOT_FETCH_SIZE = 50_000
+
+ASSET_TYPES = list(AssetType)
+TRANSACTION_TYPES = list(TransactionType)
+_ASSET_TYPE_CODES = {asset_type: code for code, asset_type in enumerate(ASSET_TYPES)}
+_TRANSACTION_TYPE_CODES = {transaction_type: code for code, transaction_type in enumerate(TRANSACTION_TYPES)}
+
+
+class GrowableArray:
+    """A 1-d array with amortized O(1) appends (capacity doubles when full)."""
+
+    def __init__(self, dtype):
+        self._data = np.empty(1024, dtype=dtype)
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def values(self) -> np.ndarray:
+        # a view, not a copy; callers must not keep it across a refresh
+        return self._data[:self._size]
+
+    def extend(self, values):
+        values = np.asarray(values, dtype=self._data.dtype)
+        needed = self._size + len(values)
+        if needed > len(self._data):
+            grown = np.empty(max(needed, 2 * len(self._data)), dtype=self._data.dtype)
+            grown[:self._size] = self.values
+            self._data = grown
+        self._data[self._size:needed] = values
+        self._size = needed
+
+
+class ColumnarTable:
+    def __init__(self, columns: dict):
+        self.dtypes = columns
+        self.clear()
+
+    def clear(self):
+        self.columns = {name: GrowableArray(dtype) for name, dtype in self.dtypes.items()}
+
+    def __len__(self):
+        return len(self.columns["id"])
+
+    def __getitem__(self, name) -> np.ndarray:
+        return self.columns[name].values
+
+    @property
+    def max_id(self) -> int:
+        return int(self["id"][-1]) if len(self) else 0
+
+    def ids_above(self, low: int) -> np.ndarray:
+        ids = self["id"]
+        return ids[np.searchsorted(ids, low, side="right"):]
+
+    def extend(self, rows: dict):
+        """Append rows; rows are kept sorted by id even when some arrive below the current max."""
+        previous_max = self.max_id
+        for name, values in rows.items():
+            self.columns[name].extend(values)
+        if len(rows["id"]) and previous_max and min(rows["id"]) < previous_max:
+            order = np.argsort(self["id"], kind="stable")
+            for column in self.columns.values():
+                column.values[:] = column.values[order]
+
+
+ASSET_COLUMNS = {"id": np.int64, "owner_id": np.int32, "type": np.int8, "value": np.float64, "created_at": "datetime64[s]"}
+TRANSACTION_COLUMNS = {"id": np.int64, "asset_id": np.int64, "type": np.int8, "amount": np.float64, "timestamp": "datetime64[s]"}
+
+
+def _asset_rows(rows) -> dict:
+    ids, owner_ids, types, values, created_ats = zip(*rows)
+    return {
+        "id": ids, "owner_id": owner_ids, "type": [_ASSET_TYPE_CODES[t] for t in types],
+        "value": values, "created_at": np.array(created_ats, dtype="datetime64[s]"),
+    }
+
+
+def _transaction_rows(rows) -> dict:
+    ids, asset_ids, types, amounts, timestamps = zip(*rows)
+    return {
+        "id": ids, "asset_id": asset_ids, "type": [_TRANSACTION_TYPE_CODES[t] for t in types],
+        "amount": amounts, "timestamp": np.array(timestamps, dtype="datetime64[s]"),
+    }
+
+
+class AnalyticsSnapshot:
+    def __init__(self):
+        self.assets = ColumnarTable(ASSET_COLUMNS)
+        self.transactions = ColumnarTable(TRANSACTION_COLUMNS)
+        self.archived_transactions = ColumnarTable(TRANSACTION_COLUMNS)
+        self.archived_before: Optional[datetime] = None
+        self.refreshed_at: Optional[datetime] = None
+        self._refreshed_monotonic = 0.0
+        self._loaded_monotonic = 0.0
+        self._data_version = None
+        # newest archive segment seen, and the one archived_transactions was loaded up to
+        self._archive_segment_id = None
+        self._archived_segment_id = None
+        self._lock = asyncio.Lock()
+
+    def is_stale(self, include_archived: bool = False) -> bool:
+        return (
+            self.refreshed_at is None
+            or self._data_version != data_version.value
+            or time.monotonic() - self._refreshed_monotonic > ANALYTICS_SNAPSHOT_MAX_AGE_SECONDS
+            or (include_archived and self._archived_segment_id != self._archive_segment_id)
+        )
+
+    async def ensure_fresh(self, db: AsyncSession, include_archived: bool = False):
+        if not self.is_stale(include_archived):
+            return
+        async with self._lock:
+            if self.is_stale(include_archived):
+                await self.refresh(db, include_archived)
+
+    async def refresh(self, db: AsyncSession, include_archived: bool = False):
+        version = data_version.value
+        archive_segment_id, self.archived_before = await archive_state(db)
+        # an archival run deletes hot rows, which the incremental refresh cannot see
+        if (time.monotonic() - self._loaded_monotonic > ANALYTICS_SNAPSHOT_RELOAD_SECONDS
+                or archive_segment_id != self._archive_segment_id):
+            self.assets.clear()
+            self.transactions.clear()
+            self._loaded_monotonic = time.monotonic()
+            self._archive_segment_id = archive_segment_id
+
+        # transactions first: the assets read afterwards already reflect every loaded transaction
+        new_transaction_ids = await self._load(
+            db, self.transactions, _transaction_rows,
+            select(Transaction.id, Transaction.asset_id, Transaction.type, Transaction.amount, Transaction.timestamp),
+            Transaction.id,
+        )
+        asset_watermark = self.assets.max_id
+        new_asset_ids = await self._load(
+            db, self.assets, _asset_rows,
+            select(Asset.id, Asset.owner_id, Asset.type, Asset.value, Asset.created_at),
+            Asset.id,
+        )
+
+        # on a (re)load the assets were all read after the transactions, so only a refresh of
+        # already-loaded assets needs the re-read, even if no transactions were loaded before
+        if asset_watermark and len(new_transaction_ids):
+            positions = np.searchsorted(self.transactions["id"], new_transaction_ids)
+            changed = np.unique(self.transactions["asset_id"][positions])
+            # assets loaded just now are already current
+            await self._reload_assets(db, changed[~np.isin(changed, new_asset_ids)])
+
+        if include_archived and self._archived_segment_id != archive_segment_id:
+            self.archived_transactions.clear()
+            async for columns in iter_archived_columns(db):
+                self.archived_transactions.extend({name: columns[name] for name in TRANSACTION_COLUMNS})
+            self._archived_segment_id = archive_segment_id
+
+        self.refreshed_at = datetime.utcnow()
+        self._refreshed_monotonic = time.monotonic()
+        self._data_version = version
+
+    async def _load(self, db: AsyncSession, table: ColumnarTable, to_columns, query, id_column) -> np.ndarray:
+        """Load the rows above the watermark and the unseen ones in the re-scanned window; returns their ids."""
+        low = max(table.max_id - ANALYTICS_SNAPSHOT_RESCAN_IDS, 0) if table.max_id else 0
+        known_ids = table.ids_above(low)
+        query = query.where(id_column > low).order_by(id_column)
+        result = await db.stream(query.execution_options(yield_per=SNAPSHOT_FETCH_SIZE))
+        loaded = []
+        async for rows in result.partitions():
+            columns = to_columns(count_rows_returned(rows))
+            if len(known_ids):
+                unseen = ~np.isin(np.asarray(columns["id"]), known_ids)
+                if not unseen.all():
+                    columns = {name: np.asarray(values)[unseen] for name, values in columns.items()}
+            table.extend(columns)
+            loaded.append(np.asarray(columns["id"], dtype=np.int64))
+        return np.concatenate(loaded) if loaded else np.empty(0, dtype=np.int64)
+
+    async def _reload_assets(self, db: AsyncSession, asset_ids: np.ndarray):
+        for start in range(0, len(asset_ids), 5000):
+            chunk = asset_ids[start:start + 5000].tolist()
+            rows = count_rows_returned((await db.execute(
+                select(Asset.id, Asset.owner_id, Asset.value).where(Asset.id.in_(chunk))
+            )).all())
+            if not rows:
+                continue
+            ids, owner_ids, values = (np.array(column) for column in zip(*rows))
+            # ids are sorted, so each row's position is a binary search away
+            positions = np.minimum(np.searchsorted(self.assets["id"], ids), len(self.assets) - 1)
+            # an asset committed after this refresh read the assets is picked up by the next one
+            loaded = self.assets["id"][positions] == ids
+            owner_ids, values, positions = owner_ids[loaded], values[loaded], positions[loaded]
+            self.assets["owner_id"][positions] = owner_ids
+            self.assets["value"][positions] = values
+
+
+analytics_snapshot = AnalyticsSnapshot()
+
+
+def percentiles(values: np.ndarray, qs) -> list:
+    """Same results as np.percentile (linear interpolation), but with a single copy of `values`.
+
+    Each quantile is selected with an in-place partition of only the part of the array at or
+    above the previous one, so p50/p90/p99 cost about 1.6 passes instead of a full
+    partition each.
+    """
+    work = values.copy()
+    n = len(work)
+    result = []
+    offset = 0
+    for q in sorted(qs):
+        position = q / 100 * (n - 1)
+        k = int(position)
+        fraction = position - k
+        work.partition(k - offset)
+        low = work[k - offset]
+        high = work[k - offset + 1:].min() if fraction and k + 1 < n else low
+        result.append(float(low + (high - low) * fraction))
+        work = work[k - offset:]
+        offset = k
+    return result
+
+
+def summarize(values: np.ndarray, bins: int, log_scale: bool) -> dict:
+    """Count, total, mean, extremes, p50/p90/p99 and a histogram of `values`."""
+    if not len(values):
+        return {"count": 0, "total": 0.0, "mean": None, "min": None, "max": None,
+                "percentiles": {"p50": None, "p90": None, "p99": None}, "histogram": {"edges": [], "counts": []}}
+    low, high = float(values.min()), float(values.max())
+    if log_scale and low > 0:
+        edges = np.geomspace(low, high, bins + 1) if high > low else np.array([low, high])
+    else:
+        edges = np.linspace(low, high, bins + 1) if high > low else np.array([low, high])
+    counts, edges = np.histogram(values, bins=edges)
+    p50, p90, p99 = percentiles(values, [50, 90, 99])
+    return {
+        "count": int(len(values)),
+        "total": round(float(values.sum()), 2),
+        "mean": round(float(values.mean()), 2),
+        "min": round(low, 2),
+        "max": round(high, 2),
+        "percentiles": {"p50": round(p50, 2), "p90": round(p90, 2), "p99": round(p99, 2)},
+        "histogram": {"edges": np.round(edges, 2).tolist(), "counts": counts.tolist()},
+    }
+
+
+def concentration(owner_ids: np.ndarray, values: np.ndarray, top: int) -> dict:
+    """How asset value is spread across owners: top-N holders, top-share, Gini and HHI."""
+    totals = np.bincount(owner_ids, weights=values)
+    counts = np.bincount(owner_ids)
+    holders = np.flatnonzero(counts)
+    held = totals[holders]
+    total_value = float(held.sum())
+    if not len(holders) or total_value <= 0:
+        return {"holders": int(len(holders)), "top_1_percent_share": None, "top_10_percent_share": None,
+                "gini": None, "hhi": None, "top_holders": []}
+
+    ascending = np.sort(held)
+    descending = ascending[::-1]
+    n = len(ascending)
+    # Gini from the sorted values: 1 - 2 * (area under the Lorenz curve)
+    gini = (2 * np.arange(1, n + 1) - n - 1).dot(ascending) / (n * ascending.sum())
+    shares = held / total_value
+
+    top = min(top, n)
+    top_positions = np.argpartition(-held, top - 1)[:top]
+    top_positions = top_positions[np.argsort(-held[top_positions], kind="stable")]
+    return {
+        "holders": n,
+        "top_1_percent_share": round(float(descending[:max(1, n // 100)].sum() / total_value), 4),
+        "top_10_percent_share": round(float(descending[:max(1, n // 10)].sum() / total_value), 4),
+        "gini": round(float(gini), 4),
+        "hhi": round(float((shares ** 2).sum()), 6),
+        "top_holders": [
+            {"owner_id": int(holders[position]), "asset_count": int(counts[holders[position]]),
+             "total_value": round(float(held[position]), 2), "share": round(float(shares[position]), 4)}
+            for position in top_positions
+        ],
+    }
+
+
+def _and(mask: Optional[np.ndarray], condition: np.ndarray) -> np.ndarray:
+    return condition if mask is None else mask & condition
+
+
+def _where(column: np.ndarray, mask: Optional[np.ndarray]) -> np.ndarray:
+    return column if mask is None else column[mask]
+
+
+def _transaction_amounts(
+    transactions: ColumnarTable,
+    transaction_type: Optional[TransactionType],
+    start_date: Optional[date],
+    end_date: Optional[date],
+) -> np.ndarray:
+    # boolean masks only when filtering: indexing with an all-true mask would copy every column
+    mask = None
+    if transaction_type is not None:
+        mask = transactions["type"] == _TRANSACTION_TYPE_CODES[transaction_type]
+    if start_date:
+        mask = _and(mask, transactions["timestamp"] >= np.datetime64(start_date, "s"))
+    if end_date:
+        mask = _and(mask, transactions["timestamp"] < np.datetime64(end_date + timedelta(days=1), "s"))
+    return _where(transactions["amount"], mask)
+
+
+def build_distributions(
+    snapshot: AnalyticsSnapshot,
+    asset_type: Optional[AssetType] = None,
+    transaction_type: Optional[TransactionType] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    bins: int = 20,
+    log_scale: bool = True,
+    top: int = 10,
+    include_archived: bool = False,
+) -> dict:
+    assets = snapshot.assets
+
+    asset_mask = None
+    if asset_type is not None:
+        asset_mask = assets["type"] == _ASSET_TYPE_CODES[asset_type]
+    transaction_amounts = _transaction_amounts(snapshot.transactions, transaction_type, start_date, end_date)
+    if include_archived:
+        transaction_amounts = np.concatenate([
+            _transaction_amounts(snapshot.archived_transactions, transaction_type, start_date, end_date),
+            transaction_amounts,
+        ])
+
+    asset_values = _where(assets["value"], asset_mask)
+    asset_types = _where(assets["type"], asset_mask)
+    return {
+        "snapshot": {
+            "refreshed_at": snapshot.refreshed_at,
+            "assets": len(assets),
+            "transactions": len(snapshot.transactions),
+            "archived_transactions": len(snapshot.archived_transactions) if include_archived else None,
+            "archived_before": snapshot.archived_before,
+        },
+        "asset_value": summarize(asset_values, bins, log_scale),
+        "asset_value_by_type": {
+            kind.value: summarize(asset_values[asset_types == code], bins, log_scale)
+            for code, kind in enumerate(ASSET_TYPES)
+            if asset_type in (None, kind)
+        },
+        "transaction_amount": summarize(transaction_amounts, bins, log_scale),
+        "concentration": concentration(_where(assets["owner_id"], asset_mask), asset_values, top),
+    }
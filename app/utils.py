@@ -0,0 +1,322 @@
+import base64
+import binascii
+import csv
+import enum
+import io
+import json
+import time
+import zlib
+from collections import OrderedDict
+from datetime import date, datetime, time as dt_time, timedelta
+from threading import Lock
+from typing import Any, AsyncIterator, Hashable, Optional, Tuple
+
+from fastapi import HTTPException, Request, status
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy import Date, func, select
+
+from app.database import AsyncReadSessionLocal
+from app.metrics import count_rows_returned
+
+
+class TTLCache:
+    """Small thread-safe LRU cache whose entries expire after `ttl` seconds."""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] < time.monotonic():
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        return {"size": len(self._data), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+
+def encode_cursor(last_id: int) -> str:
+    """Opaque keyset cursor pointing just after the row with `last_id`."""
+    return base64.urlsafe_b64encode(str(last_id).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return int(base64.urlsafe_b64decode(padded.encode()).decode())
+    except (ValueError, binascii.Error, UnicodeDecodeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+def encode_sort_cursor(sort_value: Any, last_id: int) -> str:
+    """Keyset cursor for listings ordered by (sort column, id)."""
+    if isinstance(sort_value, datetime):
+        sort_value = sort_value.isoformat()
+    return base64.urlsafe_b64encode(json.dumps([sort_value, last_id]).encode()).decode().rstrip("=")
+
+
+def decode_sort_cursor(cursor: str) -> Tuple[Any, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_value, last_id = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        if not isinstance(last_id, int):
+            raise ValueError("cursor id must be an integer")
+        return sort_value, last_id
+    except (ValueError, TypeError, binascii.Error, UnicodeDecodeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+# Row counts for paginated listings; a few seconds of staleness is fine for a total.
+count_cache = TTLCache(maxsize=64, ttl=30.0)
+
+
+async def get_cached_count(db, model, filters: tuple = (), key: Hashable = None) -> int:
+    """Cached row count of `model`; filtered counts need a `key` identifying the filters."""
+    key = model.__tablename__ if not filters else (model.__tablename__, key)
+    total_count = count_cache.get(key)
+    if total_count is None:
+        total_count = await db.scalar(select(func.count(model.id)).where(*filters))
+        count_cache.set(key, total_count)
+    return total_count
+
+
+async def fetch_dicts(db, statement) -> list:
+    """Run a column select and return plain dicts keyed by column name.
+
+    Used with ORJSONResponse on hot read paths to skip ORM hydration (and the identity map)
+    and per-row Pydantic validation; select the columns in the response schema's field order.
+    """
+    return count_rows_returned([dict(row) for row in (await db.execute(statement)).mappings()])
+
+
+def date_range_filters(column, start_date: Optional[date] = None, end_date: Optional[date] = None) -> list:
+    """Inclusive date filters as a half-open range [start_date, end_date + 1 day) on the bare column.
+
+    Comparing the raw column (never a CAST or date() of it) keeps an index on it usable.
+    """
+    is_date = isinstance(column.type, Date)
+    filters = []
+    if start_date:
+        filters.append(column >= (start_date if is_date else datetime.combine(start_date, dt_time.min)))
+    if end_date:
+        upper = end_date + timedelta(days=1)
+        filters.append(column < (upper if is_date else datetime.combine(upper, dt_time.min)))
+    return filters
+
+
+async def iter_body_lines(request: Request) -> AsyncIterator[str]:
+    """Yield the request body line by line as it arrives, without buffering the whole upload."""
+    buffer = b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line.decode("utf-8-sig", errors="replace").rstrip("\r")
+    if buffer:
+        yield buffer.decode("utf-8-sig", errors="replace").rstrip("\r")
+
+
+def _csv_quote_open(record: str) -> bool:
+    """Whether `record` ends inside a quoted field (one that opened at the start of a field)."""
+    in_quotes = False
+    field_start = True
+    i = 0
+    while i < len(record):
+        char = record[i]
+        if in_quotes:
+            if char == '"':
+                if record[i + 1:i + 2] == '"':
+                    i += 1
+                else:
+                    in_quotes = False
+        elif char == '"' and field_start:
+            in_quotes = True
+        field_start = not in_quotes and char == ","
+        i += 1
+    return in_quotes
+
+
+async def iter_csv_records(request: Request) -> AsyncIterator[str]:
+    """Yield whole CSV records: physical lines are joined while a quoted field is still open.
+
+    Blank lines outside quotes are skipped.
+    """
+    record = None
+    async for line in iter_body_lines(request):
+        if record is None:
+            if not line.strip():
+                continue
+            record = line
+        else:
+            record += "\n" + line
+        if not _csv_quote_open(record):
+            yield record
+            record = None
+    if record is not None:
+        # unterminated quoted field; the parser reports it
+        yield record
+
+
+async def iter_upload_records(request: Request) -> AsyncIterator[Tuple[int, Optional[dict], Optional[str]]]:
+    """Parse an NDJSON or CSV (by Content-Type) upload into (row_number, record, error) tuples.
+
+    Row numbers are 1-based and exclude the CSV header; blank lines are skipped. A CSV row
+    is one record, even when a quoted field spans several lines.
+    """
+    is_csv = "csv" in request.headers.get("content-type", "")
+    header = None
+    row_number = 0
+    lines = iter_csv_records(request) if is_csv else iter_body_lines(request)
+    async for line in lines:
+        if not line.strip():
+            continue
+        if is_csv and header is None:
+            header = [name.strip() for name in next(csv.reader([line]))]
+            continue
+        row_number += 1
+        try:
+            if is_csv:
+                values = next(csv.reader([line], strict=True))
+                if len(values) != len(header):
+                    raise ValueError(f"expected {len(header)} columns, got {len(values)}")
+                record = dict(zip(header, values))
+            else:
+                record = json.loads(line)
+                if not isinstance(record, dict):
+                    raise ValueError("each line must be a JSON object")
+        except (ValueError, csv.Error) as e:
+            yield row_number, None, str(e)
+            continue
+        yield row_number, record, None
+
+
+# only the first N per-row errors are echoed back by bulk imports; `failed` always has the full count
+BULK_MAX_REPORTED_ERRORS = 1000
+
+
+def new_bulk_summary() -> dict:
+    return {"received": 0, "created": 0, "failed": 0, "errors": []}
+
+
+def record_bulk_error(summary: dict, row_number: int, error: str):
+    summary["failed"] += 1
+    if len(summary["errors"]) < BULK_MAX_REPORTED_ERRORS:
+        summary["errors"].append({"row": row_number, "error": error})
+
+
+async def iter_upload_chunks(request: Request, schema, chunk_size: int, summary: dict) -> AsyncIterator[list]:
+    """Validate an upload against `schema` and yield lists of (row_number, model) of up to `chunk_size`.
+
+    Unparseable or invalid rows are recorded in `summary` and left out of the chunks.
+    """
+    chunk = []
+    async for row_number, record, error in iter_upload_records(request):
+        summary["received"] += 1
+        if error is None:
+            try:
+                chunk.append((row_number, schema.model_validate(record)))
+            except ValidationError as e:
+                error = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+        if error is not None:
+            record_bulk_error(summary, row_number, error)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+EXPORT_BATCH_SIZE = 1000
+
+
+def _export_value(value):
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+async def _iter_export(statement, fmt: str, archived_rows=None):
+    # The request's session is closed before a streaming body is sent, so use a dedicated one.
+    async with AsyncReadSessionLocal() as db:
+        columns = list(statement.selected_columns.keys())
+        if fmt == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(columns)
+
+        def serialize(rows) -> bytes:
+            if fmt == "csv":
+                writer.writerows([[_export_value(value) for value in row] for row in rows])
+                chunk = buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            else:
+                chunk = "".join(
+                    json.dumps(dict(zip(columns, map(_export_value, row)))) + "\n" for row in rows
+                )
+            return chunk.encode()
+
+        if archived_rows is not None:
+            async for rows in archived_rows(db):
+                yield serialize(rows)
+        result = await db.stream(statement.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        async for rows in result.partitions():
+            yield serialize(count_rows_returned(rows))
+        if fmt == "csv" and buffer.tell():
+            yield buffer.getvalue().encode()
+
+
+async def _gzip_stream(chunks):
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export_response(
+    statement, filename: str, fmt: str = "csv", compress: bool = False, archived_rows=None
+) -> StreamingResponse:
+    """Stream the rows of `statement` as CSV or NDJSON through a server-side cursor.
+
+    Rows are serialized straight from column tuples in batches of EXPORT_BATCH_SIZE, so
+    memory stays flat regardless of the number of rows exported. `archived_rows(db)`, if
+    given, yields batches of older rows with the same columns that are streamed first.
+    """
+    media_type = "text/csv" if fmt == "csv" else "application/x-ndjson"
+    filename = f"{filename}.{fmt}"
+    body = _iter_export(statement, fmt, archived_rows)
+    if compress:
+        media_type, filename, body = "application/gzip", filename + ".gz", _gzip_stream(body)
+    return StreamingResponse(body, media_type=media_type, headers={"Content-Disposition": f'attachment; filename="{filename}"'})
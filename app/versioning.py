@@ -0,0 +1,53 @@
+"""In-process data version for caches derived from assets and transactions.
+
+Any committed session that inserted, updated or deleted an asset or transaction (through
+the unit of work or a bulk insert/update/delete statement) bumps `data_version`. Caches key
+their entries on the current value, so a write invalidates them without tracking which
+entries it affected. Writes from other processes are not seen here, so those caches also
+keep a TTL.
+"""
+from threading import Lock
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+VERSIONED_TABLES = {"assets", "transactions"}
+
+
+class DataVersion:
+    def __init__(self):
+        self.value = 0
+        self._lock = Lock()
+
+    def bump(self):
+        with self._lock:
+            self.value += 1
+
+
+data_version = DataVersion()
+
+
+@event.listens_for(Session, "after_flush")
+def _mark_flushed_changes(session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if getattr(obj, "__tablename__", None) in VERSIONED_TABLES:
+            session.info["data_changed"] = True
+            return
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _mark_bulk_changes(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        if orm_execute_state.statement.table.name in VERSIONED_TABLES:
+            orm_execute_state.session.info["data_changed"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _bump_on_commit(session):
+    if session.info.pop("data_changed", False):
+        data_version.bump()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_on_rollback(session):
+    session.info.pop("data_changed", None)
@@ -0,0 +1,117 @@
+"""Hot/cold archival benchmark.
+
+Generates a dataset (see benchmarks.dataset), times the default report and analytics
+queries, archives every transaction older than --older-than-days with app.archive and
+times them again:
+
+    python -m benchmarks.archive --transactions 500000 --days 730
+
+It also checks that nothing was lost. The export, the report with include_archived and the
+distributions over archived dates must match what they returned before archiving.
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from datetime import date
+
+
+async def measure(client, headers, iterations, include_archived):
+    from app.routers.reports import transaction_summary_cache
+    from app.snapshot import analytics_snapshot
+
+    def reset_snapshot():
+        # drop everything loaded, as in a fresh worker
+        analytics_snapshot.__init__()
+
+    flag = str(include_archived).lower()
+    results = {}
+    # the report cache and the snapshot would otherwise answer every iteration after the first
+    for name, url, reset in (
+        ("report", f"/reports/?include_archived={flag}", transaction_summary_cache.clear),
+        ("distributions", f"/analytics/distributions?include_archived={flag}", reset_snapshot),
+    ):
+        samples = []
+        for _ in range(iterations):
+            reset()
+            started = time.perf_counter()
+            response = await client.get(url, headers=headers)
+            samples.append((time.perf_counter() - started) * 1000)
+            response.raise_for_status()
+        results[name] = (sorted(samples)[len(samples) // 2], response.json())
+    started = time.perf_counter()
+    response = await client.get("/transactions/export?format=csv", headers=headers)
+    results["export"] = ((time.perf_counter() - started) * 1000, sorted(response.text.splitlines()[1:]))
+    return results
+
+
+async def run(iterations, older_than_days):
+    import httpx
+    from app.archive import archive_transactions
+    from app.database import async_engine, engine
+    from app.init_db import DEFAULT_ADMIN_USERNAME
+    from app.main import app
+    from app.routers.auth import create_access_token
+    from sqlalchemy import func, select
+    from app.models import Transaction
+
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': DEFAULT_ADMIN_USERNAME})}"}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600) as client:
+        before = await measure(client, headers, iterations, include_archived=False)
+
+        started = time.perf_counter()
+        segments = await asyncio.to_thread(archive_transactions, engine, older_than_days)
+        archived = sum(segment["row_count"] for segment in segments)
+        with engine.connect() as connection:
+            hot = connection.scalar(select(func.count(Transaction.id)))
+        print(f"archived {archived} transactions into {len(segments)} segments in {time.perf_counter() - started:.2f}s, "
+              f"{hot} left in the hot table")
+
+        hot_only = await measure(client, headers, iterations, include_archived=False)
+        with_archive = await measure(client, headers, iterations, include_archived=True)
+        reaching_back = await client.get(f"/analytics/distributions?start_date=2000-01-01&end_date={date.today()}", headers=headers)
+    await async_engine.dispose()
+
+    print(f"{'':<14}{'before':>12}{'hot only':>12}{'with archive':>14}")
+    for name in ("report", "distributions", "export"):
+        print(f"{name:<14}{before[name][0]:10.1f}ms{hot_only[name][0]:10.1f}ms{with_archive[name][0]:12.1f}ms")
+
+    checks = {
+        "export unchanged": with_archive["export"][1] == before["export"][1],
+        "report with include_archived unchanged":
+            with_archive["report"][1]["transaction_types_distribution"] == before["report"][1]["transaction_types_distribution"],
+        "hot report counts only hot rows":
+            sum(hot_only["report"][1]["transaction_types_distribution"].values()) == hot,
+        "distributions with include_archived unchanged":
+            with_archive["distributions"][1]["transaction_amount"] == before["distributions"][1]["transaction_amount"],
+        "hot distributions count only hot rows": hot_only["distributions"][1]["transaction_amount"]["count"] == hot,
+        "a date before the boundary reads the archive":
+            reaching_back.json()["transaction_amount"] == before["distributions"][1]["transaction_amount"],
+    }
+    for name, passed in checks.items():
+        print(f"{'ok' if passed else 'FAILED':>6}  {name}")
+    if not all(checks.values()):
+        raise SystemExit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--assets", type=int, default=20000)
+    parser.add_argument("--transactions", type=int, default=200000)
+    parser.add_argument("--days", type=int, default=730, help="length of the generated history")
+    parser.add_argument("--older-than-days", type=int, default=90)
+    parser.add_argument("--iterations", type=int, default=5)
+    args = parser.parse_args()
+
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/archive.db")
+    from benchmarks.dataset import build_dataset
+
+    print("generated", build_dataset(args.users, args.assets, args.transactions, days=args.days))
+    asyncio.run(run(args.iterations, args.older_than_days))
+
+
+if __name__ == "__main__":
+    main()
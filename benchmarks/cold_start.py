@@ -0,0 +1,103 @@
+"""Cold start benchmark: time from launching a worker to its first responses.
+
+Starts `uvicorn app.main:app` as a fresh process several times and measures:
+
+* ready: launch until the first response of any kind (GET /metrics);
+* first query: launch until the first authenticated database-backed response (GET /users/).
+
+    python -m benchmarks.cold_start --runs 5
+
+The database is initialized once with `app.init_db` before the runs, as in a deploy. With
+--auto-init, every run instead starts on an empty database with DB_AUTO_INIT=true, so the
+worker creates the schema and hashes the admin password before it can serve. That is the
+cost that used to be paid on every boot.
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.login_storm import percentile
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(client, url, headers, started, timeout):
+    while time.perf_counter() - started < timeout:
+        try:
+            response = client.get(url, headers=headers)
+        except Exception:
+            time.sleep(0.005)
+            continue
+        return (time.perf_counter() - started) * 1000, response.status_code
+    raise TimeoutError(f"no response from {url} after {timeout}s")
+
+
+def cold_start(env, headers, timeout):
+    import httpx
+
+    port = free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=REPO_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=timeout) as client:
+            ready_ms, _ = wait_for(client, "/metrics", {}, started, timeout)
+            first_query_ms, status_code = wait_for(client, "/users/?limit=1", headers, started, timeout)
+    finally:
+        server.terminate()
+        server.wait()
+    if status_code != 200:
+        raise RuntimeError(f"GET /users/ answered {status_code}")
+    return ready_ms, first_query_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--auto-init", action="store_true", help="start every run on an empty database with DB_AUTO_INIT")
+    parser.add_argument("--timeout", type=float, default=60.0, help="seconds to wait for a worker")
+    args = parser.parse_args()
+
+    database_dir = tempfile.mkdtemp()
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{database_dir}/cold_start.db")
+    from app.init_db import DEFAULT_ADMIN_USERNAME, init_database
+    from app.routers.auth import create_access_token
+
+    # the token is signed locally, so no login (and no bcrypt) is part of the measurement
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': DEFAULT_ADMIN_USERNAME})}"}
+    if not args.auto_init:
+        init_database()
+
+    ready, first_query = [], []
+    for run in range(args.runs):
+        env = {**os.environ, "PYTHONPATH": str(REPO_ROOT)}
+        if args.auto_init:
+            env.update(DATABASE_URL=f"sqlite:///{database_dir}/cold_start_{run}.db", DB_AUTO_INIT="true")
+        ready_ms, first_query_ms = cold_start(env, headers, args.timeout)
+        ready.append(ready_ms)
+        first_query.append(first_query_ms)
+        print(f"run {run + 1}: ready {ready_ms:7.0f}ms  first query {first_query_ms:7.0f}ms")
+
+    for name, samples in (("ready", ready), ("first query", first_query)):
+        print(
+            f"{name:>11}: median {statistics.median(samples):7.0f}ms  "
+            f"min {min(samples):7.0f}ms  p95 {percentile(samples, 95):7.0f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
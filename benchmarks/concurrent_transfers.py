@@ -0,0 +1,136 @@
+"""Concurrent transfer benchmark.
+
+Runs `POST /transactions/` transfers from a growing number of workers and reports
+throughput for two workloads:
+
+* unrelated: every worker moves its own asset back and forth between two users, so no two
+  requests touch the same row;
+* contended: every worker moves the same asset, so most writes lose the version check and
+  are retried or rejected with 409.
+
+Runs the app in process, by default against a throwaway SQLite database (set DATABASE_URL
+to benchmark PostgreSQL):
+
+    python -m benchmarks.concurrent_transfers --workers 1 2 4 8 --transfers 50
+
+SQLite admits one writer at a time, so unrelated transfers only scale there as far as the
+per-request work outside the write allows. On PostgreSQL the benchmark also samples
+pg_stat_activity and reports how many backends were waiting on a row lock. Unrelated
+transfers should show almost none, because they share no asset row, and the daily
+rollup rows they update are spread over ROLLUP_SLOTS slots. Run it with ROLLUP_SLOTS=1
+to see them queue on a single rollup row instead. The app runs in this one process, so
+with few CPUs throughput is bound by request handling rather than by the database.
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from collections import Counter
+
+from benchmarks.login_storm import percentile
+
+
+async def sample_lock_waits(samples, interval=0.01):
+    """Append the number of backends waiting on a lock, every `interval` seconds, until cancelled."""
+    from sqlalchemy import text
+    from app.database import async_engine
+
+    async with async_engine.connect() as connection:
+        while True:
+            samples.append(await connection.scalar(text(
+                "SELECT count(*) FROM pg_stat_activity WHERE wait_event_type = 'Lock' AND datname = current_database()"
+            )))
+            await connection.rollback()
+            await asyncio.sleep(interval)
+
+
+async def run_workload(client, headers, workers, transfers, asset_ids, user_ids, lock_waits=None):
+    statuses = Counter()
+    latencies = []
+
+    async def worker(index):
+        asset_id = asset_ids[index % len(asset_ids)]
+        for step in range(transfers):
+            # alternate between two receivers so a transfer is never to the current owner
+            to_user_id = user_ids[(index + step) % len(user_ids)]
+            started = time.perf_counter()
+            response = await client.post("/transactions/", headers=headers, json={
+                "asset_id": asset_id, "to_user_id": to_user_id, "type": "transfer"
+            })
+            latencies.append((time.perf_counter() - started) * 1000)
+            statuses[response.status_code] += 1
+
+    sampler = asyncio.create_task(sample_lock_waits(lock_waits)) if lock_waits is not None else None
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(index) for index in range(workers)))
+    elapsed = time.perf_counter() - started
+    if sampler is not None:
+        sampler.cancel()
+        await asyncio.gather(sampler, return_exceptions=True)
+    return elapsed, statuses, latencies
+
+
+async def run(app, worker_counts, transfers):
+    import httpx
+    from sqlalchemy import insert
+    from app.database import AsyncSessionLocal
+    from app.main import shutdown_event
+    from app.models import Asset, AssetType, User
+    from app.routers.transactions import version_conflicts
+
+    max_workers = max(worker_counts)
+    async with AsyncSessionLocal() as db:
+        sample_locks = db.get_bind().dialect.name == "postgresql"
+        # the password is never used, so skip hashing
+        user_ids = list((await db.scalars(insert(User).returning(User.id, sort_by_parameter_order=True), [
+            {"username": f"bench-{i}", "email": f"bench-{i}@example.com", "hashed_password": "x"} for i in range(2 * max_workers)
+        ])).all())
+        asset_ids = list((await db.scalars(insert(Asset).returning(Asset.id, sort_by_parameter_order=True), [
+            {"name": f"bench-asset-{i}", "type": AssetType.STOCK, "value": 100.0, "owner_id": 1} for i in range(max_workers)
+        ])).all())
+        await db.commit()
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+        token = (await client.post("/auth/", json={"username": "admin", "password": "12345678"})).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+
+        for workload in ("unrelated", "contended"):
+            for workers in worker_counts:
+                retried_before = version_conflicts.retried
+                lock_waits = [] if sample_locks else None
+                if workload == "unrelated":
+                    # worker i owns asset i and moves it between its own two users
+                    elapsed, statuses, latencies = await run_workload(
+                        client, headers, workers, transfers, asset_ids[:workers], user_ids[:2 * workers], lock_waits
+                    )
+                else:
+                    elapsed, statuses, latencies = await run_workload(
+                        client, headers, workers, transfers, asset_ids[:1], user_ids, lock_waits
+                    )
+                waiting = f" lock_waiters_avg={sum(lock_waits) / max(len(lock_waits), 1):.2f}" if sample_locks else ""
+                print(
+                    f"{workload:>9} workers={workers:<3} {statuses[201] / elapsed:7.1f} transfers/s "
+                    f"p50={percentile(latencies, 50):.1f}ms p99={percentile(latencies, 99):.1f}ms "
+                    f"retries={version_conflicts.retried - retried_before}{waiting} statuses={dict(statuses)}"
+                )
+    await shutdown_event()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8], help="concurrent workers to try")
+    parser.add_argument("--transfers", type=int, default=50, help="transfers per worker")
+    args = parser.parse_args()
+
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/transfers.db")
+    from app.init_db import init_database
+    from app.main import app
+
+    init_database()
+    asyncio.run(run(app, args.workers, args.transfers))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""Synthetic dataset generator.
+
+Fills the database at DATABASE_URL (SQLite or PostgreSQL) with users, assets and a
+transaction history, using multi-row bulk inserts:
+
+    python -m benchmarks.dataset --users 10000 --assets 50000 --transactions 500000
+
+The history is replayed in memory in time order, so it is internally consistent:
+
+* assets are owned by a Zipf-skewed set of users, and each asset is created after its owner;
+* transactions pick assets with a Zipf distribution, so a few assets change hands very often;
+* a sell sets the asset's value to its amount, and a transfer moves it at its current value;
+* assets are stored with their final owner, value and version.
+
+Rollups, asset history and portfolio checkpoints are rebuilt from the result, and the default
+admin is created if it is missing. Generated users log in with the password "password" (it
+is hashed once and shared). The same --seed always produces the same data. Running the generator again appends another dataset; the usernames
+continue from the largest user id.
+"""
+import argparse
+import asyncio
+import bisect
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+GENERATED_PASSWORD = "password"
+NAME_WORDS = [
+    "Alpha", "Atlas", "Aurora", "Beacon", "Birch", "Cobalt", "Crest", "Delta", "Ember", "Falcon",
+    "Granite", "Harbor", "Helix", "Horizon", "Iris", "Juniper", "Keystone", "Lumen", "Maple", "Meridian",
+    "Nimbus", "Nova", "Onyx", "Orchid", "Pioneer", "Quartz", "Redwood", "Sable", "Summit", "Vertex",
+]
+# share of each asset type and the median value of an asset of that type
+ASSET_TYPE_PROFILE = {"stock": (0.6, 2_000.0), "crypto": (0.3, 500.0), "real_estate": (0.1, 250_000.0)}
+
+
+def zipf_cum_weights(n, exponent):
+    """Cumulative weights for random.choices: rank k (0-based) has weight 1 / (k + 1) ** exponent."""
+    cum_weights, total = [], 0.0
+    for rank in range(1, n + 1):
+        total += rank ** -exponent
+        cum_weights.append(total)
+    return cum_weights
+
+
+def generate(rng, users, assets, transactions, days, exponent, now):
+    """Build the rows in memory. Asset and user references are 0-based indexes into the returned lists."""
+    start = now - timedelta(days=days)
+    span = (now - start).total_seconds()
+
+    user_rows = [{"created_at": start + timedelta(seconds=span * rng.random() ** 2)} for _ in range(users)]
+    user_rows.sort(key=lambda row: row["created_at"])
+    user_created = [row["created_at"] for row in user_rows]
+
+    # popular owners and popular assets are random ranks, not the lowest ids
+    owner_ranks = rng.sample(range(users), users)
+    owner_weights = zipf_cum_weights(users, exponent)
+    type_names = list(ASSET_TYPE_PROFILE)
+    type_weights = [share for share, _ in ASSET_TYPE_PROFILE.values()]
+    asset_rows = []
+    for i in range(assets):
+        owner = owner_ranks[rng.choices(range(users), cum_weights=owner_weights)[0]]
+        asset_type = rng.choices(type_names, weights=type_weights)[0]
+        owner_created = user_rows[owner]["created_at"]
+        created_at = owner_created + (now - owner_created) * rng.random()
+        value = round(ASSET_TYPE_PROFILE[asset_type][1] * rng.lognormvariate(0, 1), 2)
+        asset_rows.append({
+            "name": f"{rng.choice(NAME_WORDS)} {rng.choice(NAME_WORDS)} {i}",
+            "type": asset_type,
+            "owner": owner,
+            "created_at": created_at,
+            "initial_owner": owner,
+            "initial_value": value,
+            "value": value,
+            "version": 1,
+        })
+
+    asset_ranks = rng.sample(range(assets), assets)
+    asset_weights = zipf_cum_weights(assets, exponent)
+    # pick the assets first, then a time after each one was created, and replay in time order
+    picks = []
+    for rank in rng.choices(range(assets), cum_weights=asset_weights, k=transactions):
+        asset_index = asset_ranks[rank]
+        created_at = asset_rows[asset_index]["created_at"]
+        picks.append((created_at + (now - created_at) * rng.random(), asset_index))
+    picks.sort()
+    transaction_rows = []
+    for timestamp, asset_index in picks:
+        asset = asset_rows[asset_index]
+        # a receiver who has signed up by now, other than the current owner
+        existing_users = bisect.bisect_right(user_created, timestamp)
+        if existing_users < 2:
+            continue
+        to_owner = rng.randrange(existing_users - 1)
+        if to_owner >= asset["owner"]:
+            to_owner += 1
+        if rng.random() < 0.3:
+            transaction_type, amount = "sell", round(asset["value"] * rng.lognormvariate(0, 0.1), 2)
+        else:
+            transaction_type, amount = "transfer", asset["value"]
+        transaction_rows.append({
+            "amount": amount, "type": transaction_type, "asset": asset_index,
+            "from_owner": asset["owner"], "to_owner": to_owner, "timestamp": timestamp,
+        })
+        asset["owner"], asset["value"] = to_owner, amount
+        asset["version"] += 1
+    return user_rows, asset_rows, transaction_rows
+
+
+def insert_returning_ids(connection, model, rows, batch_size):
+    from sqlalchemy import insert
+
+    ids = []
+    for offset in range(0, len(rows), batch_size):
+        ids += connection.execute(
+            insert(model).returning(model.id, sort_by_parameter_order=True), rows[offset:offset + batch_size]
+        ).scalars().all()
+    return ids
+
+
+def write(connection, user_rows, asset_rows, transaction_rows, batch_size):
+    from sqlalchemy import func, select
+    from app.models import Asset, AssetHistory, AssetType, Transaction, TransactionType, User, UserRole
+    from app.routers.auth import get_password_hash
+
+    hashed_password = get_password_hash(GENERATED_PASSWORD)
+    first = (connection.scalar(select(func.max(User.id))) or 0) + 1
+    user_ids = insert_returning_ids(connection, User, [
+        {"username": f"user{first + i}", "email": f"user{first + i}@example.com", "hashed_password": hashed_password,
+         "role": UserRole.USER, "created_at": row["created_at"]}
+        for i, row in enumerate(user_rows)
+    ], batch_size)
+    asset_ids = insert_returning_ids(connection, Asset, [
+        {"name": row["name"], "type": AssetType(row["type"]), "value": row["value"], "owner_id": user_ids[row["owner"]],
+         "created_at": row["created_at"], "version": row["version"]}
+        for row in asset_rows
+    ], batch_size)
+    # the actor of a generated transaction is its sender
+    transaction_ids = insert_returning_ids(connection, Transaction, [
+        {"amount": row["amount"], "type": TransactionType(row["type"]), "user_id": user_ids[row["from_owner"]],
+         "asset_id": asset_ids[row["asset"]], "from_owner_id": user_ids[row["from_owner"]],
+         "to_owner_id": user_ids[row["to_owner"]], "timestamp": row["timestamp"]}
+        for row in transaction_rows
+    ], batch_size)
+
+    history = [
+        {"asset_id": asset_ids[i], "owner_id": user_ids[row["initial_owner"]], "previous_owner_id": None,
+         "value": row["initial_value"], "transaction_id": None, "recorded_at": row["created_at"]}
+        for i, row in enumerate(asset_rows)
+    ] + [
+        {"asset_id": asset_ids[row["asset"]], "owner_id": user_ids[row["to_owner"]],
+         "previous_owner_id": user_ids[row["from_owner"]], "value": row["amount"],
+         "transaction_id": transaction_id, "recorded_at": row["timestamp"]}
+        for transaction_id, row in zip(transaction_ids, transaction_rows)
+    ]
+    # asset_history ids must follow time order for as-of replays
+    history.sort(key=lambda row: row["recorded_at"])
+    for offset in range(0, len(history), batch_size):
+        connection.execute(AssetHistory.__table__.insert(), history[offset:offset + batch_size])
+
+
+async def checkpoint_portfolios():
+    from app.database import AsyncSessionLocal, async_engine
+    from app.portfolio import checkpoint_all_users
+
+    async with AsyncSessionLocal() as db:
+        await checkpoint_all_users(db)
+        await db.commit()
+    await async_engine.dispose()
+
+
+def build_dataset(users, assets, transactions, days=365, exponent=1.1, seed=42, batch_size=5000):
+    """Generate a dataset into the configured database; returns the number of rows of each kind."""
+    from app.archive import ensure_hot_partitions
+    from app.database import engine
+    from app.init_db import init_database
+    from app.rollups import rebuild_rollups
+
+    init_database()
+
+    rng = random.Random(seed)
+    user_rows, asset_rows, transaction_rows = generate(
+        rng, max(users, 2), max(assets, 1), transactions, days, exponent, datetime.utcnow()
+    )
+    with engine.begin() as connection:
+        if engine.dialect.name == "postgresql":
+            # bulk history would otherwise all land in the default partition
+            ensure_hot_partitions(connection, since=min((row["timestamp"] for row in transaction_rows), default=datetime.utcnow()).date())
+        write(connection, user_rows, asset_rows, transaction_rows, batch_size)
+        rebuild_rollups(connection)
+    asyncio.run(checkpoint_portfolios())
+    return {"users": len(user_rows), "assets": len(asset_rows), "transactions": len(transaction_rows)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--assets", type=int, default=5000)
+    parser.add_argument("--transactions", type=int, default=20000)
+    parser.add_argument("--days", type=int, default=365, help="length of the generated history")
+    parser.add_argument("--zipf", type=float, default=1.1, help="skew of asset popularity and ownership")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--batch-size", type=int, default=5000, help="rows per INSERT batch")
+    args = parser.parse_args()
+
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/dataset.db")
+    started = time.perf_counter()
+    counts = build_dataset(args.users, args.assets, args.transactions, args.days, args.zipf, args.seed, args.batch_size)
+    print(f"generated {counts} into {os.environ['DATABASE_URL']} in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Distribution analytics benchmark on the columnar snapshot.
+
+Fills an in-memory snapshot with synthetic columns (no database involved) and times
+`build_distributions`, the computation behind GET /analytics/distributions:
+
+    python -m benchmarks.distributions --assets 1000000 --transactions 5000000
+
+With --database it instead loads the snapshot from DATABASE_URL (see benchmarks.dataset) and
+also reports the full load and an incremental refresh.
+"""
+import argparse
+import asyncio
+import time
+from datetime import date
+
+import numpy as np
+
+
+def fill_synthetic(snapshot, assets, transactions, users, seed):
+    rng = np.random.default_rng(seed)
+    snapshot.assets.extend({
+        "id": np.arange(1, assets + 1),
+        "owner_id": (rng.zipf(1.3, assets) - 1) % users + 1,
+        "type": rng.integers(0, 3, assets),
+        "value": np.round(rng.lognormal(7, 2, assets), 2),
+        "created_at": np.datetime64("2024-01-01", "s") + rng.integers(0, 365 * 86400, assets),
+    })
+    snapshot.transactions.extend({
+        "id": np.arange(1, transactions + 1),
+        "asset_id": rng.integers(1, assets + 1, transactions),
+        "type": rng.integers(0, 2, transactions),
+        "amount": np.round(rng.lognormal(7, 2, transactions), 2),
+        "timestamp": np.sort(np.datetime64("2024-01-01", "s") + rng.integers(0, 365 * 86400, transactions)),
+    })
+
+
+def timed(func, iterations):
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    return min(samples), sorted(samples)[len(samples) // 2]
+
+
+async def load_from_database(snapshot):
+    from app.database import AsyncReadSessionLocal, async_engine
+
+    async with AsyncReadSessionLocal() as db:
+        started = time.perf_counter()
+        await snapshot.refresh(db)
+        print(f"full load: {len(snapshot.assets)} assets, {len(snapshot.transactions)} transactions "
+              f"in {time.perf_counter() - started:.2f}s")
+        started = time.perf_counter()
+        await snapshot.refresh(db)
+        print(f"incremental refresh with no new rows: {(time.perf_counter() - started) * 1000:.1f}ms")
+    await async_engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--assets", type=int, default=1_000_000)
+    parser.add_argument("--transactions", type=int, default=5_000_000)
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--database", action="store_true", help="load the snapshot from DATABASE_URL instead")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    from app.models import AssetType, TransactionType
+    from app.snapshot import AnalyticsSnapshot, build_distributions
+
+    snapshot = AnalyticsSnapshot()
+    if args.database:
+        asyncio.run(load_from_database(snapshot))
+    else:
+        fill_synthetic(snapshot, args.assets, args.transactions, args.users, args.seed)
+    size_mb = sum(column.values.nbytes for table in (snapshot.assets, snapshot.transactions)
+                  for column in table.columns.values()) / 2 ** 20
+    print(f"snapshot: {len(snapshot.assets)} assets, {len(snapshot.transactions)} transactions, {size_mb:.0f} MiB")
+
+    cases = {
+        "all rows": {},
+        "one asset type": {"asset_type": AssetType.CRYPTO},
+        "sells in a quarter": {"transaction_type": TransactionType.SELL,
+                               "start_date": date(2024, 4, 1), "end_date": date(2024, 6, 30)},
+    }
+    for name, filters in cases.items():
+        best, median = timed(lambda: build_distributions(snapshot, **filters), args.iterations)
+        print(f"{name:<20} min {best:7.1f}ms  median {median:7.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""Load test of every router at a fixed concurrency.
+
+Runs the app in process and, for each scenario, keeps --concurrency requests in flight for
+--duration seconds. Reports throughput, p50/p95/p99 latency and status codes, and saves
+them as JSON so runs on different commits can be compared:
+
+    python -m benchmarks.load_test --concurrency 16 --duration 10
+    python -m benchmarks.load_test --compare benchmarks/results/<older>.json
+
+Without DATABASE_URL it generates a dataset of --users/--assets/--transactions into a
+throwaway SQLite database (see benchmarks.dataset). With DATABASE_URL it runs against that
+database as is, so seed it first, or pass --generate. The read scenarios run first. The
+write scenarios come last because they change the data.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from benchmarks.dataset import GENERATED_PASSWORD, NAME_WORDS
+from benchmarks.login_storm import percentile
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+
+# each scenario returns (method, url, keyword arguments for the request)
+def login(ctx, rng):
+    username = rng.choice(ctx["usernames"])
+    return "POST", "/auth/", {"json": {"username": username, "password": GENERATED_PASSWORD}, "headers": {}}
+
+def list_users(ctx, rng):
+    return "GET", f"/users/?limit=50&page={rng.randint(1, 20)}", {}
+
+def user_portfolio(ctx, rng):
+    as_of = datetime.utcnow() - timedelta(days=rng.randint(0, 365))
+    return "GET", f"/users/{rng.choice(ctx['user_ids'])}/portfolio?as_of={as_of.isoformat()}", {}
+
+def list_assets(ctx, rng):
+    sort = rng.choice(["id", "-value", "created_at", "name"])
+    return "GET", f"/assets/?limit=50&sort={sort}", {}
+
+def filter_assets(ctx, rng):
+    asset_type = rng.choice(["stock", "crypto", "real_estate"])
+    return "GET", f"/assets/?type={asset_type}&min_value={rng.choice([0, 100, 1000, 10000])}&limit=50", {}
+
+def search_assets(ctx, rng):
+    return "GET", f"/assets/?q={rng.choice(NAME_WORDS).lower()}&limit=50", {}
+
+def platform_report(ctx, rng):
+    return "GET", "/reports/", {}
+
+def graphs(ctx, rng):
+    return "GET", rng.choice(["/analytics/graphs", "/analytics/graphs?granularity=day"]), {}
+
+def create_transaction(ctx, rng):
+    return "POST", "/transactions/", {"json": {
+        "asset_id": rng.choice(ctx["asset_ids"]), "to_user_id": rng.choice(ctx["user_ids"]), "type": "transfer"
+    }}
+
+def create_transaction_batch(ctx, rng):
+    items = [
+        {"asset_id": asset_id, "to_user_id": rng.choice(ctx["user_ids"]), "type": "transfer"}
+        for asset_id in rng.sample(ctx["asset_ids"], 20)
+    ]
+    return "POST", "/transactions/batch", {"json": {"atomic": False, "transactions": items}}
+
+
+SCENARIOS = {
+    "auth.login": login,
+    "users.list": list_users,
+    "users.portfolio": user_portfolio,
+    "assets.list": list_assets,
+    "assets.filter": filter_assets,
+    "assets.search": search_assets,
+    "reports.report": platform_report,
+    "analytics.graphs": graphs,
+    "transactions.create": create_transaction,
+    "transactions.batch": create_transaction_batch,
+}
+# expected refusals that are not failures: a transfer to the current owner, a lost version race
+EXPECTED_STATUSES = {"transactions.create": {400, 409}, "transactions.batch": {400, 409}}
+
+
+async def run_scenario(client, ctx, name, concurrency, duration, seed):
+    rng = random.Random(seed)
+    statuses = Counter()
+    latencies = []
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        while time.perf_counter() < deadline:
+            method, url, kwargs = SCENARIOS[name](ctx, rng)
+            kwargs = {**kwargs, "headers": kwargs.get("headers", ctx["headers"])}
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, url, **kwargs)
+                statuses[response.status_code] += 1
+            except Exception as e:
+                statuses[type(e).__name__] += 1
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    ok = sum(count for code, count in statuses.items()
+             if isinstance(code, int) and (code < 400 or code in EXPECTED_STATUSES.get(name, ())))
+    return {
+        "requests": len(latencies),
+        "errors": len(latencies) - ok,
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "mean_ms": round(sum(latencies) / len(latencies), 2) if latencies else 0.0,
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "statuses": {str(code): count for code, count in sorted(statuses.items(), key=str)},
+    }
+
+
+async def run(app, names, concurrency, duration, seed):
+    import httpx
+    from sqlalchemy import func, select
+    from app.database import AsyncSessionLocal
+    from app.main import shutdown_event
+    from app.models import Asset, Transaction, User
+
+    async with AsyncSessionLocal() as db:
+        ctx = {
+            "user_ids": (await db.scalars(select(User.id))).all(),
+            "usernames": (await db.scalars(select(User.username).where(User.username.like("user%")))).all(),
+            "asset_ids": (await db.scalars(select(Asset.id))).all(),
+        }
+        dataset = {
+            "users": len(ctx["user_ids"]),
+            "assets": len(ctx["asset_ids"]),
+            "transactions": await db.scalar(select(func.count(Transaction.id))),
+            "dialect": db.get_bind().dialect.name,
+        }
+    if not ctx["asset_ids"] or len(ctx["user_ids"]) < 2 or not ctx["usernames"]:
+        raise SystemExit("The database needs generated users and assets: run benchmarks.dataset or pass --generate")
+
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        token = (await client.post("/auth/", json={"username": "admin", "password": "12345678"})).json()["access_token"]
+        ctx["headers"] = {"Authorization": f"Bearer {token}"}
+        for name in names:
+            results[name] = await run_scenario(client, ctx, name, concurrency, duration, seed)
+            result = results[name]
+            print(
+                f"{name:<22} {result['throughput_rps']:8.1f} req/s  p50={result['p50_ms']:8.1f}ms "
+                f"p95={result['p95_ms']:8.1f}ms p99={result['p99_ms']:8.1f}ms  errors={result['errors']} "
+                f"statuses={result['statuses']}"
+            )
+    await shutdown_event()
+    return dataset, results
+
+
+def git_revision():
+    try:
+        revision = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return revision + ("-dirty" if dirty else "")
+
+
+def compare(baseline, current):
+    print(f"\ncompared with {baseline['meta']['revision']} ({baseline['meta']['started_at']}):")
+    for key in ("concurrency", "duration_seconds", "dataset", "cpus"):
+        if baseline["meta"].get(key) != current["meta"][key]:
+            print(f"  note: {key} differs ({baseline['meta'].get(key)} vs {current['meta'][key]})")
+    for name, result in current["scenarios"].items():
+        before = baseline["scenarios"].get(name)
+        if not before:
+            continue
+        changes = []
+        for metric in ("throughput_rps", "p50_ms", "p95_ms", "p99_ms"):
+            change = (result[metric] - before[metric]) / before[metric] * 100 if before[metric] else 0.0
+            changes.append(f"{metric}={before[metric]}->{result[metric]} ({change:+.0f}%)")
+        print(f"{name:<22} " + "  ".join(changes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=8, help="requests in flight per scenario")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per scenario")
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--users", type=int, default=1000, help="dataset size when one is generated")
+    parser.add_argument("--assets", type=int, default=5000)
+    parser.add_argument("--transactions", type=int, default=20000)
+    parser.add_argument("--generate", action="store_true", help="also generate a dataset into DATABASE_URL")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", type=Path, help="results file (default: benchmarks/results/<time>-<revision>.json)")
+    parser.add_argument("--compare", type=Path, help="earlier results file to compare with")
+    args = parser.parse_args()
+
+    generate = args.generate or "DATABASE_URL" not in os.environ
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/load_test.db")
+    if generate:
+        from benchmarks.dataset import build_dataset
+        print("generated", build_dataset(args.users, args.assets, args.transactions, seed=args.seed))
+    from app.init_db import init_database
+    from app.main import app
+
+    init_database()
+
+    started_at = datetime.utcnow().replace(microsecond=0)
+    # the scenarios keep SCENARIOS order: reads first, writes last
+    names = [name for name in SCENARIOS if name in args.scenarios]
+    dataset, results = asyncio.run(run(app, names, args.concurrency, args.duration, args.seed))
+    report = {
+        "meta": {
+            "revision": git_revision(),
+            "started_at": started_at.isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "concurrency": args.concurrency,
+            "duration_seconds": args.duration,
+            "seed": args.seed,
+            "dataset": dataset,
+        },
+        "scenarios": results,
+    }
+    output = args.output or RESULTS_DIR / f"{started_at:%Y%m%dT%H%M%S}-{report['meta']['revision']}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2) + "\n")
+    print(f"results saved to {output}")
+    if args.compare:
+        compare(json.loads(args.compare.read_text()), report)
+
+
+if __name__ == "__main__":
+    main()
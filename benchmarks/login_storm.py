@@ -0,0 +1,86 @@
+"""Login storm benchmark.
+
+Fires concurrent logins at ``POST /auth/`` while a probe keeps calling ``GET /assets/``,
+then reports login throughput and the probe's latency percentiles. Runs the app in
+process against a throwaway SQLite database:
+
+    python -m benchmarks.login_storm --logins 200 --concurrency 32
+
+Run it again with ``PASSWORD_HASH_WORKERS=0`` to compare with bcrypt running inline on
+the event loop.
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from collections import Counter
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def run(app, logins, concurrency):
+    import httpx
+    from app.main import shutdown_event
+
+    credentials = {"username": "admin", "password": "12345678"}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        token = (await client.post("/auth/", json=credentials)).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+
+        statuses = Counter()
+        probe_latencies = []
+        storm_done = asyncio.Event()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def login():
+            async with semaphore:
+                response = await client.post("/auth/", json=credentials)
+                statuses[response.status_code] += 1
+
+        async def probe():
+            while not storm_done.is_set():
+                started = time.perf_counter()
+                await client.get("/assets/?limit=1", headers=headers)
+                probe_latencies.append((time.perf_counter() - started) * 1000)
+                await asyncio.sleep(0.01)
+
+        probe_task = asyncio.create_task(probe())
+        started = time.perf_counter()
+        await asyncio.gather(*(login() for _ in range(logins)))
+        elapsed = time.perf_counter() - started
+        storm_done.set()
+        await probe_task
+    await shutdown_event()
+
+    print(f"logins: {logins} in {elapsed:.2f}s ({statuses[200] / elapsed:.1f} successful/s), statuses: {dict(statuses)}")
+    print(
+        f"probe GET /assets/: n={len(probe_latencies)} "
+        f"p50={percentile(probe_latencies, 50):.1f}ms p99={percentile(probe_latencies, 99):.1f}ms "
+        f"max={max(probe_latencies, default=0):.1f}ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=200, help="total number of login requests")
+    parser.add_argument("--concurrency", type=int, default=32, help="logins in flight at once")
+    args = parser.parse_args()
+
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+    from app.init_db import init_database
+    from app.main import app
+
+    init_database()
+    asyncio.run(run(app, args.logins, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
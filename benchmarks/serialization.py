@@ -0,0 +1,66 @@
+"""Microbenchmark: ORM + Pydantic list serialization vs the column-tuple + orjson fast path.
+
+Loads a page of assets both ways from a throwaway SQLite database and reports the time
+per page:
+
+    python -m benchmarks.serialization --rows 200 --iterations 300
+"""
+import argparse
+import os
+import tempfile
+import time
+
+
+def timed(func, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - started) / iterations * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200, help="assets per page")
+    parser.add_argument("--iterations", type=int, default=300)
+    args = parser.parse_args()
+
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/serialization.db")
+    import orjson
+    from sqlalchemy import insert, select
+    from app.database import Base, SessionLocal, engine
+    from app.models import Asset, AssetType, User
+    from app.routers.assets import ASSET_COLUMNS
+    from app.schemas import PaginatedAssetResponse
+
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        db.add(User(username="bench", email="bench@example.com", hashed_password="x"))
+        db.flush()
+        db.execute(insert(Asset), [
+            {"name": f"asset-{i}", "type": list(AssetType)[i % 3], "value": i * 1.5, "owner_id": 1}
+            for i in range(args.rows)
+        ])
+        db.commit()
+
+    page = {"total_count": args.rows, "page": 1, "limit": args.rows, "has_next_page": False, "has_previous_page": False, "next_cursor": None}
+
+    def orm_path():
+        with SessionLocal() as db:
+            assets = db.scalars(select(Asset).order_by(Asset.id).limit(args.rows)).all()
+            return PaginatedAssetResponse.model_validate({**page, "assets": assets}, from_attributes=True).model_dump_json()
+
+    def fast_path():
+        with SessionLocal() as db:
+            assets = [dict(row) for row in db.execute(select(*ASSET_COLUMNS).order_by(Asset.id).limit(args.rows)).mappings()]
+            return orjson.dumps({**page, "assets": assets})
+
+    assert orjson.loads(orm_path()) == orjson.loads(fast_path()), "both paths must produce the same JSON"
+    orm_ms = timed(orm_path, args.iterations)
+    fast_ms = timed(fast_path, args.iterations)
+    print(f"{args.rows} rows per page, {args.iterations} iterations")
+    print(f"ORM + Pydantic:   {orm_ms:.3f} ms/page")
+    print(f"columns + orjson: {fast_ms:.3f} ms/page ({orm_ms / fast_ms:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
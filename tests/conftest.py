@@ -0,0 +1,57 @@
+import os
+import tempfile
+import uuid
+
+import pytest
+
+# app modules read their configuration at import time, so point them at a throwaway database first
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/test.db"
+os.environ.pop("DATABASE_READ_URL", None)
+# hash passwords inline and run report jobs on threads: no worker processes to spawn
+os.environ["PASSWORD_HASH_WORKERS"] = "0"
+os.environ["REPORT_JOB_EXECUTOR"] = "thread"
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+    from app.init_db import init_database
+    from app.main import app
+
+    init_database()
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture(scope="session")
+def admin_headers():
+    from app.init_db import DEFAULT_ADMIN_USERNAME
+    from app.routers.auth import create_access_token
+
+    return {"Authorization": f"Bearer {create_access_token({'sub': DEFAULT_ADMIN_USERNAME})}"}
+
+
+@pytest.fixture
+def make_user(client, admin_headers):
+    """Creates a user with a unique name; returns its id."""
+    def make_user() -> int:
+        name = f"user-{uuid.uuid4().hex[:12]}"
+        response = client.post(
+            "/users/", json={"username": name, "email": f"{name}@example.com", "password": "secret"}, headers=admin_headers
+        )
+        assert response.status_code == 201, response.text
+        return response.json()["id"]
+    return make_user
+
+
+@pytest.fixture
+def make_asset(client, admin_headers):
+    """Creates an asset owned by `owner_id`; returns it as JSON."""
+    def make_asset(owner_id: int, value: float = 100.0, type: str = "stock") -> dict:
+        response = client.post(
+            "/assets/", json={"name": f"asset-{uuid.uuid4().hex[:12]}", "type": type, "value": value, "owner_id": owner_id},
+            headers=admin_headers,
+        )
+        assert response.status_code == 201, response.text
+        return response.json()
+    return make_asset
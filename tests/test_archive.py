@@ -0,0 +1,69 @@
+import csv
+import io
+from datetime import datetime, timedelta
+
+import pytest
+
+import app.archive
+from app.archive import MIN_HOT_DAYS, archive_transactions
+
+
+def _add_old_transactions(asset_id, from_owner_id, to_owner_id, days_ago):
+    from app.database import SessionLocal
+    from app.models import Transaction, TransactionType
+
+    with SessionLocal() as db:
+        transactions = [
+            Transaction(amount=float(days), type=TransactionType.TRANSFER, user_id=1, asset_id=asset_id,
+                        from_owner_id=from_owner_id, to_owner_id=to_owner_id,
+                        timestamp=datetime.utcnow() - timedelta(days=days))
+            for days in days_ago
+        ]
+        db.add_all(transactions)
+        db.commit()
+        return [transaction.id for transaction in transactions]
+
+
+def _export(client, admin_headers, owner_id):
+    response = client.get(f"/transactions/export?format=csv&owner_id={owner_id}", headers=admin_headers)
+    assert response.status_code == 200
+    return list(csv.reader(io.StringIO(response.text)))
+
+
+def _transfers_in_report(client, admin_headers, include_archived):
+    from app.routers.reports import transaction_summary_cache
+
+    # archiving runs outside the API and does not bump the data version the cache is keyed by
+    transaction_summary_cache.clear()
+    response = client.get(f"/reports/?include_archived={str(include_archived).lower()}", headers=admin_headers)
+    return response.json()["transaction_types_distribution"]["transfer"]
+
+
+def test_archived_transactions_are_still_exported_and_counted(client, admin_headers, make_user, make_asset, monkeypatch):
+    alice, bob = make_user(), make_user()
+    asset = make_asset(alice)
+    old_ids = _add_old_transactions(asset["id"], alice, bob, days_ago=[400, 200, 150])
+    recent = client.post("/transactions/", json={"asset_id": asset["id"], "to_user_id": bob, "type": "transfer"}, headers=admin_headers)
+    assert recent.status_code == 201
+
+    exported = _export(client, admin_headers, alice)
+    hot_transfers = _transfers_in_report(client, admin_headers, include_archived=False)
+
+    segments = archive_transactions(older_than_days=90)
+
+    assert sum(segment["row_count"] for segment in segments) == len(old_ids)
+    assert sum(segment["type_counts"].get("transfer", 0) for segment in segments) == len(old_ids)
+    # one batch per row, so the archive is read back in several chunks
+    monkeypatch.setattr(app.archive, "EXPORT_BATCH_SIZE", 1)
+    assert _export(client, admin_headers, alice) == exported
+    assert [int(row[0]) for row in exported[1:]] == old_ids + [recent.json()["id"]]
+    assert _transfers_in_report(client, admin_headers, include_archived=False) == hot_transfers - len(old_ids)
+    assert _transfers_in_report(client, admin_headers, include_archived=True) == hot_transfers
+
+    # nothing left to move
+    assert archive_transactions(older_than_days=90) == []
+
+
+def test_recent_days_cannot_be_archived():
+    with pytest.raises(ValueError):
+        archive_transactions(older_than_days=MIN_HOT_DAYS - 1)
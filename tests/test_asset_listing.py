@@ -0,0 +1,177 @@
+import base64
+import json
+import uuid
+
+import pytest
+
+import app.search
+
+
+def _create(client, admin_headers, owner_id, name, value=100.0, type="stock"):
+    response = client.post(
+        "/assets/", json={"name": name, "type": type, "value": value, "owner_id": owner_id}, headers=admin_headers
+    )
+    assert response.status_code == 201, response.text
+    return response.json()["id"]
+
+
+def _list(client, admin_headers, **params):
+    response = client.get("/assets/", params=params, headers=admin_headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def _walk(client, admin_headers, **params):
+    """Follow next_cursor from the first page to the last; returns every asset id in order."""
+    ids, body = [], _list(client, admin_headers, **params)
+    while True:
+        ids += [asset["id"] for asset in body["assets"]]
+        if not body["has_next_page"]:
+            return ids
+        assert body["next_cursor"]
+        body = _list(client, admin_headers, cursor=body["next_cursor"], **params)
+        assert body["page"] is None and body["has_previous_page"]
+
+
+def _cursor(payload) -> str:
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+
+@pytest.fixture
+def portfolio(client, admin_headers, make_user):
+    """A fresh owner with five assets; returns (owner_id, {name: (id, value, type)})."""
+    owner_id = make_user()
+    tag = uuid.uuid4().hex[:8]
+    assets = {}
+    for name, value, type in [("Bitcoin", 300.0, "crypto"), ("apple", 100.0, "stock"), ("Ether", 300.0, "crypto"),
+                              ("Beach house", 900.0, "real_estate"), ("banana", 50.0, "stock")]:
+        full_name = f"{name} {tag}"
+        assets[name] = (_create(client, admin_headers, owner_id, full_name, value, type), value, type)
+    return owner_id, assets
+
+
+def test_filters(client, admin_headers, portfolio):
+    owner_id, assets = portfolio
+
+    def ids(**params):
+        return {asset["id"] for asset in _list(client, admin_headers, owner_id=owner_id, **params)["assets"]}
+
+    assert ids() == {asset_id for asset_id, _, _ in assets.values()}
+    assert ids(type="crypto") == {assets["Bitcoin"][0], assets["Ether"][0]}
+    assert ids(min_value=100, max_value=300) == {assets[name][0] for name in ("Bitcoin", "apple", "Ether")}
+    assert ids(type="stock", max_value=99) == {assets["banana"][0]}
+    # name_prefix is case-sensitive
+    assert ids(name_prefix="B") == {assets["Bitcoin"][0], assets["Beach house"][0]}
+    assert ids(name_prefix="b") == {assets["banana"][0]}
+
+    body = _list(client, admin_headers, owner_id=owner_id, type="crypto")
+    assert body["total_count"] == 2
+    assert _list(client, admin_headers, owner_id=owner_id, include_total=False)["total_count"] is None
+
+
+def test_invalid_filter_ranges(client, admin_headers):
+    for params in ({"min_value": 10, "max_value": 5}, {"start_date": "2024-02-01", "end_date": "2024-01-01"}):
+        assert client.get("/assets/", params=params, headers=admin_headers).status_code == 400
+
+
+def test_date_filters(client, admin_headers, portfolio):
+    owner_id, assets = portfolio
+    assert len(_list(client, admin_headers, owner_id=owner_id, start_date="2000-01-01")["assets"]) == len(assets)
+    assert _list(client, admin_headers, owner_id=owner_id, end_date="2000-01-01")["assets"] == []
+
+
+@pytest.mark.parametrize("sort", ["id", "-id", "name", "-name", "value", "-value", "created_at", "-created_at"])
+def test_cursor_pages_follow_the_sort(client, admin_headers, portfolio, sort):
+    owner_id, _ = portfolio
+    everything = [asset for asset in _list(client, admin_headers, owner_id=owner_id, limit=200)["assets"]]
+    key = sort.lstrip("-")
+    descending = sort.startswith("-")
+    # ties on the sort column are broken by id, in the same direction
+    expected = sorted(everything, key=lambda asset: (asset[key], asset["id"]), reverse=descending)
+
+    assert _walk(client, admin_headers, owner_id=owner_id, sort=sort, limit=2) == [asset["id"] for asset in expected]
+
+
+def test_offset_pages(client, admin_headers, portfolio):
+    owner_id, _ = portfolio
+    first = _list(client, admin_headers, owner_id=owner_id, limit=3)
+    second = _list(client, admin_headers, owner_id=owner_id, limit=3, page=2)
+    assert (first["has_next_page"], second["has_next_page"], second["has_previous_page"]) == (True, False, True)
+    assert len(first["assets"]) + len(second["assets"]) == 5
+
+
+@pytest.mark.parametrize("sort, payload", [
+    ("value", [[1], 5]),
+    ("value", [{"a": 1}, 5]),
+    ("value", ["300", 5]),
+    ("value", [True, 5]),
+    ("name", [1, 5]),
+    ("name", [None, 5]),
+    ("created_at", ["yesterday", 5]),
+    ("created_at", [20240101, 5]),
+    ("name", ["apple", "5"]),
+    ("name", ["apple"]),
+])
+def test_tampered_sort_cursors_are_rejected(client, admin_headers, sort, payload):
+    response = client.get("/assets/", params={"sort": sort, "cursor": _cursor(payload)}, headers=admin_headers)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
+
+
+def test_tampered_id_cursor_is_rejected(client, admin_headers):
+    response = client.get("/assets/", params={"cursor": "not-a-cursor"}, headers=admin_headers)
+    assert response.status_code == 400
+
+
+def _search(client, admin_headers, owner_id, q):
+    return {asset["id"] for asset in _list(client, admin_headers, owner_id=owner_id, q=q)["assets"]}
+
+
+def test_name_search_uses_fts5(client, admin_headers, portfolio):
+    owner_id, assets = portfolio
+    assert _search(client, admin_headers, owner_id, "BITCOIN") == {assets["Bitcoin"][0]}
+    assert _search(client, admin_headers, owner_id, "ana") == {assets["banana"][0]}
+    assert _search(client, admin_headers, owner_id, "each hou") == {assets["Beach house"][0]}
+    assert _search(client, admin_headers, owner_id, "zzz") == set()
+    assert app.search._backends.get("sqlite") == "fts5"
+
+
+def test_name_search_follows_renames(client, admin_headers, portfolio):
+    owner_id, assets = portfolio
+    asset_id = assets["apple"][0]
+    from sqlalchemy import update
+    from app.database import engine
+    from app.models import Asset
+
+    # the triggers keep the FTS table in sync with writes made outside the API too
+    with engine.begin() as connection:
+        connection.execute(update(Asset).where(Asset.id == asset_id).values(name="Pear orchard"))
+    assert _search(client, admin_headers, owner_id, "orchard") == {asset_id}
+    assert _search(client, admin_headers, owner_id, "apple") == set()
+
+
+def test_name_search_falls_back_to_like(client, admin_headers, portfolio, monkeypatch):
+    owner_id, assets = portfolio
+    # short terms never use the trigram index
+    assert _search(client, admin_headers, owner_id, "et") == {assets["Ether"][0]}
+
+    monkeypatch.setitem(app.search._backends, "sqlite", None)
+    assert _search(client, admin_headers, owner_id, "BITCOIN") == {assets["Bitcoin"][0]}
+    # LIKE wildcards in the term match literally
+    assert _search(client, admin_headers, owner_id, "%") == set()
+    assert _search(client, admin_headers, owner_id, "b_nana") == set()
+
+
+def test_name_prefix_uses_a_pattern_index_on_postgresql():
+    from sqlalchemy.dialects import postgresql
+    from sqlalchemy.schema import CreateIndex
+    from app.models import Asset
+    from app.routers.assets import _asset_filters
+
+    (condition,) = _asset_filters(name_prefix="50%_off", dialect_name="postgresql")
+    compiled = condition.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True})
+    # LIKE metacharacters in the prefix are matched literally (% is doubled for the driver)
+    assert str(compiled) == "assets.name LIKE '50/%%/_off' || '%%' ESCAPE '/'"
+
+    (index,) = [index for index in Asset.__table__.indexes if index.name == "ix_assets_name_pattern"]
+    assert "text_pattern_ops" in str(CreateIndex(index).compile(dialect=postgresql.dialect()))
@@ -0,0 +1,98 @@
+import json
+import uuid
+
+import app.utils
+
+
+def _import(client, admin_headers, body, content_type="application/x-ndjson", **params):
+    response = client.post(
+        "/assets/bulk", content=body, params=params, headers={**admin_headers, "Content-Type": content_type}
+    )
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def _owned(client, admin_headers, owner_id):
+    response = client.get("/assets/", params={"owner_id": owner_id, "limit": 200}, headers=admin_headers)
+    return {asset["name"]: (asset["type"], asset["value"]) for asset in response.json()["assets"]}
+
+
+def test_ndjson_import_skips_bad_rows(client, admin_headers, make_user):
+    owner_id = make_user()
+    tag = uuid.uuid4().hex[:8]
+    lines = [
+        json.dumps({"name": f"gold-{tag}", "type": "stock", "value": 10.5, "owner_id": owner_id}),
+        "",
+        json.dumps({"name": f"coin-{tag}", "type": "crypto", "value": 3, "owner_id": owner_id}),
+        json.dumps({"name": f"orphan-{tag}", "type": "stock", "value": 1, "owner_id": 999999999}),
+        json.dumps({"name": f"bad-type-{tag}", "type": "bond", "value": 1, "owner_id": owner_id}),
+        "[1, 2]",
+        "{broken",
+        json.dumps({"name": f"flat-{tag}", "type": "real_estate", "value": 500, "owner_id": owner_id}),
+    ]
+    summary = _import(client, admin_headers, "\r\n".join(lines), chunk_size=2)
+
+    assert (summary["received"], summary["created"], summary["failed"]) == (7, 3, 4)
+    errors = {error["row"]: error["error"] for error in summary["errors"]}
+    assert set(errors) == {3, 4, 5, 6}
+    assert errors[3] == "User with id 999999999 not found"
+    assert errors[4].startswith("type:")
+    assert errors[5] == "each line must be a JSON object"
+    assert _owned(client, admin_headers, owner_id) == {
+        f"gold-{tag}": ("stock", 10.5), f"coin-{tag}": ("crypto", 3.0), f"flat-{tag}": ("real_estate", 500.0),
+    }
+
+
+def test_csv_import(client, admin_headers, make_user):
+    owner_id = make_user()
+    tag = uuid.uuid4().hex[:8]
+    body = (
+        "\ufeffname,type,value,owner_id\n"  # with the BOM spreadsheet exports add
+        f"\"Main St, {tag}\",real_estate,250000,{owner_id}\n"
+        f"short-{tag},stock\n"
+        f"fund-{tag},stock,12.5,{owner_id}"
+    )
+    summary = _import(client, admin_headers, body, content_type="text/csv")
+
+    assert (summary["received"], summary["created"], summary["failed"]) == (3, 2, 1)
+    assert summary["errors"] == [{"row": 2, "error": "expected 4 columns, got 2"}]
+    assert _owned(client, admin_headers, owner_id) == {
+        f"Main St, {tag}": ("real_estate", 250000.0), f"fund-{tag}": ("stock", 12.5),
+    }
+
+
+def test_reported_errors_are_capped(client, admin_headers, monkeypatch):
+    monkeypatch.setattr(app.utils, "BULK_MAX_REPORTED_ERRORS", 2)
+    summary = _import(client, admin_headers, "{broken\n" * 5)
+    assert (summary["received"], summary["created"], summary["failed"]) == (5, 0, 5)
+    assert [error["row"] for error in summary["errors"]] == [1, 2]
+
+
+def test_import_refreshes_the_cached_count(client, admin_headers, make_user):
+    owner_id = make_user()
+    before = client.get("/assets/", params={"limit": 1}, headers=admin_headers).json()["total_count"]
+    _import(client, admin_headers, "\n".join(
+        json.dumps({"name": f"n-{i}", "type": "stock", "value": i, "owner_id": owner_id}) for i in range(3)
+    ))
+    assert client.get("/assets/", params={"limit": 1}, headers=admin_headers).json()["total_count"] == before + 3
+
+
+def test_csv_quoted_fields_can_span_lines(client, admin_headers, make_user):
+    owner_id = make_user()
+    tag = uuid.uuid4().hex[:8]
+    body = (
+        "name,type,value,owner_id\r\n"
+        f"\"multi\r\n\r\nline {tag}\",stock,3,{owner_id}\r\n"
+        f"\"say \"\"hi\"\" {tag}\",crypto,4,{owner_id}\r\n"
+        f"5\"-inch {tag},stock,5,{owner_id}\r\n"
+        f"\"never closed {tag},stock,6,{owner_id}\n"
+        f"after-{tag},stock,7,{owner_id}\n"
+    )
+    summary = _import(client, admin_headers, body, content_type="text/csv")
+
+    assert (summary["received"], summary["created"], summary["failed"]) == (4, 3, 1)
+    # the unterminated field swallows the rest of the upload as one bad record
+    assert summary["errors"] == [{"row": 4, "error": "unexpected end of data"}]
+    assert _owned(client, admin_headers, owner_id) == {
+        f"multi\n\nline {tag}": ("stock", 3.0), f"say \"hi\" {tag}": ("crypto", 4.0), f"5\"-inch {tag}": ("stock", 5.0),
+    }
@@ -0,0 +1,71 @@
+import json
+import uuid
+
+
+def _ndjson(rows) -> str:
+    return "\n".join(row if isinstance(row, str) else json.dumps(row) for row in rows) + "\n"
+
+
+def _user(name, email=None, password="secret"):
+    return {"username": name, "email": email or f"{name}@example.com", "password": password}
+
+
+def _import(client, admin_headers, body, content_type="application/x-ndjson", **params):
+    response = client.post(
+        "/users/bulk", content=body, params=params, headers={**admin_headers, "Content-Type": content_type}
+    )
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_bulk_import_reports_duplicates_per_row(client, admin_headers):
+    tag = uuid.uuid4().hex[:8]
+    existing = client.post("/users/", json=_user(f"existing-{tag}"), headers=admin_headers).json()
+
+    summary = _import(client, admin_headers, _ndjson([
+        _user(f"a-{tag}", password="first password"),
+        _user(f"b-{tag}"),
+        _user(f"a-{tag}", email=f"other-{tag}@example.com"),   # username repeated in the upload
+        _user(f"c-{tag}", email=f"b-{tag}@example.com"),       # email repeated in the upload
+        _user(existing["username"], email=f"new-{tag}@example.com"),
+        _user(f"d-{tag}", email=existing["email"]),
+        {"username": f"e-{tag}", "email": "not an email", "password": "secret"},
+        "{not json",
+        _user(f"f-{tag}"),
+    ]), chunk_size=2)
+
+    assert (summary["received"], summary["created"], summary["failed"]) == (9, 3, 6)
+    errors = {error["row"]: error["error"] for error in summary["errors"]}
+    assert errors[3] == errors[5] == "Username already registered"
+    assert errors[4] == errors[6] == "Email already registered"
+    assert set(errors) == {3, 4, 5, 6, 7, 8}
+
+    # the imported users exist and their passwords were hashed
+    login = client.post("/auth/", json={"username": f"a-{tag}", "password": "first password"})
+    assert login.status_code == 200, login.text
+    assert client.post("/auth/", json={"username": f"a-{tag}", "password": "secret"}).status_code == 401
+    assert client.post("/auth/", json={"username": f"f-{tag}", "password": "secret"}).status_code == 200
+
+
+def test_bulk_import_rejects_users_created_by_an_earlier_upload(client, admin_headers):
+    tag = uuid.uuid4().hex[:8]
+    csv_body = f"username,email,password\nx-{tag},x-{tag}@example.com,secret\ny-{tag},y-{tag}@example.com,secret\n"
+
+    first = _import(client, admin_headers, csv_body, content_type="text/csv")
+    assert (first["received"], first["created"], first["failed"]) == (2, 2, 0)
+
+    second = _import(client, admin_headers, csv_body, content_type="text/csv")
+    assert (second["received"], second["created"], second["failed"]) == (2, 0, 2)
+    assert second["errors"] == [
+        {"row": 1, "error": "Username already registered"},
+        {"row": 2, "error": "Username already registered"},
+    ]
+
+
+def test_csv_quoted_fields_can_span_lines(client, admin_headers):
+    tag = uuid.uuid4().hex[:8]
+    body = f"username,email,password\nq-{tag},q-{tag}@example.com,\"two\nlines, \"\"quoted\"\"\"\nr-{tag},r-{tag}@example.com,plain\n"
+
+    summary = _import(client, admin_headers, body, content_type="text/csv")
+    assert (summary["received"], summary["created"], summary["failed"]) == (2, 2, 0)
+    assert client.post("/auth/", json={"username": f"q-{tag}", "password": 'two\nlines, "quoted"'}).status_code == 200
@@ -0,0 +1,98 @@
+import orjson
+import pytest
+from fastapi import FastAPI, Response
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.middleware import CompressionMiddleware, brotli
+
+BIG_BODY = orjson.dumps({"items": list(range(1000))})
+
+
+@pytest.fixture(scope="module")
+def middleware_client():
+    api = FastAPI()
+
+    @api.get("/assets/big")
+    def big():
+        return Response(BIG_BODY, media_type="application/json")
+
+    @api.get("/assets/small")
+    def small():
+        return {"ok": True}
+
+    @api.get("/reports/strong")
+    def strong():
+        return Response(BIG_BODY, media_type="application/json", headers={"ETag": '"report-v1"'})
+
+    @api.get("/assets/stream")
+    def stream():
+        return StreamingResponse(iter([b"a" * 2000, b"b" * 2000]), media_type="text/csv")
+
+    api.add_middleware(CompressionMiddleware, minimum_size=100)
+    return TestClient(api)
+
+
+def test_large_json_is_gzipped_with_a_weak_etag(middleware_client):
+    response = middleware_client.get("/assets/big", headers={"Accept-Encoding": "gzip"})
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.headers["etag"].startswith('W/"')
+    assert response.content == BIG_BODY
+
+
+def test_small_bodies_and_identity_requests_are_not_encoded(middleware_client):
+    assert "content-encoding" not in middleware_client.get("/assets/small", headers={"Accept-Encoding": "gzip"}).headers
+    response = middleware_client.get("/assets/big", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+    assert response.headers["vary"] == "Accept-Encoding"
+
+
+@pytest.mark.skipif(brotli is None, reason="the optional Brotli package is not installed")
+def test_brotli_is_preferred(middleware_client):
+    response = middleware_client.get("/assets/big", headers={"Accept-Encoding": "gzip, br"})
+    assert response.headers["content-encoding"] == "br"
+    assert response.content == BIG_BODY
+
+
+def test_matching_if_none_match_gets_304(middleware_client):
+    etag = middleware_client.get("/assets/big", headers={"Accept-Encoding": "gzip"}).headers["etag"]
+
+    response = middleware_client.get("/assets/big", headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+
+
+def test_a_strong_etag_is_weakened_only_when_the_body_is_encoded(middleware_client):
+    encoded = middleware_client.get("/reports/strong", headers={"Accept-Encoding": "gzip"})
+    identity = middleware_client.get("/reports/strong", headers={"Accept-Encoding": "identity"})
+
+    assert encoded.headers["etag"] == 'W/"report-v1"'
+    assert identity.headers["etag"] == '"report-v1"'
+    assert encoded.headers["vary"] == identity.headers["vary"] == "Accept-Encoding"
+
+
+def test_streaming_responses_pass_through(middleware_client):
+    response = middleware_client.get("/assets/stream", headers={"Accept-Encoding": "gzip"})
+
+    assert "content-encoding" not in response.headers
+    assert "etag" not in response.headers
+    assert response.content == b"a" * 2000 + b"b" * 2000
+
+
+def test_report_etag_and_304(client, admin_headers):
+    response = client.get("/reports/", headers={**admin_headers, "Accept-Encoding": "identity"})
+    etag = response.headers["etag"]
+    assert response.status_code == 200 and not etag.startswith("W/")
+
+    # the tag as sent, and the weak form a compressed response would have carried
+    for tag in (etag, f"W/{etag}"):
+        not_modified = client.get("/reports/", headers={**admin_headers, "If-None-Match": tag, "Accept-Encoding": "identity"})
+        assert not_modified.status_code == 304
+        assert not_modified.headers["etag"] == tag
+
+    changed = client.get("/reports/", headers={**admin_headers, "If-None-Match": '"stale"', "Accept-Encoding": "identity"})
+    assert changed.status_code == 200
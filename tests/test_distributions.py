@@ -0,0 +1,126 @@
+import asyncio
+
+import numpy as np
+import pytest
+from sqlalchemy import insert, select
+
+from app.snapshot import AnalyticsSnapshot, ColumnarTable, TRANSACTION_COLUMNS, analytics_snapshot, concentration, percentiles, summarize
+
+
+def _distributions(client, admin_headers, **params):
+    response = client.get("/analytics/distributions", params=params, headers=admin_headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def _snapshot_assets(snapshot, asset_ids):
+    positions = np.searchsorted(snapshot.assets["id"], asset_ids)
+    return {
+        int(asset_id): (int(snapshot.assets["owner_id"][position]), float(snapshot.assets["value"][position]))
+        for asset_id, position in zip(asset_ids, positions)
+        if position < len(snapshot.assets) and snapshot.assets["id"][position] == asset_id
+    }
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 10, 1001])
+def test_percentiles_match_numpy(size):
+    values = np.random.default_rng(size).lognormal(3, 2, size)
+    original = values.copy()
+    assert percentiles(values, [50, 90, 99]) == pytest.approx(np.percentile(values, [50, 90, 99]).tolist())
+    # the input is left alone
+    assert np.array_equal(values, original)
+
+
+def test_summaries():
+    assert summarize(np.array([]), 10, True)["mean"] is None
+    single = summarize(np.array([5.0, 5.0]), 10, True)
+    assert (single["min"], single["max"], single["histogram"]) == (5.0, 5.0, {"edges": [5.0, 5.0], "counts": [2]})
+
+    values = np.array([1.0, 10.0, 100.0, 1000.0])
+    log = summarize(values, 3, True)
+    assert log["histogram"] == {"edges": [1.0, 10.0, 100.0, 1000.0], "counts": [1, 1, 2]}
+    assert (log["count"], log["total"], log["mean"]) == (4, 1111.0, 277.75)
+    # zero or negative values cannot be log-spaced, so the edges fall back to linear
+    assert summarize(np.array([0.0, 10.0]), 2, True)["histogram"]["edges"] == [0.0, 5.0, 10.0]
+
+
+def test_concentration():
+    result = concentration(np.array([1, 2, 3, 3], dtype=np.int32), np.array([10.0, 30.0, 20.0, 40.0]), top=2)
+    assert (result["holders"], result["gini"], result["hhi"]) == (3, 0.3333, 0.46)
+    assert result["top_holders"] == [
+        {"owner_id": 3, "asset_count": 2, "total_value": 60.0, "share": 0.6},
+        {"owner_id": 2, "asset_count": 1, "total_value": 30.0, "share": 0.3},
+    ]
+    assert concentration(np.array([], dtype=np.int32), np.array([]), top=2)["gini"] is None
+
+
+def test_rows_arriving_below_the_max_id_are_kept_sorted():
+    table = ColumnarTable(TRANSACTION_COLUMNS)
+    row = {"asset_id": [1], "type": [0], "amount": [1.0], "timestamp": np.array(["2024-01-01"], dtype="datetime64[s]")}
+    for row_id in (1, 5, 3):
+        table.extend({"id": [row_id], **row})
+    assert table["id"].tolist() == [1, 3, 5]
+    assert table.ids_above(2).tolist() == [3, 5]
+
+
+def test_snapshot_follows_api_writes(client, admin_headers, make_user, make_asset):
+    alice, bob = make_user(), make_user()
+    kept, sold = make_asset(alice, 10.0), make_asset(alice, 20.0)
+    _distributions(client, admin_headers)
+    assert _snapshot_assets(analytics_snapshot, [kept["id"], sold["id"]]) == {kept["id"]: (alice, 10.0), sold["id"]: (alice, 20.0)}
+
+    client.post("/transactions/", json={"asset_id": kept["id"], "to_user_id": bob, "type": "transfer"}, headers=admin_headers)
+    client.post("/transactions/", json={"asset_id": sold["id"], "to_user_id": bob, "type": "sell", "amount": 25.0}, headers=admin_headers)
+    transactions_before = len(analytics_snapshot.transactions)
+    body = _distributions(client, admin_headers)
+
+    # the older assets named by the new transactions were re-read in place
+    assert _snapshot_assets(analytics_snapshot, [kept["id"], sold["id"]]) == {kept["id"]: (bob, 10.0), sold["id"]: (bob, 25.0)}
+    assert len(analytics_snapshot.transactions) == transactions_before + 2
+    assert body["snapshot"]["transactions"] == len(analytics_snapshot.transactions)
+    assert body["asset_value"]["count"] == body["snapshot"]["assets"] == len(analytics_snapshot.assets)
+    sells = _distributions(client, admin_headers, transaction_type="sell")["transaction_amount"]
+    assert sells["count"] >= 1 and sells["max"] >= 25.0
+
+
+def test_distribution_filters(client, admin_headers):
+    body = _distributions(client, admin_headers, asset_type="crypto", bins=4, scale="linear", top=3)
+    assert list(body["asset_value_by_type"]) == ["crypto"]
+    assert body["asset_value"]["count"] == body["asset_value_by_type"]["crypto"]["count"]
+    assert len(body["concentration"]["top_holders"]) <= 3
+    assert _distributions(client, admin_headers, start_date="1970-01-01", end_date="1970-01-02")["transaction_amount"]["count"] == 0
+    assert client.get("/analytics/distributions", params={"start_date": "2024-02-01", "end_date": "2024-01-01"},
+                      headers=admin_headers).status_code == 400
+
+
+def test_late_commits_below_the_watermark_are_picked_up(client, make_user):
+    from sqlalchemy import func
+    from sqlalchemy.ext.asyncio import AsyncSession
+    from app.database import SQLALCHEMY_DATABASE_URL, create_unpooled_async_engine, engine
+    from app.models import Asset
+
+    owner_id = make_user()
+    with engine.begin() as connection:
+        top_id = connection.scalar(select(func.max(Asset.id)))
+    row = {"name": "late", "type": "stock", "value": 1.0, "owner_id": owner_id}
+
+    def insert_asset(asset_id):
+        with engine.begin() as connection:
+            connection.execute(insert(Asset).values(id=asset_id, **row))
+
+    async def refresh(snapshot):
+        snapshot_engine = create_unpooled_async_engine(SQLALCHEMY_DATABASE_URL)
+        async with AsyncSession(snapshot_engine) as db:
+            await snapshot.refresh(db)
+        await snapshot_engine.dispose()
+
+    snapshot = AnalyticsSnapshot()
+    # the later id commits first...
+    insert_asset(top_id + 10)
+    asyncio.run(refresh(snapshot))
+    assert snapshot.assets.max_id == top_id + 10
+    # ...then the earlier one shows up below the watermark
+    insert_asset(top_id + 5)
+    asyncio.run(refresh(snapshot))
+    assert snapshot.assets["id"][-2:].tolist() == [top_id + 5, top_id + 10]
+    assert len(np.unique(snapshot.assets["id"])) == len(snapshot.assets)
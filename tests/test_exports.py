@@ -0,0 +1,71 @@
+import csv
+import gzip
+import io
+import json
+
+import app.utils
+
+
+def _transfer(client, admin_headers, asset_id, to_user_id):
+    response = client.post(
+        "/transactions/", json={"asset_id": asset_id, "to_user_id": to_user_id, "type": "transfer"}, headers=admin_headers
+    )
+    assert response.status_code == 201, response.text
+    return response.json()
+
+
+def test_transaction_export_csv(client, admin_headers, make_user, make_asset, monkeypatch):
+    # several batches per export
+    monkeypatch.setattr(app.utils, "EXPORT_BATCH_SIZE", 2)
+    alice, bob = make_user(), make_user()
+    assets = [make_asset(alice, value) for value in (10.0, 20.0, 30.0)]
+    transactions = [_transfer(client, admin_headers, asset["id"], bob) for asset in assets]
+
+    response = client.get(f"/transactions/export?format=csv&owner_id={bob}", headers=admin_headers)
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    assert 'filename="transactions.csv"' in response.headers["content-disposition"]
+    rows = list(csv.reader(io.StringIO(response.text)))
+    assert rows[0] == ["id", "amount", "type", "user_id", "asset_id", "from_owner_id", "to_owner_id", "timestamp"]
+    assert [(int(row[0]), row[2], int(row[4]), int(row[5]), int(row[6])) for row in rows[1:]] == [
+        (t["id"], "transfer", t["asset_id"], alice, bob) for t in transactions
+    ]
+
+
+def test_transaction_export_ndjson_and_gzip(client, admin_headers, make_user, make_asset):
+    alice, bob = make_user(), make_user()
+    transaction = _transfer(client, admin_headers, make_asset(alice, 42.0)["id"], bob)
+
+    response = client.get(f"/transactions/export?format=ndjson&owner_id={alice}", headers=admin_headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert len(lines) == 1
+    assert {key: lines[0][key] for key in ("id", "type", "from_owner_id", "to_owner_id", "amount")} == {
+        "id": transaction["id"], "type": "transfer", "from_owner_id": alice, "to_owner_id": bob, "amount": 42.0,
+    }
+
+    compressed = client.get(f"/transactions/export?format=ndjson&owner_id={alice}&gzip=true", headers=admin_headers)
+    assert compressed.status_code == 200
+    assert compressed.headers["content-type"] == "application/gzip"
+    assert gzip.decompress(compressed.content).decode() == response.text
+
+
+def test_asset_export_filters(client, admin_headers, make_user, make_asset):
+    owner = make_user()
+    stock, crypto = make_asset(owner, 5.0, "stock"), make_asset(owner, 7.0, "crypto")
+
+    response = client.get(f"/assets/export?format=csv&owner_id={owner}", headers=admin_headers)
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [(int(row["id"]), row["type"], float(row["value"])) for row in rows] == [
+        (stock["id"], "stock", 5.0), (crypto["id"], "crypto", 7.0),
+    ]
+
+    response = client.get(f"/assets/export?format=ndjson&owner_id={owner}&type=crypto", headers=admin_headers)
+    assert [json.loads(line)["id"] for line in response.text.splitlines()] == [crypto["id"]]
+
+
+def test_export_rejects_an_inverted_date_range(client, admin_headers):
+    response = client.get("/transactions/export?start_date=2024-02-01&end_date=2024-01-01", headers=admin_headers)
+    assert response.status_code == 400
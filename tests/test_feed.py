@@ -0,0 +1,106 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi import WebSocketDisconnect
+
+import app.feed
+from app.feed import Subscription, TransactionFeed, transaction_feed
+
+
+def _transfer(client, admin_headers, asset_id, to_user_id):
+    response = client.post("/transactions/", json={"asset_id": asset_id, "to_user_id": to_user_id, "type": "transfer"},
+                           headers=admin_headers)
+    assert response.status_code == 201, response.text
+    return response.json()
+
+
+def test_websocket_receives_committed_transactions(client, admin_headers, make_user, make_asset):
+    alice, bob = make_user(), make_user()
+    asset = make_asset(alice, 120.0)
+
+    with client.websocket_connect("/transactions/stream", headers=admin_headers) as websocket:
+        # a rejected transaction publishes nothing
+        assert client.post("/transactions/", json={"asset_id": asset["id"], "to_user_id": alice, "type": "transfer"},
+                           headers=admin_headers).status_code == 400
+        transaction = _transfer(client, admin_headers, asset["id"], bob)
+
+        first, second = websocket.receive_json(), websocket.receive_json()
+    assert first["event"] == "transaction"
+    assert first["data"]["id"] == transaction["id"]
+    assert (first["data"]["from_owner_id"], first["data"]["to_owner_id"], first["data"]["amount"]) == (alice, bob, 120.0)
+    assert second["event"] == "report_delta"
+    assert second["id"] == first["id"] + 1
+    assert second["data"]["recent_transactions"] == 1
+    assert second["data"]["transaction_volume"] == 120.0
+    assert second["data"]["transaction_types_distribution"] == {"transfer": 1}
+    # a transfer moves value between owners without changing the total
+    assert second["data"]["total_asset_value"] == 0.0
+
+
+def test_websocket_token_in_the_query_string(client, admin_headers):
+    token = admin_headers["Authorization"].split()[1]
+    with client.websocket_connect(f"/transactions/stream?token={token}"):
+        assert len(transaction_feed.subscribers) >= 1
+
+
+def test_websocket_needs_an_admin_token(client):
+    with pytest.raises(WebSocketDisconnect) as closed:
+        with client.websocket_connect("/transactions/stream?token=nonsense") as websocket:
+            websocket.receive_json()
+    assert closed.value.code == 1008
+
+
+def test_sse_framing(client, admin_headers, monkeypatch):
+    # a subscription with one event already queued, then dropped, so the stream ends by itself
+    subscription = Subscription(4)
+    subscription.queue.put_nowait({"id": 7, "event": "transaction", "data": {"id": 1, "amount": 2.5}})
+    subscription.queue.put_nowait(None)
+    monkeypatch.setattr(transaction_feed, "subscribe", lambda: subscription)
+
+    response = client.get("/transactions/stream", headers={**admin_headers, "Accept-Encoding": "identity"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert response.text == (
+        "retry: 3000\n\n"
+        'id: 7\nevent: transaction\ndata: {"id":1,"amount":2.5}\n\n'
+        'event: dropped\ndata: {"detail": "Client too slow, events were discarded"}\n\n'
+    )
+
+
+def test_slow_subscribers_are_dropped(monkeypatch):
+    monkeypatch.setattr(app.feed, "FEED_CLIENT_BUFFER", 2)
+
+    async def run():
+        feed = TransactionFeed()
+        slow, fast = feed.subscribe(), feed.subscribe()
+        feed.publish([{"event": "transaction", "data": 1}])
+        assert (await fast.get())["data"] == 1
+        feed.publish([{"event": "transaction", "data": 2}, {"event": "report_delta", "data": 3}])
+        # the slow one now needs a third slot
+        return feed, slow, fast, await slow.get(), [await fast.get(), await fast.get()]
+
+    feed, slow, fast, slow_item, fast_items = asyncio.run(run())
+    assert slow_item is None and slow.dropped and slow not in feed.subscribers
+    assert [item["data"] for item in fast_items] == [2, 3]
+    assert [item["id"] for item in fast_items] == [2, 3]
+    assert feed.dropped == 1
+
+
+def test_subscriber_limit_and_publishing_from_another_thread(monkeypatch):
+    monkeypatch.setattr(app.feed, "FEED_MAX_CLIENTS", 1)
+
+    async def run():
+        feed = TransactionFeed()
+        subscription = feed.subscribe()
+        assert feed.subscribe() is None
+        publisher = threading.Thread(target=feed.publish, args=([{"event": "transaction", "data": "from a thread"}],))
+        publisher.start()
+        item = await asyncio.wait_for(subscription.get(), 5)
+        publisher.join()
+        feed.unsubscribe(subscription)
+        return feed, item
+
+    feed, item = asyncio.run(run())
+    assert item["data"] == "from a thread"
+    assert not feed.subscribers
@@ -0,0 +1,97 @@
+from datetime import date
+
+import pytest
+from sqlalchemy import delete, insert
+
+from app.routers.analytics import bucket_start, count_buckets, next_bucket
+
+# rollup rows far before any data the other tests write; Jan 1st 1990 is a Monday
+DAYS = [date(1990, 1, 1), date(1990, 1, 3), date(1990, 1, 10), date(1990, 2, 15)]
+
+
+@pytest.fixture(scope="module")
+def seeded_rollups(client):
+    from app.database import engine
+    from app.models import DailyAssetStat, DailyTransactionStat, DailyUserStat
+
+    with engine.begin() as connection:
+        # two slots per day, as concurrent writers would leave them
+        connection.execute(insert(DailyUserStat), [
+            {"date": day, "slot": slot, "new_users": 1} for day in DAYS for slot in (0, 3)
+        ])
+        connection.execute(insert(DailyTransactionStat), [
+            {"date": day, "type": "sell", "slot": slot, "transaction_count": 1, "volume": 50.0} for day in DAYS for slot in (0, 3)
+        ])
+        connection.execute(insert(DailyAssetStat), [
+            {"date": DAYS[0], "type": "stock", "slot": 0, "asset_count": 2, "total_value": 30.0},
+            {"date": DAYS[1], "type": "crypto", "slot": 5, "asset_count": 1, "total_value": 12.5},
+        ])
+    yield
+    with engine.begin() as connection:
+        for model in (DailyUserStat, DailyTransactionStat, DailyAssetStat):
+            connection.execute(delete(model).where(model.date < date(1991, 1, 1)))
+
+
+def _graphs(client, admin_headers, **params):
+    response = client.get("/analytics/graphs", params={"start_date": "1990-01-01", "end_date": "1990-02-28", **params},
+                          headers=admin_headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_bucket_helpers():
+    assert bucket_start(date(2024, 1, 3), "week") == date(2024, 1, 1)
+    assert bucket_start(date(2024, 2, 29), "month") == date(2024, 2, 1)
+    assert next_bucket(date(2024, 1, 31), "day") == date(2024, 2, 1)
+    assert next_bucket(date(2023, 12, 1), "month") == date(2024, 1, 1)
+    assert next_bucket(date(2024, 12, 30), "week") == date(2025, 1, 6)
+    assert count_buckets(date(2023, 11, 15), date(2024, 2, 1), "month") == 4
+    assert count_buckets(date(2024, 1, 7), date(2024, 1, 8), "week") == 2
+    assert count_buckets(date(2024, 1, 1), date(2024, 12, 31), "day") == 366
+
+
+def test_daily_series_are_gap_filled(client, admin_headers, seeded_rollups):
+    body = _graphs(client, admin_headers, granularity="day")
+    assert body["granularity"] == "day"
+    dates = body["user_growth"]["dates"]
+    assert (len(dates), dates[0], dates[-1]) == (59, "1990-01-01", "1990-02-28")
+
+    counts = dict(zip(dates, body["user_growth"]["counts"]))
+    # the slots of a day are summed; days without rows are zero
+    assert counts["1990-01-01"] == counts["1990-02-15"] == 2
+    assert counts["1990-01-02"] == 0
+    assert sum(counts.values()) == 8
+    volumes = dict(zip(body["transaction_volume"]["dates"], body["transaction_volume"]["volumes"]))
+    assert (volumes["1990-01-03"], volumes["1990-01-04"]) == (100.0, 0.0)
+    sizes = dict(zip(body["average_transaction_size_by_date"]["dates"], body["average_transaction_size_by_date"]["avg_sizes"]))
+    assert (sizes["1990-01-10"], sizes["1990-01-11"]) == (50.0, 0.0)
+
+
+def test_weekly_and_monthly_buckets(client, admin_headers, seeded_rollups):
+    weekly = _graphs(client, admin_headers, granularity="week")
+    # Monday-based weeks; Feb 28th 1990 falls in the week starting Monday the 26th
+    assert weekly["user_growth"]["dates"][:3] == ["1990-01-01", "1990-01-08", "1990-01-15"]
+    assert weekly["user_growth"]["dates"][-1] == "1990-02-26"
+    assert dict(zip(weekly["user_growth"]["dates"], weekly["user_growth"]["counts"]))["1990-01-01"] == 4
+    assert dict(zip(weekly["user_growth"]["dates"], weekly["user_growth"]["counts"]))["1990-02-12"] == 2
+
+    monthly = _graphs(client, admin_headers, granularity="month")
+    assert monthly["user_growth"] == {"dates": ["1990-01-01", "1990-02-01"], "counts": [6, 2]}
+    assert monthly["transaction_volume"]["volumes"] == [300.0, 100.0]
+    assert monthly["total_asset_value_by_date"]["values"] == [42.5, 0.0]
+    distribution = dict(zip(monthly["asset_distribution"]["types"], monthly["asset_distribution"]["counts"]))
+    assert distribution == {"stock": 2, "crypto": 1}
+
+
+def test_auto_granularity_keeps_series_under_max_points(client, admin_headers, seeded_rollups):
+    assert _graphs(client, admin_headers)["granularity"] == "day"
+    assert _graphs(client, admin_headers, max_points=10)["granularity"] == "week"
+    body = _graphs(client, admin_headers, end_date="1999-12-31", max_points=200)
+    assert body["granularity"] == "month"
+    assert len(body["user_growth"]["dates"]) == 120
+
+
+def test_inverted_range(client, admin_headers):
+    response = client.get("/analytics/graphs", params={"start_date": "2024-02-01", "end_date": "2024-01-01"},
+                          headers=admin_headers)
+    assert response.status_code == 400
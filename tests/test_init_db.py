@@ -0,0 +1,106 @@
+import os
+import sqlite3
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+import app.init_db
+from app.init_db import schema_fingerprint
+
+ROOT = Path(__file__).resolve().parents[1]
+
+STARTUP = """
+import asyncio
+from app.database import async_engine
+import app.main
+from app.init_db import ensure_schema_current
+
+async def start():
+    try:
+        await ensure_schema_current()
+    finally:
+        await async_engine.dispose()
+
+asyncio.run(start())
+print("started")
+"""
+
+
+def _run(database, *args, **env):
+    """Run Python against a throwaway database in a fresh interpreter, where app modules read its URL."""
+    return subprocess.run(
+        [sys.executable, *args], cwd=ROOT, capture_output=True, text=True, timeout=120,
+        env={**os.environ, "DATABASE_URL": f"sqlite:///{database}", "DB_AUTO_INIT": "false", **env},
+    )
+
+
+def _tables(database):
+    with sqlite3.connect(database) as connection:
+        return {name for (name,) in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+
+@pytest.fixture
+def database(tmp_path):
+    return tmp_path / "init.db"
+
+
+def test_importing_the_app_runs_no_ddl_and_startup_refuses_an_uninitialized_database(database):
+    result = _run(database, "-c", STARTUP)
+    assert result.returncode != 0
+    assert "run `python -m app.init_db` first" in result.stderr
+    assert not ({"users", "assets", "transactions"} & _tables(database))
+
+
+def test_init_command_then_startup(database):
+    first = _run(database, "-m", "app.init_db")
+    assert first.returncode == 0, first.stderr
+    assert "Database schema initialized." in first.stdout
+    assert "Default admin user 'admin' created." in first.stdout
+    assert {"users", "assets", "transactions", "schema_revision", "assets_fts"} <= _tables(database)
+
+    again = _run(database, "-m", "app.init_db")
+    assert again.returncode == 0, again.stderr
+    assert "Database schema is current." in again.stdout
+    assert "created" not in again.stdout
+
+    started = _run(database, "-c", STARTUP)
+    assert started.returncode == 0, started.stderr
+    assert started.stdout.strip() == "started"
+
+
+def test_auto_init_at_startup(database):
+    started = _run(database, "-c", STARTUP, DB_AUTO_INIT="true")
+    assert started.returncode == 0, started.stderr
+    with sqlite3.connect(database) as connection:
+        assert connection.execute("SELECT username FROM users").fetchall() == [("admin",)]
+
+
+def test_an_older_schema_is_upgraded_in_place(database):
+    assert _run(database, "-m", "app.init_db", "--no-admin").returncode == 0
+    with sqlite3.connect(database) as connection:
+        connection.execute("DROP INDEX ix_assets_value")
+        connection.execute("ALTER TABLE assets DROP COLUMN version")
+        connection.execute("INSERT INTO schema_revision (revision, applied_at) VALUES ('older', CURRENT_TIMESTAMP)")
+
+    started = _run(database, "-c", STARTUP)
+    assert started.returncode != 0
+
+    upgraded = _run(database, "-m", "app.init_db", "--no-admin")
+    assert "Database schema initialized." in upgraded.stdout, upgraded.stderr
+    with sqlite3.connect(database) as connection:
+        assert "version" in {row[1] for row in connection.execute("PRAGMA table_info(assets)")}
+        assert connection.execute("SELECT 1 FROM sqlite_master WHERE name = 'ix_assets_value'").fetchone()
+        assert connection.execute("SELECT count(*) FROM users").fetchone() == (0,)
+
+
+def test_fingerprint_tracks_the_search_and_archive_ddl(monkeypatch):
+    fingerprint = schema_fingerprint()
+    assert schema_fingerprint() == fingerprint
+    monkeypatch.setattr(app.init_db, "SQLITE_FTS_DDL", app.init_db.SQLITE_FTS_DDL + ["CREATE INDEX extra ON assets (name)"])
+    assert schema_fingerprint() != fingerprint
+
+
+def test_the_test_database_is_current(client):
+    assert app.init_db.init_database(seed_admin=False) is False
@@ -0,0 +1,44 @@
+import re
+
+
+def _metric(client, admin_headers, name, method, route):
+    response = client.get("/metrics", headers=admin_headers)
+    assert response.status_code == 200, response.text
+    match = re.search(rf'^{name}{{method="{method}",route="{re.escape(route)}"}} (\S+)$', response.text, re.MULTILINE)
+    return float(match.group(1)) if match else None
+
+
+def test_metrics_needs_an_admin(client):
+    assert client.get("/metrics").status_code == 401
+
+
+def test_rows_written_counts_writes_only(client, admin_headers, make_user, make_asset):
+    alice, bob = make_user(), make_user()
+    asset = make_asset(alice)
+    before = _metric(client, admin_headers, "db_rows_written_total", "POST", "/transactions/") or 0
+
+    response = client.post("/transactions/", json={"asset_id": asset["id"], "to_user_id": bob, "type": "transfer"}, headers=admin_headers)
+    assert response.status_code == 201, response.text
+    # at least the asset update and the transaction insert
+    assert _metric(client, admin_headers, "db_rows_written_total", "POST", "/transactions/") >= before + 2
+
+    assert client.get("/assets/", params={"owner_id": bob}, headers=admin_headers).status_code == 200
+    assert _metric(client, admin_headers, "db_rows_written_total", "GET", "/assets/") == 0
+    assert _metric(client, admin_headers, "db_queries_total", "GET", "/assets/") > 0
+
+
+def test_rows_returned_counts_fetched_rows(client, admin_headers, make_user, make_asset):
+    owner = make_user()
+    for _ in range(3):
+        make_asset(owner)
+    before = _metric(client, admin_headers, "db_rows_returned_total", "GET", "/assets/") or 0
+
+    response = client.get("/assets/", params={"owner_id": owner, "limit": 2, "include_total": False}, headers=admin_headers)
+    assert response.status_code == 200, response.text
+    # limit + 1 rows are fetched to detect the next page
+    assert _metric(client, admin_headers, "db_rows_returned_total", "GET", "/assets/") == before + 3
+
+    before = _metric(client, admin_headers, "db_rows_returned_total", "GET", "/assets/export") or 0
+    response = client.get("/assets/export", params={"owner_id": owner}, headers=admin_headers)
+    assert response.status_code == 200, response.text
+    assert _metric(client, admin_headers, "db_rows_returned_total", "GET", "/assets/export") == before + 3
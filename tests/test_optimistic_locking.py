@@ -0,0 +1,86 @@
+from sqlalchemy import func, select, update
+
+import app.routers.transactions as transactions_router
+
+
+def _asset_row(asset_id):
+    from app.database import SessionLocal
+    from app.models import Asset, Transaction
+
+    with SessionLocal() as db:
+        asset = db.get(Asset, asset_id)
+        count = db.scalar(select(func.count(Transaction.id)).where(Transaction.asset_id == asset_id))
+        return asset.owner_id, asset.version, count
+
+
+def _concurrent_writer(monkeypatch, conflicts):
+    """Bump the asset's version behind the handler's back on the first `conflicts` attempts."""
+    from app.database import engine
+    from app.models import Asset
+
+    apply_transaction = transactions_router._apply_transaction
+    attempts = []
+
+    def apply_after_a_concurrent_write(transaction, asset, *args):
+        attempts.append(asset.version if asset else None)
+        if len(attempts) <= conflicts:
+            with engine.begin() as connection:
+                connection.execute(update(Asset).where(Asset.id == transaction.asset_id).values(version=Asset.version + 1))
+        return apply_transaction(transaction, asset, *args)
+
+    monkeypatch.setattr(transactions_router, "_apply_transaction", apply_after_a_concurrent_write)
+    monkeypatch.setattr(transactions_router, "TRANSACTION_RETRY_BACKOFF_SECONDS", 0)
+    return attempts
+
+
+def test_expected_version(client, admin_headers, make_user, make_asset):
+    alice, bob = make_user(), make_user()
+    asset = make_asset(alice)
+    assert asset["version"] == 1
+
+    stale = client.post("/transactions/", json={
+        "asset_id": asset["id"], "to_user_id": bob, "type": "transfer", "expected_version": 2,
+    }, headers=admin_headers)
+    assert stale.status_code == 409
+    assert _asset_row(asset["id"]) == (alice, 1, 0)
+
+    current = client.post("/transactions/", json={
+        "asset_id": asset["id"], "to_user_id": bob, "type": "transfer", "expected_version": 1,
+    }, headers=admin_headers)
+    assert current.status_code == 201, current.text
+    assert _asset_row(asset["id"]) == (bob, 2, 1)
+
+
+def test_a_conflict_is_retried_against_the_fresh_row(client, admin_headers, make_user, make_asset, monkeypatch):
+    alice, bob = make_user(), make_user()
+    asset = make_asset(alice)
+    conflicts = transactions_router.version_conflicts
+    retried, rejected = conflicts.retried, conflicts.rejected
+    attempts = _concurrent_writer(monkeypatch, conflicts=1)
+
+    response = client.post("/transactions/", json={"asset_id": asset["id"], "to_user_id": bob, "type": "transfer"}, headers=admin_headers)
+
+    assert response.status_code == 201, response.text
+    # the second attempt saw the version the concurrent write left
+    assert attempts == [1, 2]
+    assert _asset_row(asset["id"]) == (bob, 3, 1)
+    assert (conflicts.retried - retried, conflicts.rejected - rejected) == (1, 0)
+
+
+def test_persistent_conflicts_end_in_409(client, admin_headers, make_user, make_asset, monkeypatch):
+    alice, bob = make_user(), make_user()
+    asset = make_asset(alice)
+    conflicts = transactions_router.version_conflicts
+    retried, rejected = conflicts.retried, conflicts.rejected
+    attempts = _concurrent_writer(monkeypatch, conflicts=10**6)
+
+    response = client.post("/transactions/", json={"asset_id": asset["id"], "to_user_id": bob, "type": "transfer"}, headers=admin_headers)
+
+    assert response.status_code == 409
+    assert response.headers["retry-after"] == "1"
+    max_retries = transactions_router.TRANSACTION_MAX_RETRIES
+    assert len(attempts) == max_retries + 1
+    # only the attempts followed by another one count as retried
+    assert (conflicts.retried - retried, conflicts.rejected - rejected) == (max_retries, 1)
+    owner_id, _, transaction_count = _asset_row(asset["id"])
+    assert (owner_id, transaction_count) == (alice, 0)
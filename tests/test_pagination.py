@@ -0,0 +1,93 @@
+import time
+
+from sqlalchemy import delete, func, insert, select
+
+from app.utils import TTLCache, count_cache, decode_cursor, encode_cursor
+
+
+def _users_page(client, admin_headers, **params):
+    response = client.get("/users/", params=params, headers=admin_headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def _user_count():
+    from app.database import SessionLocal
+    from app.models import User
+
+    with SessionLocal() as db:
+        return db.scalar(select(func.count(User.id)))
+
+
+def test_cursor_pages_match_offset_pages(client, admin_headers, make_user):
+    for _ in range(5):
+        make_user()
+
+    by_cursor, body = [], _users_page(client, admin_headers, limit=3)
+    assert body["page"] == 1 and not body["has_previous_page"]
+    while True:
+        by_cursor += [user["id"] for user in body["users"]]
+        if not body["has_next_page"]:
+            assert body["next_cursor"] is None
+            break
+        body = _users_page(client, admin_headers, limit=3, cursor=body["next_cursor"])
+        assert body["page"] is None and body["has_previous_page"]
+
+    by_offset, page = [], 1
+    while True:
+        body = _users_page(client, admin_headers, limit=3, page=page)
+        by_offset += [user["id"] for user in body["users"]]
+        if not body["has_next_page"]:
+            break
+        page += 1
+
+    assert by_cursor == by_offset == sorted(by_cursor)
+    assert len(by_cursor) == _user_count()
+
+
+def test_total_count_is_cached_until_a_write_through_the_api(client, admin_headers, make_user):
+    from app.database import engine
+    from app.models import User
+
+    make_user()
+    total = _users_page(client, admin_headers, limit=1)["total_count"]
+    assert total == _user_count()
+
+    # a row written behind the API's back is not seen until the cached count expires...
+    raw_name = f"raw-{time.time_ns()}"
+    with engine.begin() as connection:
+        connection.execute(insert(User).values(username=raw_name, email=f"{raw_name}@example.com", hashed_password="x"))
+    try:
+        hits = count_cache.hits
+        assert _users_page(client, admin_headers, limit=1)["total_count"] == total
+        assert count_cache.hits == hits + 1
+
+        # ...while creating a user through the API drops it
+        make_user()
+        assert _users_page(client, admin_headers, limit=1)["total_count"] == total + 2
+    finally:
+        with engine.begin() as connection:
+            connection.execute(delete(User).where(User.username == raw_name))
+        count_cache.pop(User.__tablename__)
+    assert _users_page(client, admin_headers, limit=1, include_total=False)["total_count"] is None
+
+
+def test_cursors(client, admin_headers):
+    assert decode_cursor(encode_cursor(12345)) == 12345
+    for cursor in ("not-a-cursor", encode_cursor(1)[:-1] + "!", "bm90IGFuIGlk"):
+        assert client.get("/users/", params={"cursor": cursor}, headers=admin_headers).status_code == 400
+
+
+def test_ttl_cache_expires_and_evicts():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    # "b" is now the least recently used
+    cache.set("c", 3)
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == (1, None, 3)
+
+    cache.set("short", 4, ttl=0.01)
+    time.sleep(0.02)
+    assert cache.get("short", "gone") == "gone"
+    assert cache.stats()["size"] == 1
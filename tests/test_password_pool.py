@@ -0,0 +1,77 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi import HTTPException
+
+import app.routers.auth as auth
+
+
+@pytest.fixture
+def password_pool(monkeypatch):
+    """A fresh bcrypt pool of one worker admitting `max_pending` jobs; shut down afterwards."""
+    def password_pool(executor="thread", max_pending=1):
+        monkeypatch.setattr(auth, "PASSWORD_HASH_EXECUTOR", executor)
+        monkeypatch.setattr(auth, "PASSWORD_HASH_WORKERS", 1)
+        monkeypatch.setattr(auth, "PASSWORD_HASH_MAX_PENDING", max_pending)
+        monkeypatch.setattr(auth, "_password_executor", None)
+        return auth.get_password_executor()
+    yield password_pool
+    if auth._password_executor is not None:
+        auth._password_executor.shutdown(wait=True, cancel_futures=True)
+
+
+def test_hashing_runs_on_the_pool(password_pool):
+    password_pool()
+    thread_names = []
+
+    def hash_and_record(password):
+        thread_names.append(threading.current_thread().name)
+        return auth.get_password_hash(password)
+
+    hashed = asyncio.run(auth._run_password_job(hash_and_record, "secret"))
+    assert thread_names[0].startswith("bcrypt")
+    assert asyncio.run(auth.verify_password_async("secret", hashed))
+    assert not asyncio.run(auth.verify_password_async("wrong", hashed))
+
+
+def test_jobs_beyond_the_limit_are_rejected(password_pool):
+    password_pool(max_pending=1)
+    started, release = threading.Event(), threading.Event()
+
+    def slow_job():
+        started.set()
+        release.wait(5)
+        return "done"
+
+    async def two_jobs():
+        first = asyncio.ensure_future(auth._run_password_job(slow_job))
+        await asyncio.get_running_loop().run_in_executor(None, started.wait, 5)
+        with pytest.raises(HTTPException) as rejected:
+            await auth._run_password_job(slow_job)
+        release.set()
+        return rejected.value, await first
+
+    rejected, first_result = asyncio.run(two_jobs())
+    assert (rejected.status_code, rejected.headers["Retry-After"]) == (503, "1")
+    assert first_result == "done"
+    # the slot is released once the job finishes
+    assert auth._pending_password_jobs == 0
+
+
+def test_a_saturated_pool_answers_logins_with_503(client, password_pool, monkeypatch):
+    from app.init_db import DEFAULT_ADMIN_USERNAME
+
+    password_pool(max_pending=1)
+    monkeypatch.setattr(auth, "_pending_password_jobs", 1)
+
+    response = client.post("/auth/", json={"username": DEFAULT_ADMIN_USERNAME, "password": "whatever"})
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+
+
+def test_process_workers_hash(password_pool):
+    # spawned workers import this module afresh and hash with the same settings
+    password_pool(executor="process")
+    hashed = asyncio.run(auth.get_password_hash_async("secret"))
+    assert auth.verify_password("secret", hashed)
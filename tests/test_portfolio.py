@@ -0,0 +1,161 @@
+from datetime import datetime
+
+from sqlalchemy import func, select
+
+import app.portfolio
+
+
+def _holdings(client, admin_headers, user_id, as_of=None):
+    params = {"as_of": as_of.isoformat()} if as_of else {}
+    response = client.get(f"/users/{user_id}/portfolio", params=params, headers=admin_headers)
+    assert response.status_code == 200, response.text
+    body = response.json()
+    return {holding["asset_id"]: holding["value"] for holding in body["holdings"]}, body["total_value"]
+
+
+def _checkpoints(user_id):
+    from app.database import SessionLocal
+    from app.models import AssetHistory, PortfolioCheckpoint
+
+    with SessionLocal() as db:
+        checkpoints = db.execute(
+            select(PortfolioCheckpoint.history_id, PortfolioCheckpoint.holdings)
+            .where(PortfolioCheckpoint.user_id == user_id).order_by(PortfolioCheckpoint.id)
+        ).all()
+        history = db.execute(
+            select(AssetHistory.id, AssetHistory.asset_id).where(AssetHistory.owner_id == user_id).order_by(AssetHistory.id)
+        ).all()
+    return checkpoints, history
+
+
+def test_portfolio_as_of_replays_sells_and_transfers(client, admin_headers, make_user, make_asset):
+    alice, bob = make_user(), make_user()
+    kept, sold = make_asset(alice, 100.0), make_asset(alice, 200.0)
+    before = datetime.utcnow()
+
+    client.post("/transactions/", json={"asset_id": kept["id"], "to_user_id": bob, "type": "transfer"}, headers=admin_headers)
+    client.post("/transactions/", json={"asset_id": sold["id"], "to_user_id": bob, "type": "sell", "amount": 250.0}, headers=admin_headers)
+
+    assert _holdings(client, admin_headers, alice, before) == ({kept["id"]: 100.0, sold["id"]: 200.0}, 300.0)
+    assert _holdings(client, admin_headers, bob, before) == ({}, 0.0)
+    assert _holdings(client, admin_headers, alice) == ({}, 0.0)
+    assert _holdings(client, admin_headers, bob) == ({kept["id"]: 100.0, sold["id"]: 250.0}, 350.0)
+
+
+def test_checkpoints_cover_the_history_their_transaction_wrote(client, admin_headers, make_user, make_asset, monkeypatch):
+    monkeypatch.setattr(app.portfolio, "PORTFOLIO_CHECKPOINT_INTERVAL", 2)
+    alice, bob = make_user(), make_user()
+    first = make_asset(alice, 10.0)
+    second = make_asset(alice, 20.0)
+    between = datetime.utcnow()
+    client.post("/transactions/", json={"asset_id": first["id"], "to_user_id": bob, "type": "transfer"}, headers=admin_headers)
+    third = make_asset(alice, 30.0)
+
+    checkpoints, history = _checkpoints(alice)
+    # the second creation made the checkpoint, at the row it inserted
+    assert checkpoints[0] == (history[1].id, [[first["id"], 10.0], [second["id"], 20.0]])
+    # 2 more rows since: the transfer away and the third asset
+    assert len(checkpoints) == 2 and checkpoints[1].holdings == [[second["id"], 20.0], [third["id"], 30.0]]
+
+    assert _holdings(client, admin_headers, alice, between) == ({first["id"]: 10.0, second["id"]: 20.0}, 30.0)
+    assert _holdings(client, admin_headers, alice) == ({second["id"]: 20.0, third["id"]: 30.0}, 50.0)
+    assert _holdings(client, admin_headers, bob) == ({first["id"]: 10.0}, 10.0)
+
+
+def test_portfolio_of_an_unknown_user(client, admin_headers):
+    assert client.get("/users/999999999/portfolio", headers=admin_headers).status_code == 404
+
+
+def _create_asset_in_own_session(owner_id, value, created, release=None):
+    """Insert an asset and its history on a separate connection; hold the transaction open until `release` is set."""
+    import asyncio
+    from app.database import SQLALCHEMY_DATABASE_URL, create_unpooled_async_engine
+    from app.models import Asset
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+    async def create():
+        session_engine = create_unpooled_async_engine(SQLALCHEMY_DATABASE_URL)
+        async with AsyncSession(session_engine, expire_on_commit=False) as db:
+            asset = Asset(name=f"interleaved-{value}", type="stock", value=value, owner_id=owner_id)
+            db.add(asset)
+            await db.flush()
+            await app.portfolio.record_asset_creations(db, [(asset.id, owner_id, value, asset.created_at)])
+            created.append(asset.id)
+            if release is not None:
+                release.wait(5)
+            await db.commit()
+        await session_engine.dispose()
+
+    asyncio.run(create())
+
+
+def test_a_checkpoint_waits_for_history_still_being_written(client, admin_headers, make_user, monkeypatch):
+    import threading
+    import time
+
+    monkeypatch.setattr(app.portfolio, "PORTFOLIO_CHECKPOINT_INTERVAL", 1)
+    alice = make_user()
+    first, second, release = [], [], threading.Event()
+
+    holder = threading.Thread(target=_create_asset_in_own_session, args=(alice, 10.0, first, release))
+    holder.start()
+    for _ in range(500):
+        if first:
+            break
+        time.sleep(0.01)
+    assert first, "the first writer never inserted its history"
+
+    # a second writer for the same user has to wait for the first to commit before checkpointing
+    writer = threading.Thread(target=_create_asset_in_own_session, args=(alice, 20.0, second))
+    writer.start()
+    time.sleep(0.2)
+    assert not second
+    release.set()
+    holder.join(10)
+    writer.join(10)
+    assert second
+
+    checkpoints, history = _checkpoints(alice)
+    assert [row.asset_id for row in history] == [first[0], second[0]]
+    assert checkpoints[-1] == (history[-1].id, [[first[0], 10.0], [second[0], 20.0]])
+    assert _holdings(client, admin_headers, alice) == ({first[0]: 10.0, second[0]: 20.0}, 30.0)
+
+
+def test_a_lookup_scans_one_checkpoint_interval(client, admin_headers, make_user, make_asset, monkeypatch):
+    from sqlalchemy import event
+    from app.database import SessionLocal, async_engine, async_read_engine
+    from app.models import AssetHistory
+
+    monkeypatch.setattr(app.portfolio, "PORTFOLIO_CHECKPOINT_INTERVAL", 3)
+    alice = make_user()
+    assets = [make_asset(alice, 10.0 * (i + 1)) for i in range(4)]
+    as_of = datetime.utcnow()
+    assets += [make_asset(alice, 10.0 * (i + 1)) for i in range(4, 10)]
+    checkpoints, _ = _checkpoints(alice)
+    assert len(checkpoints) == 3
+
+    scans = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if "FROM asset_history" in statement and "portfolio_checkpoints" not in statement:
+            scans.append(parameters)
+
+    engines = {async_engine.sync_engine, async_read_engine.sync_engine}
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", capture)
+    try:
+        holdings, _ = _holdings(client, admin_headers, alice, as_of)
+    finally:
+        for engine in engines:
+            event.remove(engine, "before_cursor_execute", capture)
+
+    assert holdings == {asset["id"]: asset["value"] for asset in assets[:4]}
+    # the scan runs from the checkpoint before as_of to the one after it
+    (parameters,) = scans
+    low, high = parameters[-2:]
+    assert (low, high) == (checkpoints[0].history_id, checkpoints[1].history_id)
+    with SessionLocal() as db:
+        scanned = db.scalar(select(func.count()).where(
+            AssetHistory.owner_id == alice, AssetHistory.id > low, AssetHistory.id <= high
+        ))
+    assert scanned <= app.portfolio.PORTFOLIO_CHECKPOINT_INTERVAL
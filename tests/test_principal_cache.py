@@ -0,0 +1,128 @@
+from sqlalchemy import update
+
+from app.routers.auth import create_access_token, principal_cache
+from app.utils import encode_cursor
+
+
+def _headers(username):
+    return {"Authorization": f"Bearer {create_access_token({'sub': username})}"}
+
+
+def _edit_user(user_id, **values):
+    """Change a user through an ORM session, as the app does, so the mapper events fire."""
+    from app.database import SessionLocal
+    from app.models import User
+
+    with SessionLocal() as db:
+        user = db.get(User, user_id)
+        for name, value in values.items():
+            setattr(user, name, value)
+        db.commit()
+
+
+def _delete_user(user_id):
+    from app.database import SessionLocal
+    from app.models import User
+
+    with SessionLocal() as db:
+        db.delete(db.get(User, user_id))
+        db.commit()
+
+
+def _username(client, admin_headers, user_id):
+    # the page that starts right after user_id - 1
+    body = client.get("/users/", params={"cursor": encode_cursor(user_id - 1), "limit": 1}, headers=admin_headers).json()
+    return body["users"][0]["username"]
+
+
+def test_principals_are_cached(client, admin_headers, make_user):
+    username = _username(client, admin_headers, make_user())
+    headers = _headers(username)
+
+    misses = principal_cache.misses
+    assert client.get("/auth/cache-stats", headers=headers).status_code == 403
+    hits = principal_cache.hits
+    assert client.get("/auth/cache-stats", headers=headers).status_code == 403
+    assert client.get("/auth/cache-stats", headers=headers).status_code == 403
+    assert principal_cache.hits == hits + 2
+    assert principal_cache.misses == misses + 1
+
+
+def test_a_role_change_takes_effect_immediately(client, admin_headers, make_user):
+    from app.models import UserRole
+
+    user_id = make_user()
+    headers = _headers(_username(client, admin_headers, user_id))
+    assert client.get("/auth/cache-stats", headers=headers).status_code == 403
+
+    _edit_user(user_id, role=UserRole.ADMIN)
+    assert client.get("/auth/cache-stats", headers=headers).status_code == 200
+
+    _edit_user(user_id, role=UserRole.USER)
+    assert client.get("/auth/cache-stats", headers=headers).status_code == 403
+
+
+def test_renamed_and_deleted_users_lose_access(client, admin_headers, make_user):
+    from app.models import UserRole
+
+    user_id = make_user()
+    username = _username(client, admin_headers, user_id)
+    _edit_user(user_id, role=UserRole.ADMIN)
+    assert client.get("/auth/cache-stats", headers=_headers(username)).status_code == 200
+
+    # the old name's cache entry goes with the rename
+    _edit_user(user_id, username=f"{username}-renamed")
+    assert client.get("/auth/cache-stats", headers=_headers(username)).status_code == 401
+    assert client.get("/auth/cache-stats", headers=_headers(f"{username}-renamed")).status_code == 200
+
+    _delete_user(user_id)
+    assert client.get("/auth/cache-stats", headers=_headers(f"{username}-renamed")).status_code == 401
+
+
+def test_writes_outside_the_orm_wait_for_the_ttl(client, admin_headers, make_user, monkeypatch):
+    import time
+    from app.database import engine
+    from app.models import User, UserRole
+
+    monkeypatch.setattr(principal_cache, "ttl", 0.2)
+    user_id = make_user()
+    headers = _headers(_username(client, admin_headers, user_id))
+    assert client.get("/auth/cache-stats", headers=headers).status_code == 403
+
+    with engine.begin() as connection:
+        connection.execute(update(User).where(User.id == user_id).values(role=UserRole.ADMIN))
+    assert client.get("/auth/cache-stats", headers=headers).status_code == 403
+
+    time.sleep(0.25)
+    assert client.get("/auth/cache-stats", headers=headers).status_code == 200
+
+
+def test_a_principal_cached_before_the_commit_is_evicted_by_it(client, admin_headers, make_user):
+    from app.database import SessionLocal
+    from app.models import User, UserRole
+
+    user_id = make_user()
+    headers = _headers(_username(client, admin_headers, user_id))
+    with SessionLocal() as db:
+        db.get(User, user_id).role = UserRole.ADMIN
+        db.flush()
+        # the change is not committed yet, so this caches the old role again
+        assert client.get("/auth/cache-stats", headers=headers).status_code == 403
+        db.commit()
+    assert client.get("/auth/cache-stats", headers=headers).status_code == 200
+
+
+def test_a_rolled_back_change_keeps_the_cached_principal(client, admin_headers, make_user):
+    from app.database import SessionLocal
+    from app.models import User, UserRole
+
+    user_id = make_user()
+    username = _username(client, admin_headers, user_id)
+    assert client.get("/auth/cache-stats", headers=_headers(username)).status_code == 403
+    with SessionLocal() as db:
+        db.get(User, user_id).role = UserRole.ADMIN
+        db.flush()
+        db.rollback()
+        assert "changed_principals" not in db.info
+    assert principal_cache.get(username) is not None
+    assert client.get("/auth/cache-stats", headers=_headers(username)).status_code == 403
@@ -0,0 +1,83 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+from sqlalchemy import func, select
+
+from app.models import (
+    User, Asset, AssetType, Transaction, TransactionType, AssetHistory, PortfolioCheckpoint,
+    DailyUserStat, DailyAssetStat, DailyTransactionStat,
+)
+from app.routers.assets import _asset_filters
+from app.utils import date_range_filters
+
+JANUARY = (date(2024, 1, 1), date(2024, 1, 31))
+WEEK_AGO = datetime.utcnow() - timedelta(days=7)
+
+# (query, index its SQLite plan must search)
+PLANS = {
+    # /analytics/graphs: rollup rows in a date range, by their (date, ...) primary keys
+    "new users by day": (
+        select(DailyUserStat.date, DailyUserStat.new_users).where(*date_range_filters(DailyUserStat.date, *JANUARY)),
+        "sqlite_autoindex_daily_user_stats_1"),
+    "asset value by day": (
+        select(DailyAssetStat.date, DailyAssetStat.total_value).where(*date_range_filters(DailyAssetStat.date, *JANUARY)),
+        "sqlite_autoindex_daily_asset_stats_1"),
+    "transaction volume by day": (
+        select(DailyTransactionStat.date, DailyTransactionStat.volume)
+        .where(*date_range_filters(DailyTransactionStat.date, *JANUARY)),
+        "sqlite_autoindex_daily_transaction_stats_1"),
+    # /reports/platform
+    "recent transactions": (
+        select(func.count(Transaction.id)).where(Transaction.timestamp >= WEEK_AGO), "ix_transactions_timestamp_type"),
+    "transactions in a date range by type": (
+        select(Transaction.id).where(*date_range_filters(Transaction.timestamp, *JANUARY), Transaction.type == TransactionType.SELL),
+        "ix_transactions_timestamp_type"),
+    "most valuable asset": (select(Asset).order_by(Asset.value.desc()).limit(1), "ix_assets_value"),
+    "asset type distribution": (
+        select(Asset.type, func.count(Asset.id), func.sum(Asset.value)).group_by(Asset.type), "ix_assets_type_value"),
+    "assets created in a date range": (
+        select(Asset.id).where(*date_range_filters(Asset.created_at, *JANUARY)), "ix_assets_created_at"),
+    "users created in a date range": (
+        select(User.id).where(*date_range_filters(User.created_at, *JANUARY)), "ix_users_created_at"),
+    # foreign keys
+    "assets by owner": (select(Asset.id).where(Asset.owner_id == 1), "ix_assets_owner_id"),
+    "transactions by asset": (select(Transaction.id).where(Transaction.asset_id == 1), "ix_transactions_asset_id"),
+    "transactions from owner": (select(Transaction.id).where(Transaction.from_owner_id == 1), "ix_transactions_from_owner_id"),
+    "transactions to owner": (select(Transaction.id).where(Transaction.to_owner_id == 1), "ix_transactions_to_owner_id"),
+    # GET /assets filters
+    "an owner's assets of a type in a value range": (
+        select(Asset.id).where(Asset.owner_id == 1, Asset.type == AssetType.CRYPTO, Asset.value >= 10000),
+        "ix_assets_owner_id_type_value"),
+    "assets of a type in a date range": (
+        select(Asset.id).where(Asset.type == AssetType.STOCK, *date_range_filters(Asset.created_at, *JANUARY)),
+        "ix_assets_type_created_at"),
+    "assets by name prefix": (select(Asset.id).where(*_asset_filters(name_prefix="Bit")), "ix_assets_name"),
+    # as-of portfolios
+    "nearest portfolio checkpoint": (
+        select(PortfolioCheckpoint.history_id)
+        .where(PortfolioCheckpoint.user_id == 1, PortfolioCheckpoint.taken_at <= WEEK_AGO)
+        .order_by(PortfolioCheckpoint.taken_at.desc()).limit(1),
+        "ix_portfolio_checkpoints_user_id_taken_at"),
+    "history acquired after a checkpoint": (
+        select(AssetHistory.id).where(AssetHistory.owner_id == 1, AssetHistory.id > 100), "ix_asset_history_owner_id_id"),
+    "history given up after a checkpoint": (
+        select(AssetHistory.id).where(AssetHistory.previous_owner_id == 1, AssetHistory.id > 100),
+        "ix_asset_history_previous_owner_id_id"),
+}
+
+
+def _explain(connection, statement) -> str:
+    compiled = statement.compile(connection)
+    params = tuple(compiled.construct_params()[name] for name in compiled.positiontup)
+    rows = connection.exec_driver_sql("EXPLAIN QUERY PLAN " + str(compiled), params).all()
+    return " | ".join(row[-1] for row in rows)
+
+
+@pytest.mark.parametrize("name", PLANS)
+def test_query_uses_its_index(client, name):
+    from app.database import engine
+
+    statement, index = PLANS[name]
+    with engine.connect() as connection:
+        plan = _explain(connection, statement)
+    assert f"INDEX {index}" in plan, plan
@@ -0,0 +1,70 @@
+from sqlalchemy import update
+
+import app.routers.reports as reports
+from app.versioning import data_version
+
+
+def _report(client, admin_headers, **headers):
+    response = client.get("/reports/", headers={**admin_headers, "Accept-Encoding": "identity", **headers})
+    assert response.status_code in (200, 304), response.text
+    return response
+
+
+def test_reports_are_served_from_the_cache_until_a_write(client, admin_headers, make_user, make_asset):
+    owner_id = make_user()
+    first = _report(client, admin_headers)
+    hits = reports.asset_summary_cache.hits
+    again = _report(client, admin_headers)
+    assert reports.asset_summary_cache.hits == hits + 1
+    assert again.content == first.content
+
+    # a write moves the data version: new numbers, new ETag, and the old tag stops matching
+    top_value = (first.json()["most_valuable_asset"] or {"value": 0})["value"] + 1
+    version = data_version.value
+    asset = make_asset(owner_id, value=top_value)
+    assert data_version.value > version
+
+    after = _report(client, admin_headers, **{"If-None-Match": first.headers["etag"]})
+    assert after.status_code == 200
+    assert after.headers["etag"] != first.headers["etag"]
+    assert after.json()["total_assets"] == first.json()["total_assets"] + 1
+    assert after.json()["most_valuable_asset"]["id"] == asset["id"]
+    assert _report(client, admin_headers, **{"If-None-Match": after.headers["etag"]}).status_code == 304
+
+
+def test_archived_counts_are_cached_separately(client, admin_headers):
+    version = data_version.value
+    client.get("/reports/", params={"include_archived": True}, headers=admin_headers)
+    client.get("/reports/", headers=admin_headers)
+    assert reports.transaction_summary_cache.get((version, True)) is not None
+    assert reports.transaction_summary_cache.get((version, False)) is not None
+
+
+def test_data_version_moves_on_committed_asset_and_transaction_writes(make_user, make_asset):
+    from app.database import SessionLocal
+    from app.models import Asset, User
+
+    user_id = make_user()
+    asset_id = make_asset(user_id)["id"]
+
+    version = data_version.value
+    with SessionLocal() as db:
+        db.get(Asset, asset_id).value = 1.0
+        db.flush()
+        db.rollback()
+    assert data_version.value == version
+
+    with SessionLocal() as db:
+        db.get(User, user_id).email = f"changed-{asset_id}@example.com"
+        db.commit()
+    assert data_version.value == version
+
+    with SessionLocal() as db:
+        db.execute(update(Asset).where(Asset.id == asset_id).values(value=2.0))
+        db.commit()
+    assert data_version.value == version + 1
+
+    with SessionLocal() as db:
+        db.get(Asset, asset_id).value = 3.0
+        db.commit()
+    assert data_version.value == version + 2
@@ -0,0 +1,72 @@
+import time
+
+import app.jobs
+
+
+def _submit(client, admin_headers, **body):
+    response = client.post("/reports/jobs", json=body, headers=admin_headers)
+    assert response.status_code == 202, response.text
+    assert response.headers["location"] == f"/reports/jobs/{response.json()['id']}"
+    return response.json()
+
+
+def _wait(client, admin_headers, job_id):
+    for _ in range(500):
+        job = client.get(f"/reports/jobs/{job_id}", headers=admin_headers).json()
+        if job["status"] in ("done", "failed"):
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def test_report_job_matches_the_report(client, admin_headers, make_user, make_asset):
+    make_asset(make_user())
+    job = _wait(client, admin_headers, _submit(client, admin_headers, kind="report")["id"])
+
+    assert (job["status"], job["error"], job["kind"]) == ("done", None, "report")
+    assert job["params"] == {"include_archived": False}
+    assert job["finished_at"] is not None
+    assert job["result"] == client.get("/reports/", headers=admin_headers).json()
+
+
+def test_graphs_job(client, admin_headers):
+    job = _submit(client, admin_headers, kind="graphs", start_date="2024-01-01", end_date="2024-01-31", granularity="week")
+    assert job["params"] == {"start_date": "2024-01-01", "end_date": "2024-01-31", "granularity": "week", "max_points": 366}
+    result = _wait(client, admin_headers, job["id"])["result"]
+    assert result["granularity"] == "week"
+    assert result["user_growth"]["dates"][0] == "2024-01-01"
+
+
+def test_identical_jobs_are_shared_until_the_data_changes(client, admin_headers, make_user, make_asset):
+    first = _submit(client, admin_headers, kind="report", include_archived=True)
+    assert _submit(client, admin_headers, kind="report", include_archived=True)["id"] == first["id"]
+    assert _submit(client, admin_headers, kind="report")["id"] != first["id"]
+
+    make_asset(make_user())
+    assert _submit(client, admin_headers, kind="report", include_archived=True)["id"] != first["id"]
+
+
+def test_failed_jobs_report_their_error_and_are_not_reused(client, admin_headers, monkeypatch):
+    def broken(kind, params):
+        raise RuntimeError("database unavailable")
+
+    monkeypatch.setattr(app.jobs, "run_job", broken)
+    failed = _wait(client, admin_headers, _submit(client, admin_headers, kind="graphs", max_points=11)["id"])
+    assert (failed["status"], failed["error"], failed["result"]) == ("failed", "database unavailable", None)
+
+    monkeypatch.undo()
+    retried = _submit(client, admin_headers, kind="graphs", max_points=11)
+    assert retried["id"] != failed["id"]
+    assert _wait(client, admin_headers, retried["id"])["status"] == "done"
+
+
+def test_rejections(client, admin_headers, monkeypatch):
+    inverted = client.post("/reports/jobs", json={"kind": "graphs", "start_date": "2024-02-01", "end_date": "2024-01-01"},
+                           headers=admin_headers)
+    assert inverted.status_code == 400
+    assert client.get("/reports/jobs/no-such-job", headers=admin_headers).status_code == 404
+
+    monkeypatch.setattr(app.jobs, "REPORT_JOB_MAX_PENDING", 0)
+    full = client.post("/reports/jobs", json={"kind": "graphs", "max_points": 12}, headers=admin_headers)
+    assert full.status_code == 503
+    assert full.headers["retry-after"] == "5"
@@ -0,0 +1,78 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import func, select
+
+import app.rollups
+from app.models import DailyAssetStat, DailyTransactionStat, DailyUserStat
+
+
+def _today(model, *columns, by_type=True):
+    """Today's rollup values summed over their slots, per type when the table has one."""
+    from app.database import SessionLocal
+
+    sums = [func.coalesce(func.sum(column), 0) for column in columns]
+    query = select(*sums).where(model.date == datetime.utcnow().date())
+    with SessionLocal() as db:
+        if not by_type:
+            return tuple(db.execute(query).one())
+        rows = db.execute(query.add_columns(model.type).group_by(model.type)).all()
+    return {row[-1].value: tuple(row[:-1]) for row in rows}
+
+
+def _delta(after: dict, before: dict, key: str) -> tuple:
+    zero = (0,) * len(next(iter(after.values())))
+    return tuple(round(a - b, 6) for a, b in zip(after.get(key, zero), before.get(key, zero)))
+
+
+# with a single slot every write upserts the same row per key
+@pytest.mark.parametrize("slots", [16, 1])
+def test_api_writes_keep_todays_rollups_in_step(client, admin_headers, make_user, make_asset, monkeypatch, slots):
+    monkeypatch.setattr(app.rollups, "ROLLUP_SLOTS", slots)
+    users_before = _today(DailyUserStat, DailyUserStat.new_users, by_type=False)
+    assets_before = _today(DailyAssetStat, DailyAssetStat.asset_count, DailyAssetStat.total_value)
+    transactions_before = _today(DailyTransactionStat, DailyTransactionStat.transaction_count, DailyTransactionStat.volume)
+
+    alice, bob = make_user(), make_user()
+    kept = make_asset(alice, 100.0, type="crypto")
+    sold = make_asset(alice, 40.0, type="crypto")
+    make_asset(bob, 7.5, type="stock")
+    for body in ({"asset_id": kept["id"], "to_user_id": bob, "type": "transfer"},
+                 {"asset_id": sold["id"], "to_user_id": bob, "type": "sell", "amount": 55.0}):
+        assert client.post("/transactions/", json=body, headers=admin_headers).status_code == 201
+
+    assert _today(DailyUserStat, DailyUserStat.new_users, by_type=False)[0] - users_before[0] == 2
+    assets_after = _today(DailyAssetStat, DailyAssetStat.asset_count, DailyAssetStat.total_value)
+    # the sell revalued its asset on the day it was created: 100 + 40 + (55 - 40)
+    assert _delta(assets_after, assets_before, "crypto") == (2, 155.0)
+    assert _delta(assets_after, assets_before, "stock") == (1, 7.5)
+    transactions_after = _today(DailyTransactionStat, DailyTransactionStat.transaction_count, DailyTransactionStat.volume)
+    assert _delta(transactions_after, transactions_before, "transfer") == (1, 100.0)
+    assert _delta(transactions_after, transactions_before, "sell") == (1, 55.0)
+
+
+def test_a_rejected_transaction_leaves_the_rollups_alone(client, admin_headers, make_user, make_asset):
+    alice = make_user()
+    asset = make_asset(alice)
+    before = _today(DailyTransactionStat, DailyTransactionStat.transaction_count, DailyTransactionStat.volume)
+
+    response = client.post("/transactions/", json={"asset_id": asset["id"], "to_user_id": alice, "type": "transfer"},
+                           headers=admin_headers)
+    assert response.status_code == 400
+    assert _today(DailyTransactionStat, DailyTransactionStat.transaction_count, DailyTransactionStat.volume) == before
+
+
+def test_rebuild_matches_a_group_by_over_the_raw_tables(client):
+    from app.database import engine
+    from app.models import User
+
+    with engine.connect() as connection:
+        transaction = connection.begin()
+        try:
+            app.rollups.rebuild_rollups(connection)
+            rebuilt_users = connection.scalar(select(func.sum(DailyUserStat.new_users)))
+            assert rebuilt_users == connection.scalar(select(func.count(User.id)))
+            # one row per key after a rebuild
+            assert connection.scalar(select(func.count()).where(DailyUserStat.slot != 0)) == 0
+        finally:
+            transaction.rollback()
@@ -0,0 +1,101 @@
+def _owner_and_value(asset_id):
+    from app.database import SessionLocal
+    from app.models import Asset
+
+    with SessionLocal() as db:
+        asset = db.get(Asset, asset_id)
+        return asset.owner_id, asset.value
+
+
+def _transaction_count(asset_ids):
+    from sqlalchemy import func, select
+    from app.database import SessionLocal
+    from app.models import Transaction
+
+    with SessionLocal() as db:
+        return db.scalar(select(func.count(Transaction.id)).where(Transaction.asset_id.in_(asset_ids)))
+
+
+def test_atomic_batch_applies_every_item(client, admin_headers, make_user, make_asset):
+    seller, buyer = make_user(), make_user()
+    first, second = make_asset(seller, 100.0), make_asset(seller, 50.0)
+
+    response = client.post("/transactions/batch", json={"transactions": [
+        {"asset_id": first["id"], "to_user_id": buyer, "type": "transfer"},
+        {"asset_id": second["id"], "to_user_id": buyer, "type": "sell", "amount": 75.0},
+    ]}, headers=admin_headers)
+
+    assert response.status_code == 201, response.text
+    body = response.json()
+    assert (body["created"], body["failed"], body["errors"]) == (2, 0, [])
+    assert _owner_and_value(first["id"]) == (buyer, 100.0)
+    assert _owner_and_value(second["id"]) == (buyer, 75.0)
+
+
+def test_atomic_batch_with_an_invalid_item_applies_nothing(client, admin_headers, make_user, make_asset):
+    seller, buyer = make_user(), make_user()
+    asset = make_asset(seller, 100.0)
+
+    response = client.post("/transactions/batch", json={"transactions": [
+        {"asset_id": asset["id"], "to_user_id": buyer, "type": "sell", "amount": 80.0},
+        {"asset_id": asset["id"], "to_user_id": 10**9, "type": "transfer"},
+    ]}, headers=admin_headers)
+
+    assert response.status_code == 400
+    assert response.json()["detail"]["errors"][0]["row"] == 2
+    assert _owner_and_value(asset["id"]) == (seller, 100.0)
+    assert _transaction_count([asset["id"]]) == 0
+
+
+def test_non_atomic_batch_commits_the_valid_items(client, admin_headers, make_user, make_asset):
+    seller, buyer = make_user(), make_user()
+    asset = make_asset(seller, 100.0)
+
+    response = client.post("/transactions/batch", json={"atomic": False, "transactions": [
+        {"asset_id": asset["id"], "to_user_id": buyer, "type": "transfer"},
+        {"asset_id": 10**9, "to_user_id": buyer, "type": "sell", "amount": 10.0},
+    ]}, headers=admin_headers)
+
+    assert response.status_code == 201, response.text
+    body = response.json()
+    assert (body["created"], body["failed"]) == (1, 1)
+    assert body["errors"][0]["row"] == 2
+    assert _owner_and_value(asset["id"]) == (buyer, 100.0)
+    assert _transaction_count([asset["id"]]) == 1
+
+
+def test_batch_applies_items_in_order_on_the_same_asset(client, admin_headers, make_user, make_asset):
+    first_owner, second_owner, third_owner = make_user(), make_user(), make_user()
+    asset = make_asset(first_owner, 100.0)
+
+    response = client.post("/transactions/batch", json={"transactions": [
+        {"asset_id": asset["id"], "to_user_id": second_owner, "type": "transfer"},
+        {"asset_id": asset["id"], "to_user_id": third_owner, "type": "sell", "amount": 120.0},
+    ]}, headers=admin_headers)
+
+    assert response.status_code == 201, response.text
+    assert [(t["from_owner_id"], t["to_owner_id"]) for t in response.json()["transactions"]] == [
+        (first_owner, second_owner), (second_owner, third_owner),
+    ]
+    assert _owner_and_value(asset["id"]) == (third_owner, 120.0)
+
+
+def test_expected_version_is_checked_per_item(client, admin_headers, make_user, make_asset):
+    seller, buyer = make_user(), make_user()
+    current, stale = make_asset(seller, 10.0), make_asset(seller, 20.0)
+    items = [
+        {"asset_id": current["id"], "to_user_id": buyer, "type": "transfer", "expected_version": 1},
+        {"asset_id": stale["id"], "to_user_id": buyer, "type": "transfer", "expected_version": 99},
+    ]
+
+    rejected = client.post("/transactions/batch", json={"transactions": items}, headers=admin_headers)
+    assert rejected.status_code == 400
+    assert rejected.json()["detail"]["errors"] == [{"row": 2, "error": f"Asset {stale['id']} is at version 1, expected 99"}]
+    assert _owner_and_value(current["id"]) == (seller, 10.0)
+
+    partial = client.post("/transactions/batch", json={"transactions": items, "atomic": False}, headers=admin_headers)
+    assert partial.status_code == 201, partial.text
+    assert (partial.json()["created"], partial.json()["failed"]) == (1, 1)
+    assert _owner_and_value(current["id"]) == (buyer, 10.0)
+    assert _owner_and_value(stale["id"]) == (seller, 20.0)
+    assert _transaction_count([stale["id"]]) == 0